@@ -1,35 +1,102 @@
 # app.py
+import time
+_T0 = time.perf_counter()  # 进程导入起点，用于统计启动阶段耗时
 import eventlet
 eventlet.monkey_patch()
+import atexit
+import os
+import signal
+import sys
 from flask import Flask
 from flask_socketio import SocketIO
-from db import init_db
+from db import init_db, rollup_scores, ROLLUP_INTERVAL
 from game_engine import GameEngine
+from rooms import RoomManager
+from scheduler import Scheduler
+import snapshot
 from routes import main_routes  # 导入HTTP路由蓝图
 from socket_events import register_socket_events  # 导入SocketIO事件注册函数
+import metrics
 
-# Flask + SocketIO 初始化
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'escape_maze_secret'
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
-#cors_allowed_origins="*"，允许所有域名的请求访问。async_mode=eventlet 是一个轻量级的异步网络库
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'world_snapshot.bin')
 
-# 初始化数据库
-with app.app_context():
+# SocketIO 先创建、后绑定到 app（应用工厂模式）
+socketio = SocketIO()
+metrics.record_phase('import', time.perf_counter() - _T0)
+
+
+def create_app(lazy=True):
+    """
+    应用工厂：只做廉价的装配工作，保证尽快绑定端口
+    - 数据库建表放到后台任务（首次访问数据库时也会兜底建表）
+    - lazy=True 时迷宫在第一次 join 时才构建（存在快照则直接恢复）
+    """
+    t0 = time.perf_counter()
+    # Flask + SocketIO 初始化
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'escape_maze_secret'
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet')
+    #cors_allowed_origins="*"，允许所有域名的请求访问。async_mode=eventlet 是一个轻量级的异步网络库
+
+    # 所有房间共享一个调度器（由单个后台任务驱动）
+    scheduler = Scheduler()
+    socketio.start_background_task(scheduler.run_forever, socketio.sleep)
+
+    def make_engine(room):
+        # 每个房间各自持久化快照；默认房间懒加载，其他房间有快照时立即恢复（断线令牌要能查到）
+        path = snapshot.room_path(SNAPSHOT_PATH, room)
+        return GameEngine(socketio, snapshot_path=path, scheduler=scheduler, room=room,
+                          lazy=lazy if room == 'main' else not os.path.exists(path))
+
+    rooms = RoomManager(make_engine, scheduler)
+    engine = rooms.main.engine
+    # 所有房间的锁竞争统计（新开的房间沿用开关）并入 /api/metrics
+    rooms.profile_locks(os.environ.get('MAZE_LOCK_PROFILE') == '1')
+    metrics.register_collector(rooms.lock_prometheus_lines)
+    # 上次退出时还开着的房间：从各自的快照恢复
+    rooms.reopen(snapshot.saved_rooms(SNAPSHOT_PATH))
+    # 进程退出时所有房间写最后一次快照
+    atexit.register(rooms.save_snapshots)
+    # 供 HTTP 路由访问引擎与房间
+    app.extensions['maze_engine'] = engine
+    app.extensions['maze_rooms'] = rooms
+
+    # 注册HTTP路由蓝图
+    app.register_blueprint(main_routes)
+
+    # 注册SocketIO事件（传入socketio和房间管理器）
+    register_socket_events(socketio, rooms)
+
+    # 初始化数据库：后台执行，不阻塞端口绑定
+    socketio.start_background_task(_init_db_in_background)
+    # 成绩保留期：定期把过期原始成绩汇总进日表后分块删除
+    socketio.start_background_task(_retention_loop, socketio)
+    metrics.record_phase('create_app', time.perf_counter() - t0)
+    return app
+
+
+def _init_db_in_background():
+    t0 = time.perf_counter()
     init_db()
+    metrics.record_phase('init_db', time.perf_counter() - t0)
 
 
+def _retention_loop(socketio):
+    archive = os.environ.get('MAZE_SCORE_ARCHIVE')    # 设置后删除前先归档到该 NDJSON 文件
+    while True:
+        socketio.sleep(ROLLUP_INTERVAL)
+        with metrics.timer('db.rollup_scores'):
+            rollup_scores(archive_path=archive, pause=lambda: socketio.sleep(0.01))
 
-# 初始化游戏引擎
-engine = GameEngine(socketio)
 
-# 注册HTTP路由蓝图
-app.register_blueprint(main_routes)
+# 模块级 app（gunicorn app:app / from app import app）；默认懒加载，导入时只做廉价装配
+app = create_app(lazy=os.environ.get('MAZE_EAGER_WORLD') != '1')
 
-# 注册SocketIO事件（传入socketio和engine实例）
-register_socket_events(socketio, engine)
 
 if __name__ == '__main__':
+    # SIGTERM 默认不会触发 atexit，转成正常退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    metrics.record_phase('ready', time.perf_counter() - _T0)
     socketio.run(
         app,
         host='127.0.0.1',
@@ -37,4 +104,4 @@ if __name__ == '__main__':
         debug=True,
         use_reloader=False,
         allow_unsafe_werkzeug=True
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,201 @@
+# asgi_app.py
+# -*- coding: utf-8 -*-
+"""
+asyncio 部署模式（可选，替代 app.py 的 eventlet）
+- python-socketio AsyncServer + ASGI 服务器（uvicorn），不做 monkey patch
+- HTTP 路由仍是 Flask 蓝图，经 asgiref 的 WsgiToAsgi 挂在同一端口（在线程池中执行）
+- 引擎锁是普通的 threading.Lock，HTTP 线程会持有它，因此事件循环上不执行任何会取引擎锁的代码：
+  socket_events 的同步处理函数与 Scheduler 的 run_due 都交给单个“游戏线程”（单线程执行器）依次执行，
+  与 eventlet 模式下一样串行，无需给房间表、发送队列等额外加锁；
+  HTTP 路由持锁时只有游戏线程等待，事件循环照常收发 WebSocket 帧与心跳
+- 处理函数里的 emit / 广播经 call_soon_threadsafe 进入有序发送队列，由单个任务依次 await 发出
+- 定时任务（盲盒刷新、排名广播、快照、发送队列补发、观战推送）仍由 Scheduler 驱动，
+  用 asyncio 任务按 tick 把 run_due 交给游戏线程
+
+用法：
+  python asgi_app.py
+  python bench_modes.py          # 与 eventlet 模式对比连接数与 moves/s
+"""
+import time
+_T0 = time.perf_counter()
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+
+from db import init_db, rollup_scores, ROLLUP_INTERVAL
+from game_engine import GameEngine
+from rooms import RoomManager
+from routes import main_routes
+from scheduler import Scheduler
+import snapshot
+from socket_events import register_socket_events
+import metrics
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'world_snapshot.bin')
+
+_current_sid = contextvars.ContextVar('sid')
+
+
+class _Request:
+    """与 flask.request 相同的用法：request.sid 为当前事件所属连接"""
+
+    @property
+    def sid(self):
+        return _current_sid.get()
+
+
+class AsyncTransport:
+    """socket_events 使用的传输层函数（见 socket_events.FlaskTransport）"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.request = _Request()
+
+    def emit(self, event, payload):
+        self.owner.emit(event, payload, to=_current_sid.get())
+
+    def join_room(self, room):
+        self.owner.call_soon(self.owner.server.manager.basic_enter_room, _current_sid.get(), '/', room)
+
+    def leave_room(self, room):
+        self.owner.call_soon(self.owner.server.manager.basic_leave_room, _current_sid.get(), '/', room)
+
+
+class AsyncSocketIO:
+    """
+    把 AsyncServer 包装成 GameEngine / socket_events 使用的同步接口
+    （on / emit / start_background_task / sleep）
+    同步处理函数在游戏线程中执行；emit 等可从任何线程调用
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = AsyncTransport(self)
+        self.game = ThreadPoolExecutor(1, thread_name_prefix='maze-game')   # 游戏线程
+        self._loop = None
+        self._outbox = None     # asyncio.Queue，事件循环启动后创建
+
+    def on(self, event):
+        def deco(fn):
+            async def handler(sid, *args):
+                if event == 'connect':
+                    # AsyncServer 传 (environ, auth)，Flask-SocketIO 只传 auth
+                    args = args[1:]
+                token = _current_sid.set(sid)
+                try:
+                    ctx = contextvars.copy_context()
+                finally:
+                    _current_sid.reset(token)
+                return await self.run_game(ctx.run, fn, *args)
+            self.server.on(event, handler)
+            return fn
+        return deco
+
+    def run_game(self, fn, *args):
+        """在游戏线程中执行（返回 asyncio Future）"""
+        return self._loop.run_in_executor(self.game, fn, *args)
+
+    def call_soon(self, fn, *args):
+        """在事件循环线程中执行（保持调用顺序）"""
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    def emit(self, event, payload, to=None, room=None):
+        """非阻塞：放入发送队列，保持调用顺序"""
+        self.call_soon(self._outbox.put_nowait, (event, payload, to or room))
+
+    async def _drain(self):
+        while True:
+            event, payload, to = await self._outbox.get()
+            await self.server.emit(event, payload, to=to)
+
+    def start_background_task(self, fn, *args):
+        """协程函数在事件循环中运行，普通函数在默认线程池中运行（不占用游戏线程）"""
+        if asyncio.iscoroutinefunction(fn):
+            return asyncio.run_coroutine_threadsafe(fn(*args), self._loop)
+        return self.call_soon(self._loop.run_in_executor, None, fn, *args)
+
+    sleep = staticmethod(asyncio.sleep)
+
+    def start(self):
+        """事件循环启动后调用"""
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        return self._loop.create_task(self._drain())
+
+
+async def _run_scheduler(scheduler, sock):
+    """Scheduler.run_forever 的 asyncio 版本：到期事件在游戏线程中执行"""
+    while True:
+        await sock.run_game(scheduler.run_due)
+        await asyncio.sleep(scheduler.tick_interval)
+
+
+async def _run_retention():
+    """成绩保留期汇总（见 app._retention_loop），在线程池中执行，块之间用 time.sleep 让出写锁"""
+    archive = os.environ.get('MAZE_SCORE_ARCHIVE')
+    while True:
+        await asyncio.sleep(ROLLUP_INTERVAL)
+        with metrics.timer('db.rollup_scores'):
+            await asyncio.to_thread(rollup_scores, archive_path=archive, pause=lambda: time.sleep(0.01))
+
+
+def create_asgi_app(lazy=True):
+    """与 app.create_app 对应的 ASGI 应用工厂"""
+    t0 = time.perf_counter()
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'escape_maze_secret'
+    server = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+    sock = AsyncSocketIO(server)
+
+    # 调度器由下面的 asyncio 任务驱动（不让引擎自己起 eventlet 后台任务）
+    scheduler = Scheduler()
+
+    def make_engine(room):
+        path = snapshot.room_path(SNAPSHOT_PATH, room)
+        return GameEngine(sock, snapshot_path=path, scheduler=scheduler, room=room,
+                          lazy=lazy if room == 'main' else not os.path.exists(path))
+
+    rooms = RoomManager(make_engine, scheduler)
+    engine = rooms.main.engine
+    app.extensions['maze_engine'] = engine
+    app.extensions['maze_rooms'] = rooms
+    rooms.profile_locks(os.environ.get('MAZE_LOCK_PROFILE') == '1')
+    metrics.register_collector(rooms.lock_prometheus_lines)
+    rooms.reopen(snapshot.saved_rooms(SNAPSHOT_PATH))
+    app.register_blueprint(main_routes)
+    register_socket_events(sock, rooms)
+
+    tasks = []
+
+    async def on_startup():
+        tasks.append(sock.start())
+        tasks.append(asyncio.get_running_loop().create_task(_run_scheduler(scheduler, sock)))
+        tasks.append(asyncio.get_running_loop().create_task(_run_retention()))
+        t = time.perf_counter()
+        await asyncio.to_thread(init_db)
+        metrics.record_phase('init_db', time.perf_counter() - t)
+
+    async def on_shutdown():
+        for task in tasks:
+            task.cancel()
+        # 快照要取引擎锁：排在游戏线程上执行（在正在执行的 tick 之后），事件循环只等待
+        await sock.run_game(rooms.save_snapshots)
+        sock.game.shutdown(wait=False)
+
+    asgi = socketio.ASGIApp(server, other_asgi_app=WsgiToAsgi(app),
+                            on_startup=on_startup, on_shutdown=on_shutdown)
+    metrics.record_phase('create_app', time.perf_counter() - t0)
+    return asgi
+
+
+if __name__ == '__main__':
+    import uvicorn
+    metrics.record_phase('import', time.perf_counter() - _T0)
+    asgi = create_asgi_app(lazy=os.environ.get('MAZE_EAGER_WORLD') != '1')
+    metrics.record_phase('ready', time.perf_counter() - _T0)
+    uvicorn.run(asgi, host='127.0.0.1', port=5000, log_level='warning')
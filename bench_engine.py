@@ -0,0 +1,151 @@
+# bench_engine.py
+# -*- coding: utf-8 -*-
+"""
+进程内引擎基准：不经过 Socket.IO，直接驱动 GameEngine
+- 使用空壳 socketio（不启动后台任务、不发送任何数据）
+- 生成大量虚拟玩家沿最短路走向出口，途中自然触发陷阱、开盲盒、购买道具
+- 按 玩家数 x 迷宫尺寸 组合测量：每秒移动次数、每次移动的内存分配、状态负载构建耗时
+  （内存分配用 tracemalloc 统计单次调用的峰值增量，即调用期间临时分配的字节数）
+
+用法示例：
+  python bench_engine.py --players 10 100 1000 --sizes 21 51 --moves 20000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import deque
+
+from game_engine import GameEngine
+
+
+class StubSocketIO:
+    """GameEngine 只用到 start_background_task / sleep / emit，这里全部置空"""
+
+    def start_background_task(self, target, *args, **kwargs):
+        return None
+
+    def sleep(self, seconds):
+        pass
+
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def exit_parents(engine):
+    """以出口为根的 BFS：{cell: 朝出口的下一格}"""
+    ex = tuple(engine.exit)
+    parent = {ex: None}
+    q = deque([ex])
+    grid, w, h = engine.grid, engine.width, engine.height
+    while q:
+        cx, cy = q.popleft()
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = cx + dx, cy + dy
+            if 0 <= nx < w and 0 <= ny < h and grid[ny][nx] == 1 and (nx, ny) not in parent:
+                parent[(nx, ny)] = (cx, cy)
+                q.append((nx, ny))
+    return parent
+
+
+def make_stepper(engine, rng):
+    """返回 step(sid) -> (dx, dy)：沿出口 BFS 树走一步，只查表"""
+    parent = exit_parents(engine)
+    players = engine.players
+
+    def step(sid):
+        p = players[sid]
+        if p.finished:
+            # 到达出口的虚拟玩家回到起点重新走（等价于重新加入）
+            p.touch()
+            p.x, p.y = engine.start
+            p.finished = False
+        nxt = parent.get((p.x, p.y))
+        if nxt is None:
+            return rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+        return nxt[0] - p.x, nxt[1] - p.y
+    return step
+
+
+def _peak_alloc(fn, *args):
+    """单次调用期间 tracemalloc 的峰值增量（字节）"""
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(*args)
+    return tracemalloc.get_traced_memory()[1] - base
+
+
+def bench_case(n_players, size, n_moves, buy_every, seed):
+    rng = random.Random(seed)
+    engine = GameEngine(StubSocketIO(), size, size)
+    engine.generate_new_maze(size, size, seed=seed)
+    sids = [f"bot{i}" for i in range(n_players)]
+    for sid in sids:
+        engine.add_player(sid, sid)
+    step = make_stepper(engine, rng)
+
+    # 移动吞吐
+    t0 = time.perf_counter()
+    for i in range(n_moves):
+        sid = sids[i % n_players]
+        dx, dy = step(sid)
+        engine.process_move(sid, dx, dy)
+        if buy_every and i % buy_every == 0:
+            engine.buy_item(sid, rng.choice(('heal', 'shield', 'bomb')))
+    move_secs = time.perf_counter() - t0
+
+    # 每次调用的临时分配（tracemalloc 开启后速度会变慢，所以与吞吐分开测）
+    tracemalloc.start()
+    sample = min(n_moves, 2000)
+    move_bytes = 0
+    for i in range(sample):
+        sid = sids[i % n_players]
+        dx, dy = step(sid)
+        move_bytes += _peak_alloc(engine.process_move, sid, dx, dy)
+    state_bytes = _peak_alloc(engine.get_state_payload)
+    tracemalloc.stop()
+
+    # 负载构建耗时
+    reps = max(10, 20000 // max(1, n_players))
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        engine.get_state_payload()
+    state_us = (time.perf_counter() - t0) / reps * 1e6
+    t0 = time.perf_counter()
+    for _ in range(max(5, reps // 10)):
+        engine.get_init_payload_for(sids[0])
+    init_us = (time.perf_counter() - t0) / max(5, reps // 10) * 1e6
+
+    return {
+        "players": n_players,
+        "size": engine.width,
+        "moves_per_sec": n_moves / move_secs,
+        "alloc_bytes_per_move": move_bytes / sample,
+        "state_payload_bytes": state_bytes,
+        "state_payload_us": state_us,
+        "init_payload_us": init_us,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GameEngine 进程内基准")
+    ap.add_argument('--players', type=int, nargs='+', default=[10, 100, 1000])
+    ap.add_argument('--sizes', type=int, nargs='+', default=[21, 51])
+    ap.add_argument('--moves', type=int, default=20000)
+    ap.add_argument('--buy-every', type=int, default=50, help='每 N 次移动购买一次道具（0 关闭）')
+    ap.add_argument('--seed', type=int, default=1234)
+    opts = ap.parse_args(argv)
+
+    header = (f"{'players':>8} {'size':>5} {'moves/s':>10} {'bytes/move':>11} "
+              f"{'state_us':>10} {'state_bytes':>12} {'init_us':>10}")
+    print(header)
+    print('-' * len(header))
+    for size in opts.sizes:
+        for n in opts.players:
+            r = bench_case(n, size, opts.moves, opts.buy_every, opts.seed)
+            print(f"{r['players']:>8} {r['size']:>5} {r['moves_per_sec']:>10.0f} {r['alloc_bytes_per_move']:>11.1f} "
+                  f"{r['state_payload_us']:>10.1f} {r['state_payload_bytes']:>12} {r['init_payload_us']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# bench_modes.py
+# -*- coding: utf-8 -*-
+"""
+同一台机器上对比两种部署模式：eventlet（app.py）与 asyncio/ASGI（asgi_app.py）
+每种模式、每个客户端规模各启动一次全新的服务器，用 loadtest 跑同样的负载，
+输出已连接数、moves/s、往返延迟分位数与服务器 CPU
+
+用法示例：
+  python bench_modes.py --clients 50,200 --processes 4 --duration 15
+"""
+import argparse
+import sys
+import time
+
+import loadtest
+
+MODES = {
+    'eventlet': [sys.executable, 'app.py'],
+    'asgi': [sys.executable, 'asgi_app.py'],
+}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="eventlet / asyncio 部署模式对比")
+    ap.add_argument('--modes', default='eventlet,asgi')
+    ap.add_argument('--clients', default='50,200', help='逗号分隔的客户端规模')
+    ap.add_argument('--processes', type=int, default=2)
+    ap.add_argument('--duration', type=float, default=15.0)
+    ap.add_argument('--format', choices=['json', 'packed'], default='json')
+    opts = ap.parse_args(argv)
+
+    rows = []
+    for n in [int(c) for c in opts.clients.split(',')]:
+        for mode in opts.modes.split(','):
+            args = loadtest.build_parser().parse_args([
+                '--clients', str(n), '--processes', str(opts.processes),
+                '--duration', str(opts.duration), '--format', opts.format,
+                '--spawn-server', '--server-cmd', ' '.join(MODES[mode]),
+            ])
+            r = loadtest.run(args)
+            # 等上一个服务器写完快照、释放端口后再启动下一个
+            time.sleep(1.0)
+            if r is None:
+                print(f"{mode} 服务器未就绪", file=sys.stderr)
+                continue
+            rtts, wall = r['rtts'], r['wall']
+            rows.append((mode, n, r['connected'], len(rtts) / wall,
+                         loadtest.percentile(rtts, 0.5) * 1000, loadtest.percentile(rtts, 0.99) * 1000,
+                         r['cpu'] / wall * 100 if r['cpu'] is not None else float('nan')))
+
+    print(f"{'mode':<10}{'clients':>8}{'conn':>6}{'moves/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu %':>8}")
+    for mode, n, conn, mps, p50, p99, cpu in rows:
+        print(f"{mode:<10}{n:>8}{conn:>6}{mps:>10.0f}{p50:>10.1f}{p99:>10.1f}{cpu:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
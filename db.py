@@ -3,12 +3,18 @@
 数据库模型与简单持久化（使用 SQLAlchemy + SQLite）
 - 初始化数据库
 - 保存成绩（排行榜）
-- 读取 top N 成绩
+- 读取 top N 成绩 / 名次（读每人最佳成绩汇总表 score_best，不扫原始成绩）
+- 全表流式导出 / 批量导入（内存占用与表大小无关）
+- 保留期：超过 RETENTION_DAYS 的原始成绩按 (天, 名字) 汇总进 score_daily 后分块删除（可先归档）
 """
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Date, Index, select, insert, text, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.sql import func
+import csv
 import datetime
+import io
+import json
 import os
 
 BASE = os.path.dirname(__file__)
@@ -27,33 +33,219 @@ class Score(Base):
     coins = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.datetime.now,server_default=func.now())
 
+SCORES_CREATED_INDEX = Index("ix_scores_created_at", Score.created_at)    # 保留期汇总按时间挑选旧行
+
+class ScoreBest(Base):
+    """每个名字的最佳成绩（排行榜 / 名次只读这张表）；每条成绩写入时同步更新"""
+    __tablename__ = "score_best"
+    name = Column(String(64), primary_key=True)
+    best_time = Column(Integer, nullable=False, index=True)
+    coins = Column(Integer, nullable=False)       # 最佳那一局的金币
+    achieved_at = Column(DateTime(timezone=True))
+    runs = Column(Integer, nullable=False)        # 累计通关次数
+
+class ScoreDaily(Base):
+    """按 (天, 名字) 汇总的历史成绩（原始行过了保留期后只剩这里）"""
+    __tablename__ = "score_daily"
+    day = Column(Date, primary_key=True)
+    name = Column(String(64), primary_key=True)
+    runs = Column(Integer, nullable=False)
+    best_time = Column(Integer, nullable=False)
+    best_coins = Column(Integer, nullable=False)  # 当天最佳那一局的金币
+    total_coins = Column(Integer, nullable=False)
+
 '''class User(Base):
     __tablename__ = "users"
 '''
 
+_db_ready = False
+
+RETENTION_DAYS = 30      # 原始成绩保留天数
+ROLLUP_CHUNK = 2000      # 每个汇总 / 删除事务处理的行数
+ROLLUP_INTERVAL = 3600   # 后台汇总周期（秒）
+
 def init_db():
-    """创建数据表（若不存在）"""
+    """创建数据表（若不存在）；旧库补建索引，并从原始成绩回填 score_best"""
+    global _db_ready
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        SCORES_CREATED_INDEX.create(conn, checkfirst=True)
+        if conn.execute(select(func.count()).select_from(ScoreBest.__table__)).scalar() == 0:
+            # SQLite 的 MIN() 聚合会让同一行的其他裸列取自最小值所在行
+            conn.execute(text("""
+                INSERT INTO score_best (name, best_time, coins, achieved_at, runs)
+                SELECT name, MIN(time), coins, created_at, COUNT(*) FROM scores GROUP BY name
+            """))
+    _db_ready = True
+
+def ensure_db():
+    """首次访问数据库前建表（启动时不再同步执行 init_db）"""
+    if not _db_ready:
+        init_db()
+
+def _upsert_best():
+    """score_best 的 upsert：用时更短才替换金币与时间，次数累加"""
+    t = ScoreBest.__table__
+    stmt = sqlite_insert(t)
+    new = stmt.excluded
+    better = new.best_time < t.c.best_time
+    return stmt.on_conflict_do_update(index_elements=[t.c.name], set_={
+        "best_time": case((better, new.best_time), else_=t.c.best_time),
+        "coins": case((better, new.coins), else_=t.c.coins),
+        "achieved_at": case((better, new.achieved_at), else_=t.c.achieved_at),
+        "runs": t.c.runs + new.runs,
+    })
 
 def save_score(name, time_seconds, coins):
-    """保存一条成绩记录"""
+    """保存一条成绩记录（同一事务内更新该名字的最佳成绩）"""
+    ensure_db()
     db = SessionLocal()
     try:
         rec = Score(name=name, time=int(time_seconds), coins=int(coins))
         db.add(rec)
+        db.flush()
+        db.execute(_upsert_best(), {"name": rec.name, "best_time": rec.time, "coins": rec.coins,
+                                    "achieved_at": rec.created_at, "runs": 1})
         db.commit()
     finally:
         db.close()
 
 def get_top_scores(limit=10):
-    """按通关时间升序返回前 limit 条记录（name,time,coins,created_at）"""
+    """每人最佳成绩按通关时间升序的前 limit 名（name,time,coins,created_at）"""
+    ensure_db()
     db = SessionLocal()
     try:
-        rows = db.query(Score).order_by(Score.time.asc()).limit(limit).all()
-        return [(r.name, r.time, r.coins, r.created_at) for r in rows]
+        rows = db.query(ScoreBest).order_by(ScoreBest.best_time.asc(), ScoreBest.achieved_at.asc()).limit(limit).all()
+        return [(r.name, r.best_time, r.coins, r.achieved_at) for r in rows]
     finally:
         db.close()
 
+def get_rank(time_seconds):
+    """该用时在全部玩家最佳成绩中的名次（1 起；只比较 score_best，走 best_time 索引）"""
+    ensure_db()
+    with engine.connect() as conn:
+        faster = conn.execute(select(func.count()).select_from(ScoreBest.__table__)
+                              .where(ScoreBest.best_time < int(time_seconds))).scalar()
+    return faster + 1
+
+def rollup_scores(retention_days=RETENTION_DAYS, chunk=ROLLUP_CHUNK, archive_path=None, pause=None):
+    """
+    把早于保留期的原始成绩汇总进 score_daily 后删除，返回处理的行数
+    - 按 id 分块，每块一个短事务（汇总 upsert + 删除）：写锁只持有一块的时间，
+      块与块之间调用 pause()（如 socketio.sleep），让 save_score 等写入插进来
+    - score_best 在写入时已经包含这些行，这里不再改动
+    - archive_path 不为空时，删除前把原始行以 NDJSON 追加到该文件
+    """
+    ensure_db()
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(text(
+                "SELECT id FROM scores WHERE created_at < :cutoff ORDER BY id LIMIT :n"),
+                {"cutoff": cutoff, "n": chunk}).scalars().all()
+            if not ids:
+                return total
+            cond = "id BETWEEN :lo AND :hi AND created_at < :cutoff"
+            params = {"lo": ids[0], "hi": ids[-1], "cutoff": cutoff}
+            if archive_path:
+                rows = conn.execute(text(f"SELECT id, name, time, coins, created_at FROM scores WHERE {cond}"), params)
+                with open(archive_path, "a", encoding="utf-8") as f:
+                    for r in rows:
+                        f.write(json.dumps(dict(zip(EXPORT_COLUMNS, r)), ensure_ascii=False) + "\n")
+            conn.execute(text(f"""
+                INSERT INTO score_daily (day, name, runs, best_time, best_coins, total_coins)
+                SELECT date(created_at), name, COUNT(*), MIN(time), coins, SUM(coins)
+                FROM scores WHERE {cond} GROUP BY date(created_at), name
+                ON CONFLICT(day, name) DO UPDATE SET
+                    runs = runs + excluded.runs,
+                    best_coins = CASE WHEN excluded.best_time < best_time THEN excluded.best_coins ELSE best_coins END,
+                    best_time = MIN(best_time, excluded.best_time),
+                    total_coins = total_coins + excluded.total_coins
+            """), params)
+            total += conn.execute(text(f"DELETE FROM scores WHERE {cond}"), params).rowcount
+        if pause is not None:
+            pause()
+
+EXPORT_COLUMNS = ("id", "name", "time", "coins", "created_at")
+
+def iter_scores(batch_size=1000, after_id=0):
+    """
+    按 id 升序逐批读取全部成绩，生成 (id, name, time, coins, created_at)
+    - 以 id 为游标分页（WHERE id > 上一批最后的 id），每批是一次独立的短查询：
+      SQLite 默认回滚日志模式下，长时间打开的读事务会挡住所有写入（save_score），
+      导出给慢速客户端时不能一直持有同一个游标
+    - 内存中最多一批数据
+    """
+    ensure_db()
+    table = Score.__table__
+    stmt = (select(table.c.id, table.c.name, table.c.time, table.c.coins, table.c.created_at)
+            .order_by(table.c.id).limit(batch_size))
+    last = after_id
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(stmt.where(table.c.id > last)).all()
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+def export_chunks(fmt="csv", batch_size=1000):
+    """
+    把 iter_scores 的结果编码为 CSV（带表头）或 NDJSON 文本，每批拼成一个字符串产出
+    （流式响应按块写出，避免每行一次 write）
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+    n = 0
+    for r in iter_scores(batch_size):
+        row = (r[0], r[1], r[2], r[3], r[4].isoformat() if r[4] is not None else None)
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            buf.write("\n")
+        n += 1
+        if n % batch_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def import_scores(records, batch_size=5000):
+    """
+    批量导入成绩：records 为 (name, time, coins, created_at或None) 的可迭代对象（可以是生成器）
+    - 整个导入在一个事务里完成（失败则全部回滚），每 batch_size 行一次 executemany
+      （同时 upsert 每人最佳成绩 score_best）
+    - 返回导入的行数
+    """
+    ensure_db()
+    stmt = insert(Score.__table__)
+    total = 0
+    with engine.begin() as conn:
+        batch = []
+        for name, time_seconds, coins, created_at in records:
+            row = {"name": name, "time": int(time_seconds), "coins": int(coins)}
+            # 未给出时间的行按导入时刻记录（与列默认值一致）
+            row["created_at"] = created_at or datetime.datetime.now()
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_batch(conn, stmt, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert_batch(conn, stmt, batch)
+            total += len(batch)
+    return total
+
+def _insert_batch(conn, stmt, batch):
+    conn.execute(stmt, batch)
+    conn.execute(_upsert_best(), [{"name": r["name"], "best_time": r["time"], "coins": r["coins"],
+                                   "achieved_at": r["created_at"], "runs": 1} for r in batch])
+
 def user_exist(name):
     return True
 
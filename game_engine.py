@@ -1,8 +1,83 @@
 import random, time
+import hashlib
+import secrets
 from collections import deque
 from threading import Lock
 import db as mds
 import copy
+import snapshot
+import packed_state
+from ranking import DistanceRanking
+from metrics import timed, record_phase
+from lock_profiler import ProfiledLock
+from scheduler import Scheduler
+from memstats import deep_sizeof
+
+class PlayerRecord:
+    """
+    服务器端玩家记录
+    - __slots__ 固定字段，比 dict 省内存、属性访问更快
+    - 缓存序列化结果：未变化的玩家在每次 get_state_payload 时直接复用同一个 dict
+      （缓存的 dict 会被多个负载共享，调用方不得修改）
+    - 修改对外字段（sid/name/x/y/hp/coins/shield）的代码必须先调用 touch()，
+      这里不重载 __setattr__，因为那会让每次赋值慢一个数量级
+    """
+    __slots__ = ('sid', 'name', 'x', 'y', 'coins', 'hp', 'shield',
+                 'start_time', 'finished', 'finish_time', 'index', 'token', '_cache')
+
+    def __init__(self, sid, name, x, y, start_time):
+        self.sid = sid
+        self.name = name
+        self.x = x
+        self.y = y
+        self.coins = 0
+        self.hp = 100
+        self.shield = False
+        self.start_time = start_time
+        self.finished = False
+        self.finish_time = None
+        self.index = 0        # 房间内唯一编号（二进制状态帧用它代替 sid/name）
+        self.token = None     # 会话令牌：断线重连时凭它找回玩家记录
+        self._cache = None
+
+    def touch(self):
+        """标记为已变化（作废序列化缓存）"""
+        self._cache = None
+
+    @property
+    def dirty(self):
+        """自上次序列化以来是否被 touch 过"""
+        return self._cache is None
+
+    def serialize(self):
+        """前端需要的字典格式（带缓存）"""
+        c = self._cache
+        if c is None:
+            c = self._cache = {
+                "sid": self.sid,  # 玩家唯一标识
+                "name": self.name,  # 玩家名称
+                "x": self.x,  # x坐标
+                "y": self.y,  # y坐标
+                "hp": self.hp,  # 生命值
+                "coins": self.coins,  # 金币数量
+                "shield": self.shield  # 护盾状态
+            }
+        return c
+
+    def snapshot(self):
+        """完整可序列化快照（用于保存成绩、写世界快照等）"""
+        return {
+            "sid": self.sid,
+            "name": self.name,
+            "x": self.x,
+            "y": self.y,
+            "coins": self.coins,
+            "hp": self.hp,
+            "shield": self.shield,
+            "finished": self.finished,
+            "finish_time": self.finish_time
+        }
+
 
 #register/login 注册/登录
 class LoginAndRegister:
@@ -23,11 +98,103 @@ class LoginAndRegister:
         else:
             return False
 
+def build_world(width, height, rng=random, trap_divisor=15, box_divisor=10):
+    """
+    生成服务器迷宫（纯函数，不碰引擎状态；离线分析工具 maze_analytics 也直接调用）
+    :param width/height: 奇数尺寸
+    :param rng: 随机源（默认全局 random，引擎先 random.seed(seed) 再调用，与原先的生成结果一致）
+    :param trap_divisor/box_divisor: 每多少个通路格放一个陷阱/盲盒
+    :return: {"grid", "start", "exit", "traps", "boxes"}
+    """
+    # 初始化网格（全墙）
+    grid = [[0 for _ in range(width)] for __ in range(height)]
+    # DFS 回溯器
+    stack = [(1,1)]
+    grid[1][1] = 1
+    dirs = [(0,2),(0,-2),(2,0),(-2,0)]
+    while stack:
+        x,y = stack[-1]
+        rng.shuffle(dirs)
+        carved = False
+        for dx,dy in dirs:
+            nx,ny = x+dx, y+dy
+            if 1 <= nx < width-1 and 1 <= ny < height-1 and grid[ny][nx] == 0:
+                grid[ny][nx] = 1
+                grid[y + dy//2][x + dx//2] = 1
+                stack.append((nx,ny))
+                carved = True
+                break
+        if not carved:
+            stack.pop()
+    start = (1,1)
+
+    # BFS 求最远单元作为出口
+    q = deque([start])
+    dist = {start:0}
+    while q:
+        cx,cy = q.popleft()
+        for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
+            nx,ny = cx+dx, cy+dy
+            if 0<=nx<width and 0<=ny<height and grid[ny][nx]==1 and (nx,ny) not in dist:
+                dist[(nx,ny)] = dist[(cx,cy)] + 1
+                q.append((nx,ny))
+    # 出口选择最远点
+    exit_ = max(dist.keys(), key=lambda k: dist[k])
+
+    # 放置陷阱与盲盒（基于通路单元）
+    path_cells = list(dist.keys())
+    traps = []
+    boxes = []
+
+    # 确保在解路径上放一个盲盒
+    prev = {start:None}
+    q = deque([start])
+    while q:
+        cx,cy = q.popleft()
+        for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
+            nx,ny = cx+dx, cy+dy
+            if 0<=nx<width and 0<=ny<height and grid[ny][nx]==1 and (nx,ny) not in prev:
+                prev[(nx,ny)] = (cx,cy)
+                q.append((nx,ny))
+    path = []
+    cur = exit_
+    while cur:
+        path.append(cur)
+        cur = prev.get(cur)
+    possible_box_positions = [p for p in path[1:-1]]
+    if possible_box_positions:
+        bx = rng.choice(possible_box_positions)
+        boxes.append({"pos":[bx[0],bx[1]], "type":"guaranteed", "coins": rng.randint(30,80)})
+
+    # 随机其他陷阱
+    sample_k = min(max(3, len(path_cells)//trap_divisor), len(path_cells))
+    for p in rng.sample(path_cells, k=sample_k):
+        if p == start or p == exit_:
+            continue
+        t = rng.choice(["teleport","damage","slow"])
+        traps.append({"pos":[p[0],p[1]], "type":t})
+
+    # 更多盲盒
+    sample_k2 = min(max(5, len(path_cells)//box_divisor), len(path_cells))
+    for p in rng.sample(path_cells, k=sample_k2):
+        if p == start or p == exit_: continue
+        if any(p[0]==b['pos'][0] and p[1]==b['pos'][1] for b in boxes): continue
+        boxes.append({"pos":[p[0],p[1]], "type":"random", "coins": rng.randint(10,60)})
+
+    return {"grid": grid, "start": start, "exit": exit_, "traps": traps, "boxes": boxes}
+
+
 # GameEngine 支持以 socketio 对象为参数启动定时任务
 class GameEngine:
-    def __init__(self, socketio, w=21, h=21):
+    BOX_REFRESH_INTERVAL = 20   # 盲盒刷新周期（秒）
+    RANK_BROADCAST_INTERVAL = 1.0   # 实时进度排名的广播间隔（秒，有变化才发送）
+    SESSION_GRACE = 60          # 断线后保留玩家记录的时长（秒），期间可凭令牌恢复
+
+    def __init__(self, socketio, w=21, h=21, snapshot_path=None, snapshot_interval=30,
+                 scheduler=None, room='main', lazy=False):
         self.sock = socketio
-        self.lock = Lock()  # 保护共享状态
+        self.room = room      # 广播使用的 SocketIO 房间名
+        self.lock = ProfiledLock(Lock())  # 保护共享状态（可在运行时开启竞争分析）
         # 世界状态
         self.width = w
         self.height = h
@@ -37,113 +204,86 @@ class GameEngine:
         self.traps = []       # 列表：{"pos":[x,y],"type":"teleport"/"damage"/"slow"}
         self.boxes = []       # 列表：{"pos":[x,y],"type":"random","coins":n}
         self.shop = []        # 商品列表
-        # 玩家状态： sid -> player dict
-        self.players = {}     # player: {"sid":..., "name":..., "x":..,"y":..,"coins":..,"hp":..,"shield":..,"start_time":..,"finished":False,"finish_time":None}
-        # 初始化世界
-        self.generate_new_maze(self.width, self.height)
-        # 启动背景任务：盲盒定时刷新
-        self.sock.start_background_task(self._box_refresher)
-
-    # 在game_engine.py的GameEngine类中添加以下方法
+        # 世界版本：迷宫生成、网格被修改（炸墙）时递增，派生数据按版本失效
+        # 以毫秒时间戳为起点，保证进程重启后不会与旧进程的版本号撞车（快照会保存并恢复它）
+        self.world_version = int(time.time() * 1000)
+        self._exit_field = None   # (world_version, parent, dist)，见 _get_exit_field
+        self._world_hash = None   # (world_version, hash)，见 _get_world_hash
+        # 实时进度排名（按到出口的剩余步数），世界版本变化时整体重建
+        self.ranking = DistanceRanking()
+        self._ranking_version = -1
+        self._ranking_dirty = False
+        # 玩家状态
+        self.players = {}     # sid -> PlayerRecord
+        self._next_index = 1  # 下一个玩家编号（不复用，避免客户端名册错位）
+        # 断线（或从快照恢复）但仍在宽限期内的玩家：token -> (PlayerRecord, 过期时间)
+        self.detached = {}
+        self.monsters = None  # 怪物系统（MonsterSystem，由房间管理器注入；未注入时开箱怪物只扣血）
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        # 定时事件：多个引擎可共享同一个调度器（只需一个后台任务驱动）
+        if scheduler is None:
+            scheduler = Scheduler()
+            self.sock.start_background_task(scheduler.run_forever, self.sock.sleep)
+        self.scheduler = scheduler
+        # 世界是否已构建；lazy=True 时推迟到第一次 join（冷启动时先绑定端口）
+        self.world_ready = False
+        self._init_lock = Lock()    # 串行化首次构建（构建过程会自己取 self.lock，不能复用它）
+        if not lazy:
+            self.ensure_world()
+        self._timers = [
+            self.scheduler.call_every(self.BOX_REFRESH_INTERVAL, self._refresh_boxes),
+            self.scheduler.call_every(self.RANK_BROADCAST_INTERVAL, self._broadcast_ranking),
+        ]
+        if snapshot_path:
+            self._timers.append(self.scheduler.call_every(self.snapshot_interval, self._save_snapshot_quietly))
+
+    def close(self):
+        """房间关闭：取消本引擎在共享调度器上的定时事件，删除其快照（关闭的房间重启后不再恢复）"""
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        if self.snapshot_path:
+            snapshot.remove_snapshot(self.snapshot_path)
+
+    def ensure_world(self):
+        """按需构建世界：优先从快照恢复，失败再生成（已构建时直接返回）"""
+        if self.world_ready:
+            return
+        with self._init_lock:
+            # 并发的首次 join / HTTP 请求只构建一次，后来者等待后直接返回
+            if self.world_ready:
+                return
+            t0 = time.perf_counter()
+            if not (self.snapshot_path and self.load_snapshot()):
+                self.generate_new_maze(self.width, self.height)
+            record_phase('build_world', time.perf_counter() - t0)
+
     def _serialize_player(self, player):
-        """将玩家对象转换为前端需要的字典格式"""
-        return {
-            "sid": player["sid"],  # 玩家唯一标识
-            "name": player["name"],  # 玩家名称
-            "x": player["x"],  # x坐标
-            "y": player["y"],  # y坐标
-            "hp": player["hp"],  # 生命值
-            "coins": player["coins"],  # 金币数量
-            "shield": player.get("shield", False)  # 护盾状态（默认无）
-        }
+        """将玩家对象转换为前端需要的字典格式（未变化的玩家直接复用缓存）"""
+        return player.serialize()
 
     # ---------------- Maze 生成与世界初始化 ----------------
+    @timed('engine.generate_new_maze')
     def generate_new_maze(self, width=21, height=21, seed=None):
         """生成新的迷宫并初始化陷阱/盲盒/商店配置"""
         with self.lock:
             if seed is None:
                 seed = int(time.time() * 1000) & 0xffffffff
             random.seed(seed)
+            if self.monsters is not None:
+                self.monsters.clear_room(self)
             # 强制奇数
             if width % 2 == 0: width += 1
             if height % 2 == 0: height += 1
             self.width = width
             self.height = height
-            # 初始化网格（全墙）
-            grid = [[0 for _ in range(width)] for __ in range(height)]
-            # DFS 回溯器
-            stack = [(1,1)]
-            grid[1][1] = 1
-            dirs = [(0,2),(0,-2),(2,0),(-2,0)]
-            while stack:
-                x,y = stack[-1]
-                random.shuffle(dirs)
-                carved = False
-                for dx,dy in dirs:
-                    nx,ny = x+dx, y+dy
-                    if 1 <= nx < width-1 and 1 <= ny < height-1 and grid[ny][nx] == 0:
-                        grid[ny][nx] = 1
-                        grid[y + dy//2][x + dx//2] = 1
-                        stack.append((nx,ny))
-                        carved = True
-                        break
-                if not carved:
-                    stack.pop()
-            self.grid = grid
-            self.start = (1,1)
-
-            # BFS 求最远单元作为出口
-            q = deque([self.start])
-            dist = {self.start:0}
-            while q:
-                cx,cy = q.popleft()
-                for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-                    nx,ny = cx+dx, cy+dy
-                    if 0<=nx<width and 0<=ny<height and grid[ny][nx]==1 and (nx,ny) not in dist:
-                        dist[(nx,ny)] = dist[(cx,cy)] + 1
-                        q.append((nx,ny))
-            # 出口选择最远点
-            self.exit = max(dist.keys(), key=lambda k: dist[k])
-
-            # 放置陷阱与盲盒（基于通路单元）
-            path_cells = list(dist.keys())
-            self.traps = []
-            self.boxes = []
-
-            # 确保在解路径上放一个盲盒
-            prev = {self.start:None}
-            q = deque([self.start])
-            while q:
-                cx,cy = q.popleft()
-                for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-                    nx,ny = cx+dx, cy+dy
-                    if 0<=nx<width and 0<=ny<height and grid[ny][nx]==1 and (nx,ny) not in prev:
-                        prev[(nx,ny)] = (cx,cy)
-                        q.append((nx,ny))
-            path = []
-            cur = self.exit
-            while cur:
-                path.append(cur)
-                cur = prev.get(cur)
-            possible_box_positions = [p for p in path[1:-1]]
-            if possible_box_positions:
-                bx = random.choice(possible_box_positions)
-                self.boxes.append({"pos":[bx[0],bx[1]], "type":"guaranteed", "coins": random.randint(30,80)})
-
-            # 随机其他陷阱
-            sample_k = min(max(3, len(path_cells)//15), len(path_cells))
-            for p in random.sample(path_cells, k=sample_k):
-                if p == self.start or p == self.exit:
-                    continue
-                t = random.choice(["teleport","damage","slow"])
-                self.traps.append({"pos":[p[0],p[1]], "type":t})
-
-            # 更多盲盒
-            sample_k2 = min(max(5, len(path_cells)//10), len(path_cells))
-            for p in random.sample(path_cells, k=sample_k2):
-                if p == self.start or p == self.exit: continue
-                if any(p[0]==b['pos'][0] and p[1]==b['pos'][1] for b in self.boxes): continue
-                self.boxes.append({"pos":[p[0],p[1]], "type":"random", "coins": random.randint(10,60)})
+            world = build_world(width, height)
+            self.grid = world["grid"]
+            self.start = world["start"]
+            self.exit = world["exit"]
+            self.traps = world["traps"]
+            self.boxes = world["boxes"]
 
             # 商店基础物品
             self.shop = [
@@ -152,46 +292,92 @@ class GameEngine:
                 {"id":"heal","price":40,"desc":"恢复生命值"},
             ]
 
+            # 断线玩家的进度属于旧世界，随之作废
+            self.detached = {}
+            self.world_ready = True
+            self.world_version += 1
             # 重置玩家位置（所有在线玩家回起点并清状态）
             for p in self.players.values():
-                p['x'], p['y'] = self.start
-                p['coins'] = 0
-                p['hp'] = 100
-                p['shield'] = False
-                p['finished'] = False
-                p['finish_time'] = None
-                p['start_time'] = time.time()
+                p.touch()
+                p.x, p.y = self.start
+                p.coins = 0
+                p.hp = 100
+                p.shield = False
+                p.finished = False
+                p.finish_time = None
+                p.start_time = time.time()
 
 
     # ---------------- Player 管理 ----------------
+    @timed('engine.add_player')
     def add_player(self, sid, name):
         """添加新玩家，返回玩家对象引用（服务器内部使用）"""
+        self.ensure_world()
         with self.lock:
             if sid in self.players:
                 return self.players[sid]
             # 新玩家在起点出现
-            p = {
-                "sid": sid,
-                "name": name,
-                "x": self.start[0],
-                "y": self.start[1],
-                "coins": 0,
-                "hp": 100,
-                "shield": False,
-                "start_time": time.time(),
-                "finished": False,
-                "finish_time": None
-            }
+            p = PlayerRecord(sid, name, self.start[0], self.start[1], time.time())
+            p.token = secrets.token_urlsafe(16)
+            p.index = self._next_index
+            self._next_index += 1
             self.players[sid] = p
+            self._update_rank(p)
             return p
 
+    @timed('engine.remove_player')
     def remove_player(self, sid):
-        """移除玩家（断开连接时调用）"""
+        """移除玩家（断开连接时调用），返回被移除的玩家记录（不存在时为 None）"""
         with self.lock:
-            if sid in self.players:
-                del self.players[sid]
+            self.ranking.remove(sid)
+            self._ranking_dirty = True
+            return self.players.pop(sid, None)
+
+    @timed('engine.detach_player')
+    def detach_player(self, sid):
+        """
+        断线时调用：玩家从世界中隐藏，但记录保留 SESSION_GRACE 秒，
+        期间客户端可凭令牌 resume_player 找回进度；返回玩家记录（不存在时为 None）
+        """
+        with self.lock:
+            p = self.players.pop(sid, None)
+            if p is None:
+                return None
+            self.ranking.remove(sid)
+            self._ranking_dirty = True
+            self._detach(p, time.time() + self.SESSION_GRACE)
+        return p
+
+    def _detach(self, p, deadline):
+        """（锁内调用）登记断线玩家并安排到期清理"""
+        p.sid = None
+        self.detached[p.token] = (p, deadline)
+        self.scheduler.call_later(max(0.0, deadline - time.time()), self._expire_session, p.token, deadline)
+
+    @timed('engine.resume_player')
+    def resume_player(self, token, sid):
+        """凭令牌恢复宽限期内的玩家，绑定到新的 sid；令牌无效或已过期返回 None"""
+        self.ensure_world()
+        with self.lock:
+            entry = self.detached.pop(token, None) if token else None
+            if entry is None:
+                return None
+            p = entry[0]
+            p.touch()
+            p.sid = sid
+            self.players[sid] = p
+            self._update_rank(p)
+            return p
+
+    def _expire_session(self, token, deadline):
+        """宽限期结束仍未恢复：彻底移除（期间若已恢复又断线，以新的过期时间为准）"""
+        with self.lock:
+            entry = self.detached.get(token)
+            if entry is not None and entry[1] <= deadline:
+                del self.detached[token]
 
     # ---------------- 行为处理：移动、购买、开箱等 ----------------
+    @timed('engine.process_move')
     def process_move(self, sid, dx, dy):
         """
         权威处理移动指令：
@@ -203,86 +389,99 @@ class GameEngine:
         action_info_for_client 用于给发起者的反馈消息
         """
         with self.lock:
-            if sid not in self.players:
-                return {}, {"ok": False, "msg": "玩家不存在或未加入游戏。"}
-            player = self.players[sid]
-            if player['finished']:
-                return {}, {"ok": False, "msg": "你已完成本局。"}
-
-            nx = player['x'] + dx
-            ny = player['y'] + dy
-            # 边界检查
-            if not (0 <= nx < self.width and 0 <= ny < self.height):
-                return {}, {"ok": False, "msg": "不能移出地图边界。"}
-            # 遇墙
-            if self.grid[ny][nx] == 0:
-                # 撞墙惩罚
-                player['hp'] = max(0, player['hp'] - 5)
-                return {}, {"ok": True, "msg": "撞墙！生命 -5"}
-            # 合法移动：更新位置
-            player['x'] = nx
-            player['y'] = ny
-
-            # 检查是否到达出口
-            changed = {}
-            if (nx,ny) == tuple(self.exit):
-                player['finished'] = True
-                player['finish_time'] = int(time.time() - player['start_time'])
-                changed['finished'] = True
-                changed['player_snapshot'] = self._snapshot_player(player)
-                return changed, {"ok": True, "msg": f"到达出口！用时 {player['finish_time']} 秒，金币 {player['coins']}"}
-
-            # 检查陷阱（若在陷阱坐标上）
-            for t in self.traps:
-                if t['pos'][0] == nx and t['pos'][1] == ny:
-                    # 触发陷阱
-                    if player['shield']:
-                        player['shield'] = False
-                        return {}, {"ok": True, "msg": "触发陷阱，但防护盾抵挡了一次伤害。"}
-                    if t['type'] == 'damage':
-                        player['hp'] = max(0, player['hp'] - 30)
-                        return {}, {"ok": True, "msg": "遭遇伤害陷阱，生命 -30"}
-                    elif t['type'] == 'teleport':
-                        # 随机传送到任意通路单元
-                        pass_cells = []
-                        for yy in range(self.height):
-                            for xx in range(self.width):
-                                if self.grid[yy][xx] == 1:
-                                    pass_cells.append((xx,yy))
-                        dest = random.choice(pass_cells)
-                        player['x'], player['y'] = dest
-                        return {}, {"ok": True, "msg": f"触发传送陷阱，传送到 {dest}"}
-                    elif t['type'] == 'slow':
-                        # 示例：减速转换为扣血
-                        player['hp'] = max(0, player['hp'] - 10)
-                        return {}, {"ok": True, "msg": "触发减速陷阱（示意），生命 -10"}
-
-            # 检查盲盒（若当前位置有盲盒）
-            for i, b in enumerate(self.boxes):
-                if b['pos'][0] == nx and b['pos'][1] == ny:
-                    # 开箱：根据类型给奖励或惩罚（服务器决定内容）
-                    content = self._resolve_box_content(b)
-                    # 从世界中移除该盲盒（多人版需原子）
-                    self.boxes.pop(i)
-                    # 应用内容结果
-                    if content['type'] == 'coins':
-                        player['coins'] += content['amount']
-                        return {}, {"ok": True, "msg": f"开箱获得金币 {content['amount']}"}
-                    elif content['type'] == 'monster':
-                        player['hp'] = max(0, player['hp'] - 20)
-                        return {}, {"ok": True, "msg": "开箱出现怪物，被追击受伤 -20（示意）"}
-                    elif content['type'] == 'item':
-                        if content['id'] == 'shield':
-                            player['shield'] = True
-                            return {}, {"ok": True, "msg": "获得防护盾"}
-                        # 其它物品可在此扩展
-                    elif content['type'] == 'trap':
-                        player['hp'] = max(0, player['hp'] - 15)
-                        return {}, {"ok": True, "msg": "开箱触发陷阱，生命 -15"}
-
-            # 常规移动没有特殊事件
-            return {}, {"ok": True, "msg": "移动成功。"}
+            changed, info = self._apply_move(sid, dx, dy)
+            player = self.players.get(sid)
+            if player is not None and info.get('ok'):
+                info['rank'], info['remaining'] = self._update_rank(player)
+            return changed, info
+
+    def _apply_move(self, sid, dx, dy):
+        """process_move 的主体（需在锁内调用）"""
+        if sid not in self.players:
+            return {}, {"ok": False, "msg": "玩家不存在或未加入游戏。"}
+        player = self.players[sid]
+        if player.finished:
+            return {}, {"ok": False, "msg": "你已完成本局。"}
+
+        nx = player.x + dx
+        ny = player.y + dy
+        # 边界检查
+        if not (0 <= nx < self.width and 0 <= ny < self.height):
+            return {}, {"ok": False, "msg": "不能移出地图边界。"}
+        # 以下分支都会修改玩家字段（位置或生命），被拒绝的移动不作废序列化缓存
+        player.touch()
+        # 遇墙
+        if self.grid[ny][nx] == 0:
+            # 撞墙惩罚
+            player.hp = max(0, player.hp - 5)
+            return {}, {"ok": True, "msg": "撞墙！生命 -5"}
+        # 合法移动：更新位置
+        player.x = nx
+        player.y = ny
 
+        # 检查是否到达出口
+        changed = {}
+        if (nx,ny) == tuple(self.exit):
+            player.finished = True
+            player.finish_time = int(time.time() - player.start_time)
+            changed['finished'] = True
+            changed['player_snapshot'] = self._snapshot_player(player)
+            return changed, {"ok": True, "msg": f"到达出口！用时 {player.finish_time} 秒，金币 {player.coins}"}
+
+        # 检查陷阱（若在陷阱坐标上）
+        for t in self.traps:
+            if t['pos'][0] == nx and t['pos'][1] == ny:
+                # 触发陷阱
+                if player.shield:
+                    player.shield = False
+                    return {}, {"ok": True, "msg": "触发陷阱，但防护盾抵挡了一次伤害。"}
+                if t['type'] == 'damage':
+                    player.hp = max(0, player.hp - 30)
+                    return {}, {"ok": True, "msg": "遭遇伤害陷阱，生命 -30"}
+                elif t['type'] == 'teleport':
+                    # 随机传送到任意通路单元
+                    pass_cells = []
+                    for yy in range(self.height):
+                        for xx in range(self.width):
+                            if self.grid[yy][xx] == 1:
+                                pass_cells.append((xx,yy))
+                    dest = random.choice(pass_cells)
+                    player.x, player.y = dest
+                    return {}, {"ok": True, "msg": f"触发传送陷阱，传送到 {dest}"}
+                elif t['type'] == 'slow':
+                    # 示例：减速转换为扣血
+                    player.hp = max(0, player.hp - 10)
+                    return {}, {"ok": True, "msg": "触发减速陷阱（示意），生命 -10"}
+
+        # 检查盲盒（若当前位置有盲盒）
+        for i, b in enumerate(self.boxes):
+            if b['pos'][0] == nx and b['pos'][1] == ny:
+                # 开箱：根据类型给奖励或惩罚（服务器决定内容）
+                content = self._resolve_box_content(b)
+                # 从世界中移除该盲盒（多人版需原子）
+                self.boxes.pop(i)
+                # 应用内容结果
+                if content['type'] == 'coins':
+                    player.coins += content['amount']
+                    return {}, {"ok": True, "msg": f"开箱获得金币 {content['amount']}"}
+                elif content['type'] == 'monster':
+                    if self.monsters is not None and self.monsters.spawn(self, nx, ny) is not None:
+                        return {}, {"ok": True, "msg": "开箱放出了怪物，快跑！"}
+                    player.hp = max(0, player.hp - 20)
+                    return {}, {"ok": True, "msg": "开箱出现怪物，被追击受伤 -20（示意）"}
+                elif content['type'] == 'item':
+                    if content['id'] == 'shield':
+                        player.shield = True
+                        return {}, {"ok": True, "msg": "获得防护盾"}
+                    # 其它物品可在此扩展
+                elif content['type'] == 'trap':
+                    player.hp = max(0, player.hp - 15)
+                    return {}, {"ok": True, "msg": "开箱触发陷阱，生命 -15"}
+
+        # 常规移动没有特殊事件
+        return {}, {"ok": True, "msg": "移动成功。"}
+
+    @timed('engine.buy_item')
     def buy_item(self, sid, item_id):
         """服务器端购买验证与处理"""
         with self.lock:
@@ -293,17 +492,18 @@ class GameEngine:
             item = next((it for it in self.shop if it['id']==item_id), None)
             if not item:
                 return False, "商品不存在"
-            if player['coins'] < item['price']:
+            if player.coins < item['price']:
                 return False, "金币不足"
             # 扣钱并发放效果（示例：shield / heal / bomb）
-            player['coins'] -= item['price']
+            player.touch()
+            player.coins -= item['price']
             if item_id == 'shield':
-                player['shield'] = True
+                player.shield = True
             elif item_id == 'heal':
-                player['hp'] = min(100, player['hp'] + 50)
+                player.hp = min(100, player.hp + 50)
             elif item_id == 'bomb':
                 # 简单实现：如果玩家在死胡同则炸开一堵墙（尝试邻近不可通行点）
-                self._use_bomb_at(player['x'], player['y'])
+                self._use_bomb_at(player.x, player.y)
             return True, f"购买成功：{item['desc']}"
 
     # ---------------- 内部工具方法 ----------------
@@ -314,9 +514,145 @@ class GameEngine:
             if 0<=nx<self.width and 0<=ny<self.height and self.grid[ny][nx]==0:
                 # 使该墙变为通路
                 self.grid[ny][nx] = 1
+                self.world_version += 1
                 return True
         return False
 
+    def _get_world_hash(self):
+        """
+        网格内容哈希（需在锁内调用），每个世界版本只计算一次
+        与版本号不同，相同的迷宫（同种子/同快照）哈希相同，客户端可跨会话缓存网格
+        """
+        cached = self._world_hash
+        if cached is not None and cached[0] == self.world_version:
+            return cached[1]
+        h = hashlib.blake2b(digest_size=12)
+        h.update(b'%d,%d;' % (self.width, self.height))
+        h.update(bytes(v for row in self.grid for v in row))
+        digest = h.hexdigest()
+        self._world_hash = (self.world_version, digest)
+        return digest
+
+    def get_grid_payload(self):
+        """单独下发网格（客户端缓存失效时请求）"""
+        with self.lock:
+            return {
+                "grid": self.grid,
+                "width": self.width,
+                "height": self.height,
+                "world_hash": self._get_world_hash(),
+            }
+
+    def _get_exit_field(self):
+        """
+        以出口为根的 BFS 树（需在锁内调用），每个世界版本只计算一次
+        parent[i]：单元 i（i = y*width + x）朝出口方向的下一格，-1 表示无
+        dist[i]：到出口的步数，-1 表示不可达
+        """
+        field = self._exit_field
+        if field is not None and field[0] == self.world_version:
+            return field
+        w, h, grid = self.width, self.height, self.grid
+        parent = [-1] * (w * h)
+        dist = [-1] * (w * h)
+        ex, ey = self.exit
+        root = ey * w + ex
+        dist[root] = 0
+        q = deque([root])
+        while q:
+            i = q.popleft()
+            cy, cx = divmod(i, w)
+            d = dist[i] + 1
+            for nx, ny in ((cx+1, cy), (cx-1, cy), (cx, cy+1), (cx, cy-1)):
+                if 0 <= nx < w and 0 <= ny < h and grid[ny][nx] == 1:
+                    j = ny * w + nx
+                    if dist[j] < 0:
+                        dist[j] = d
+                        parent[j] = i
+                        q.append(j)
+        field = self._exit_field = (self.world_version, parent, dist)
+        return field
+
+    # ---------------- 实时进度排名 ----------------
+    def _sync_ranking(self):
+        """世界版本变化后按新的距离场重建排名（需在锁内调用），返回距离数组"""
+        version, _, dist = self._get_exit_field()
+        if self._ranking_version != version:
+            self.ranking.reset(self.width * self.height)
+            w = self.width
+            for p in self.players.values():
+                self.ranking.update(p.sid, p.name, dist[p.y * w + p.x])
+            self._ranking_version = version
+            self._ranking_dirty = True
+        return dist
+
+    def _update_rank(self, player):
+        """更新单个玩家的排名位置 O(log D)（需在锁内调用），返回 (名次, 剩余步数)"""
+        dist = self._sync_ranking()
+        d = dist[player.y * self.width + player.x]
+        self.ranking.update(player.sid, player.name, d)
+        self._ranking_dirty = True
+        return self.ranking.rank(player.sid), d
+
+    def get_progress_ranking(self, k=10):
+        """前 k 名：[{"rank", "name", "remaining"}]，以及总人数"""
+        with self.lock:
+            return self._progress_ranking(k)
+
+    def _progress_ranking(self, k=10):
+        """get_progress_ranking 的主体（需在锁内调用）"""
+        self._sync_ranking()
+        return {
+            "top": [{"rank": r, "name": n, "remaining": d} for r, n, d in self.ranking.top(k)],
+            "total": len(self.ranking),
+        }
+
+    def _broadcast_ranking(self):
+        """调度器定时调用：排名有变化时才广播（节流）"""
+        if not self.world_ready:
+            return
+        if not self._ranking_dirty and self._ranking_version == self.world_version:
+            return
+        with self.lock:
+            payload = self._progress_ranking()   # 可能经 _sync_ranking 重新置脏，须先取再清标志
+            self._ranking_dirty = False
+        self.sock.emit('progress_rank', payload, room=self.room)
+
+    @timed('engine.get_path')
+    def get_path(self, x, y, limit=None):
+        """
+        从 (x,y) 到出口的最短路（沿出口 BFS 树的父链走，O(路径长度)）
+        limit：只返回接下来的 limit 步（提示模式）
+        返回 None 表示坐标越界或不可达
+        """
+        with self.lock:
+            w, h = self.width, self.height
+            if not (0 <= x < w and 0 <= y < h):
+                return None
+            version, parent, dist = self._get_exit_field()
+            i = y * w + x
+            if dist[i] < 0:
+                return None
+            n = dist[i] if limit is None else min(limit, dist[i])
+            steps = []
+            for _ in range(n):
+                i = parent[i]
+                steps.append([i % w, i // w])
+            return {
+                "from": [x, y],
+                "distance": dist[y * w + x],
+                "steps": steps,
+                "complete": n == dist[y * w + x],
+                "world_version": version,
+            }
+
+    def get_hint(self, sid, limit=None):
+        """玩家当前位置到出口的提示路径"""
+        p = self.players.get(sid)
+        if p is None:
+            return None
+        return self.get_path(p.x, p.y, limit)
+
     def _resolve_box_content(self, box):
         """基于 box['type'] 决定服务器端盲盒产出（随机逻辑）"""
         r = random.random()
@@ -330,52 +666,153 @@ class GameEngine:
 
     def _snapshot_player(self, p):
         """生成可序列化玩家快照（用于保存成绩等）"""
-        return {
-            "sid": p['sid'],
-            "name": p['name'],
-            "x": p['x'],
-            "y": p['y'],
-            "coins": p['coins'],
-            "hp": p['hp'],
-            "shield": p['shield'],
-            "finished": p['finished'],
-            "finish_time": p['finish_time']
-        }
+        return p.snapshot()
+
+    # ---------------- 快照：崩溃恢复 / 热重启 ----------------
+    @timed('engine.save_snapshot')
+    def save_snapshot(self):
+        """把当前世界写入快照文件（锁内只做拷贝，编码与磁盘 IO 在锁外）"""
+        if not self.snapshot_path or not self.world_ready:
+            # 世界尚未构建（懒加载且无人加入）时不能用空世界覆盖已有快照
+            return False
+        with self.lock:
+            now = time.time()
+            grid = [row[:] for row in self.grid]
+            width, height = self.width, self.height
+            players = [(p, None) for p in self.players.values()] + list(self.detached.values())
+            entities = {
+                "saved_at": now,
+                "start": list(self.start),
+                "exit": list(self.exit),
+                "traps": copy.deepcopy(self.traps),
+                "boxes": copy.deepcopy(self.boxes),
+                "shop": copy.deepcopy(self.shop),
+                # start_time 保存为已用时长，恢复时换算回来，避免把停机时间算进成绩
+                # 令牌一并保存：重启后客户端仍可在宽限期内凭令牌恢复
+                "players": [dict(self._snapshot_player(p), elapsed=now - p.start_time, token=p.token)
+                            for p, _ in players],
+                "world_version": self.world_version,
+            }
+        snapshot.write_snapshot(self.snapshot_path, snapshot.encode_world(grid, width, height, entities))
+        return True
+
+    def load_snapshot(self):
+        """从快照文件恢复世界，成功返回 True；文件不存在或损坏返回 False"""
+        data = snapshot.read_snapshot(self.snapshot_path)
+        if data is None:
+            return False
+        try:
+            grid, width, height, entities = snapshot.decode_world(data)
+        except (snapshot.SnapshotError, ValueError) as e:
+            print(f"[snapshot] 无法恢复快照 {self.snapshot_path}: {e}")
+            return False
+        now = time.time()
+        with self.lock:
+            self.grid = grid
+            self.width = width
+            self.height = height
+            self.start = tuple(entities['start'])
+            self.exit = tuple(entities['exit'])
+            self.traps = entities['traps']
+            self.boxes = entities['boxes']
+            self.shop = entities['shop']
+            self.detached = {}
+            self.world_ready = True
+            # 沿用快照中的版本号：重连客户端手里的网格仍然有效，只需补发状态
+            self.world_version = entities.get('world_version', self.world_version + 1)
+            for rec in entities['players']:
+                p = PlayerRecord(None, rec['name'], rec['x'], rec['y'], now - rec['elapsed'])
+                p.coins = rec['coins']
+                p.hp = rec['hp']
+                p.shield = rec['shield']
+                p.finished = rec['finished']
+                p.finish_time = rec['finish_time']
+                p.token = rec.get('token') or secrets.token_urlsafe(16)
+                p.index = self._next_index
+                self._next_index += 1
+                self._detach(p, now + self.SESSION_GRACE)
+        return True
+
+    def _save_snapshot_quietly(self):
+        """定时快照：磁盘错误只记录，不中断调度"""
+        try:
+            self.save_snapshot()
+        except OSError as e:
+            print(f"[snapshot] 写入失败: {e}")
+
+    # ---------------- 内存统计 ----------------
+    def memory_report(self):
+        """
+        本房间各部分内存估算（字节）：网格、实体、在线/断线玩家、派生缓存
+        小整数、驻留字符串等共享对象在同一次统计内只计一次
+        """
+        with self.lock:
+            seen = set()
+            parts = {
+                "grid": deep_sizeof(self.grid, seen),
+                "entities": deep_sizeof([self.traps, self.boxes, self.shop], seen),
+                "players": deep_sizeof(self.players, seen),
+                "detached": deep_sizeof(self.detached, seen),
+                "caches": deep_sizeof([self._exit_field, self._world_hash, self.ranking.__dict__], seen),
+            }
+            return {
+                "room": self.room,
+                "world_version": self.world_version,
+                "size": [self.width, self.height],
+                "players": len(self.players),
+                "detached": len(self.detached),
+                "bytes": parts,
+                "total_bytes": sum(parts.values()),
+            }
 
     # ---------------- 状态序列化（发送给客户端） ----------------
-    def get_init_payload_for(self, sid):
-        """返回连接某位玩家时需要的初始化数据（包含完整网格和世界元信息）"""
+    @timed('engine.get_init_payload_for')
+    def get_init_payload_for(self, sid, known_hashes=()):
+        """
+        返回连接某位玩家时需要的初始化数据（包含完整网格和世界元信息）
+        known_hashes：客户端已缓存的网格哈希；命中时 grid 为 None，由客户端从缓存取
+        """
         with self.lock:
+            world_hash = self._get_world_hash()
             payload = {
-                "grid": self.grid,
+                "grid": None if world_hash in known_hashes else self.grid,
+                "world_hash": world_hash,
                 "width": self.width,
                 "height": self.height,
                 "start": list(self.start),
                 "exit": list(self.exit),
                 "shop": self.shop,
+                "room": self.room,
                 "your_sid": sid,
+                "token": self.players[sid].token if sid in self.players else None,
+                "world_version": self.world_version,
                 "players": [self._serialize_player(p) for p in self.players.values()],
                 "traps_hint": [t for t in self.traps],  # 警示：陷阱一般不完全暴露，前端可选择低透明度显示
                 "boxes": [b for b in self.boxes]
             }
             return payload
 
+    @timed('engine.get_global_init_payload')
     def get_global_init_payload(self):
         """对所有玩家发送的完整初始化数据（例如生成新迷宫时）"""
         with self.lock:
             # 这里用一个通用版本，不带 your_sid（因为是广播）
             return {
+                "room": self.room,
                 "grid": self.grid,
+                "world_hash": self._get_world_hash(),
                 "width": self.width,
                 "height": self.height,
                 "start": list(self.start),
                 "exit": list(self.exit),
                 "shop": self.shop,
+                "world_version": self.world_version,
                 "players": [self._serialize_player(p) for p in self.players.values()],
                 "traps_hint": [t for t in self.traps],
                 "boxes": [b for b in self.boxes]
             }
 
+    @timed('engine.get_state_payload')
     def get_state_payload(self):
         """返回当前世界快照（轻量级），用于频繁广播"""
         with self.lock:
@@ -383,9 +820,28 @@ class GameEngine:
                 "players": [self._serialize_player(p) for p in self.players.values()],
                 "boxes": [b for b in self.boxes],
                 "traps_hint": [t for t in self.traps],  # 可选择性显示
-                "exit": list(self.exit)
+                "exit": list(self.exit),
+                "monsters": self.monsters.view(self) if self.monsters is not None else []
+            }
+
+    @timed('engine.get_state_payload_packed')
+    def get_state_payload_packed(self):
+        """与 get_state_payload 相同，但玩家部分为列式二进制（见 packed_state）"""
+        with self.lock:
+            return {
+                "players": packed_state.encode_players(self.players.values()),
+                "boxes": [b for b in self.boxes],
+                "traps_hint": [t for t in self.traps],
+                "exit": list(self.exit),
+                "monsters": self.monsters.view(self) if self.monsters is not None else []
             }
 
+    def get_roster(self):
+        """玩家编号 -> sid/name 名册：[[index, sid, name], ...]"""
+        with self.lock:
+            return [[p.index, p.sid, p.name] for p in self.players.values()]
+
+    @timed('engine.get_leaderboard_snapshot')
     def get_leaderboard_snapshot(self):
         """
         为内存内排行榜提供基础（这里用数据库为准，发动时可从 DB 获取）
@@ -393,26 +849,23 @@ class GameEngine:
         """
         # 以玩家 finish_time 排序（仅本次在线玩家）
         with self.lock:
-            finished = [p for p in self.players.values() if p['finished']]
-            finished_sorted = sorted(finished, key=lambda x: x['finish_time'])
+            finished = [p for p in self.players.values() if p.finished]
+            finished_sorted = sorted(finished, key=lambda x: x.finish_time)
             # 返回若干字段，供前端显示
-            return [{"name": p['name'], "time": p['finish_time'], "coins": p['coins']} for p in finished_sorted[:10]]
-
-    # ---------------- 盲盒后台刷新任务 ----------------
-    def _box_refresher(self):
-        """周期性刷新盲盒或触发世界事件（每 20 秒刷新盲盒内容提示）"""
-        while True:
-            # 每 20 秒刷新一次（可长期运行）
-            self.sock.sleep(20)
-            with self.lock:
-                # 简单示意：随机把一部分盒子位置替换为新的盒子（模拟“刷新内容”）
-                if len(self.boxes) == 0: continue
-                # 小概率改变某些盒子（示意性）
-                for i in range(len(self.boxes)):
-                    if random.random() < 0.3:
-                        self.boxes[i]['coins'] = random.randint(10,80)
-            # 广播盒子更新，让前端重新展示信息
-            try:
-                self.sock.emit('boxes_refreshed', {"boxes": [b for b in self.boxes]}, room='main')
-            except Exception:
-                pass
+            return [{"name": p.name, "time": p.finish_time, "coins": p.coins} for p in finished_sorted[:10]]
+
+    # ---------------- 定时世界事件 ----------------
+    def _refresh_boxes(self):
+        """周期性刷新盲盒金币（由调度器每 BOX_REFRESH_INTERVAL 秒调用），只广播有变化的盒子"""
+        changed = []
+        with self.lock:
+            # 简单示意：小概率改变某些盒子的金币（模拟“刷新内容”）
+            for b in self.boxes:
+                if random.random() < 0.3:
+                    coins = random.randint(10, 80)
+                    if coins != b['coins']:
+                        b['coins'] = coins
+                        changed.append(dict(b))
+        if changed:
+            # partial=True：前端按坐标合并，而不是整体替换
+            self.sock.emit('boxes_refreshed', {"boxes": changed, "partial": True}, room=self.room)
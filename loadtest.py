@@ -0,0 +1,311 @@
+# loadtest.py
+# -*- coding: utf-8 -*-
+"""
+无界面压测工具：启动 N 个 python-socketio 机器人客户端连接本地服务器
+- 机器人 join 后根据服务器下发的网格沿最短路走向出口，偶尔购买道具、请求新迷宫
+- 统计事件吞吐量、move -> action_result 往返延迟分位数、服务器 CPU 占用
+- 仅依赖本机（Linux /proc 读取 CPU），可用多进程分摊客户端
+
+用法示例：
+  python loadtest.py --clients 200 --processes 4 --duration 30 --spawn-server
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import socketio
+
+import packed_state
+
+DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def exit_parents(grid, width, height, exit_pos):
+    """以出口为根做一次 BFS，返回 {cell: 朝出口的下一格}"""
+    ex = tuple(exit_pos)
+    parent = {ex: None}
+    q = deque([ex])
+    while q:
+        cx, cy = q.popleft()
+        for dx, dy in DIRS:
+            nx, ny = cx + dx, cy + dy
+            if 0 <= nx < width and 0 <= ny < height and grid[ny][nx] == 1 and (nx, ny) not in parent:
+                parent[(nx, ny)] = (cx, cy)
+                q.append((nx, ny))
+    return parent
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Bot:
+    """单个模拟玩家（python-socketio 线程客户端）"""
+
+    def __init__(self, url, name, opts, stop):
+        self.url = url
+        self.name = name
+        self.opts = opts
+        self.stop = stop
+        self.sio = socketio.Client(reconnection=False)
+        self.sid = None
+        self.index = None            # 二进制状态帧中的玩家编号
+        self.pos = None
+        self.parent = {}
+        self.finished = False
+        self.pending = deque()       # 已发送 move 的时间戳，按顺序与 action_result 匹配
+        self.replied = threading.Event()
+        self.rtts = []
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self._bind()
+
+    def _bind(self):
+        sio = self.sio
+
+        @sio.on('init')
+        def on_init(data):
+            self.received += 1
+            if data.get('your_sid'):
+                self.sid = data['your_sid']
+            self.parent = exit_parents(data['grid'], data['width'], data['height'], data['exit'])
+            self._update_self(data.get('players', []))
+
+        @sio.on('state')
+        def on_state(data):
+            self.received += 1
+            self._update_self(data.get('players', []))
+            self._ack(data)
+
+        @sio.on('state_packed')
+        def on_state_packed(data):
+            self.received += 1
+            for p in packed_state.decode_players(data['players']):
+                if p['index'] == self.index:
+                    self._set_pos((p['x'], p['y']))
+                    break
+            self._ack(data)
+
+        @sio.on('roster')
+        def on_roster(data):
+            self.received += 1
+            for index, sid, _ in data.get('players') or data.get('add') or ():
+                if sid == self.sid:
+                    self.index = index
+
+        @sio.on('action_result')
+        def on_action_result(data):
+            self.received += 1
+            if self.pending:
+                self.rtts.append(time.perf_counter() - self.pending.popleft())
+            if '到达出口' in data.get('msg', ''):
+                self.finished = True
+            self.replied.set()
+
+        @sio.on('*')
+        def on_other(event, *args):
+            self.received += 1
+
+    def _ack(self, data):
+        """确认状态帧（服务器收到确认前不会再发下一帧）；--no-ack 模拟不回确认的慢客户端"""
+        if self.opts.no_ack or 'seq' not in data or not self.sio.connected:
+            return
+        try:
+            self.sio.emit('state_ack', {'seq': data['seq']})
+        except socketio.exceptions.BadNamespaceError:
+            pass    # 收尾断开与最后一帧状态同时到达
+
+    def _update_self(self, players):
+        for p in players:
+            if p.get('sid') == self.sid:
+                self._set_pos((p['x'], p['y']))
+                return
+
+    def _set_pos(self, pos):
+        self.pos = pos
+        if pos == (1, 1):
+            self.finished = False
+
+    def _next_step(self):
+        if self.pos is None:
+            return random.choice(DIRS)
+        nxt = self.parent.get(self.pos)
+        if nxt is None:
+            return random.choice(DIRS)
+        return nxt[0] - self.pos[0], nxt[1] - self.pos[1]
+
+    def run(self):
+        try:
+            self.sio.connect(self.url, transports=['websocket'])
+        except Exception:
+            self.errors += 1
+            return
+        join = {'name': self.name}
+        if self.opts.format == 'packed':
+            join['formats'] = ['packed']
+        self.sio.emit('join', join)
+        self.sent += 1
+        opts = self.opts
+        while not self.stop.is_set():
+            r = random.random()
+            if r < opts.new_maze_prob:
+                size = random.choice([15, 21, 27])
+                self.sio.emit('request_new_maze', {'w': size, 'h': size})
+                self.sent += 1
+            elif r < opts.new_maze_prob + opts.buy_prob:
+                self.sio.emit('buy', {'item_id': random.choice(['heal', 'shield', 'bomb'])})
+                self.sent += 1
+            elif not self.finished:
+                dx, dy = self._next_step()
+                self.replied.clear()
+                self.pending.append(time.perf_counter())
+                self.sio.emit('move', {'dx': dx, 'dy': dy})
+                self.sent += 1
+                if not self.replied.wait(opts.timeout):
+                    self.errors += 1
+                    self.pending.clear()
+            time.sleep(opts.move_interval * random.uniform(0.5, 1.5))
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def worker(index, count, url, opts, results):
+    """子进程：运行 count 个机器人，结束后汇报原始数据"""
+    stop = threading.Event()
+    bots = [Bot(url, f"bot{index}_{i}", opts, stop) for i in range(count)]
+    threads = []
+    for bot in bots:
+        t = threading.Thread(target=bot.run, daemon=True)
+        t.start()
+        threads.append(t)
+        time.sleep(opts.ramp / max(1, count))
+    time.sleep(opts.duration)
+    stop.set()
+    for t in threads:
+        t.join(opts.timeout + 1)
+    results.put({
+        "rtts": [r for b in bots for r in b.rtts],
+        "sent": sum(b.sent for b in bots),
+        "received": sum(b.received for b in bots),
+        "errors": sum(b.errors for b in bots),
+        "connected": sum(1 for b in bots if b.sid),
+    })
+
+
+def cpu_seconds(pid):
+    """读取 /proc/<pid>/stat 中的 utime+stime（秒）"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def wait_for_port(host, port, timeout=30):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="MazeGame 压测工具")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5000)
+    ap.add_argument('--clients', type=int, default=50, help='机器人总数')
+    ap.add_argument('--processes', type=int, default=1, help='客户端进程数')
+    ap.add_argument('--duration', type=float, default=20.0, help='稳定运行秒数（不含爬坡）')
+    ap.add_argument('--ramp', type=float, default=2.0, help='每个进程内逐个建立连接的总时长')
+    ap.add_argument('--move-interval', type=float, default=0.1, help='两次操作之间的平均间隔（秒）')
+    ap.add_argument('--buy-prob', type=float, default=0.02)
+    ap.add_argument('--new-maze-prob', type=float, default=0.0005)
+    ap.add_argument('--format', choices=['json', 'packed'], default='json', help='状态帧格式')
+    ap.add_argument('--no-ack', action='store_true', help='不确认状态帧（模拟落后的客户端）')
+    ap.add_argument('--timeout', type=float, default=5.0, help='等待 action_result 的超时')
+    ap.add_argument('--spawn-server', action='store_true', help='自动启动本地 app.py')
+    ap.add_argument('--server-cmd', default=None, help='自定义服务器启动命令（配合 --spawn-server）')
+    ap.add_argument('--server-pid', type=int, default=None, help='已运行服务器的 pid（用于统计 CPU）')
+    return ap
+
+
+def run(opts):
+    """执行一轮压测，返回汇总结果（服务器未就绪时返回 None）"""
+    url = f'http://{opts.host}:{opts.port}'
+    server = None
+    server_pid = opts.server_pid
+    if opts.spawn_server:
+        cmd = opts.server_cmd.split() if opts.server_cmd else [sys.executable, 'app.py']
+        server = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = server.pid
+    try:
+        if not wait_for_port(opts.host, opts.port):
+            return None
+        cpu0 = cpu_seconds(server_pid) if server_pid else None
+        t0 = time.perf_counter()
+
+        results = mp.Queue()
+        per_proc = [opts.clients // opts.processes + (1 if i < opts.clients % opts.processes else 0)
+                    for i in range(opts.processes)]
+        procs = [mp.Process(target=worker, args=(i, n, url, opts, results)) for i, n in enumerate(per_proc) if n]
+        for p in procs:
+            p.start()
+        reports = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        wall = time.perf_counter() - t0
+        cpu1 = cpu_seconds(server_pid) if server_pid else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    rtts = sorted(r for rep in reports for r in rep['rtts'])
+    return {
+        "clients": opts.clients,
+        "connected": sum(rep['connected'] for rep in reports),
+        "errors": sum(rep['errors'] for rep in reports),
+        "wall": wall,
+        "sent": sum(rep['sent'] for rep in reports),
+        "received": sum(rep['received'] for rep in reports),
+        "rtts": rtts,
+        "cpu": (cpu1 - cpu0) if cpu0 is not None else None,
+    }
+
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    r = run(opts)
+    if r is None:
+        print("服务器未就绪", file=sys.stderr)
+        return 1
+    rtts, wall, sent, received = r['rtts'], r['wall'], r['sent'], r['received']
+    print(f"客户端: {r['connected']}/{opts.clients} 已连接, 错误/超时 {r['errors']}")
+    print(f"时长: {wall:.1f}s  发送 {sent} 事件 ({sent / wall:.0f}/s)  接收 {received} 事件 ({received / wall:.0f}/s)")
+    print(f"move -> action_result: n={len(rtts)} ({len(rtts) / wall:.0f} moves/s)")
+    for q in (0.5, 0.9, 0.99, 0.999):
+        print(f"  p{q * 100:g}: {percentile(rtts, q) * 1000:.2f} ms")
+    if rtts:
+        print(f"  max: {rtts[-1] * 1000:.2f} ms")
+    if r['cpu'] is not None:
+        print(f"服务器 CPU: {r['cpu']:.2f}s / {wall:.1f}s = {r['cpu'] / wall * 100:.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
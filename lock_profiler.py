@@ -0,0 +1,163 @@
+# lock_profiler.py
+# -*- coding: utf-8 -*-
+"""
+可在运行时开关的锁竞争分析器
+- ProfiledLock 包装 threading.Lock（eventlet 打补丁后同样适用），接口兼容 with 语句
+- 关闭时只多一次属性判断；开启后按调用点（函数名:行号）记录
+  等待时间、持有时间、排队深度
+- 统计按时间窗口滚动，报告取最近两个窗口的 Top-N
+"""
+import sys
+import time
+from threading import Lock
+
+from metrics import Histogram
+
+
+class SiteStats:
+    """单个调用点在一个窗口内的统计"""
+    __slots__ = ('count', 'wait', 'hold', 'max_queue')
+
+    def __init__(self):
+        self.count = 0
+        self.wait = Histogram()   # 微秒
+        self.hold = Histogram()   # 微秒
+        self.max_queue = 0
+
+
+class ProfiledLock:
+    def __init__(self, lock=None, enabled=False, window_seconds=60):
+        self._lock = lock if lock is not None else Lock()
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self._waiting = 0          # 当前排队等待的协程数
+        self._holder = None        # (site, acquired_at)，仅开启时记录
+        self._current = {}         # site -> SiteStats
+        self._previous = {}
+        self._window_start = time.perf_counter()
+
+    # ---------------- Lock 接口 ----------------
+    def acquire(self, blocking=True, timeout=-1):
+        if not self.enabled:
+            return self._lock.acquire(blocking, timeout)
+        return self._profiled_acquire(sys._getframe(1), blocking, timeout)
+
+    def release(self):
+        if self._holder is not None:
+            self._record_release()
+        self._lock.release()
+
+    def __enter__(self):
+        if not self.enabled:
+            self._lock.acquire()
+        else:
+            self._profiled_acquire(sys._getframe(1), True, -1)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def locked(self):
+        return self._lock.locked()
+
+    # ---------------- 统计 ----------------
+    def _profiled_acquire(self, frame, blocking, timeout):
+        site = f"{frame.f_code.co_name}:{frame.f_lineno}"
+        queue = self._waiting
+        self._waiting += 1
+        t0 = time.perf_counter()
+        try:
+            ok = self._lock.acquire(blocking, timeout)
+        finally:
+            self._waiting -= 1
+        t1 = time.perf_counter()
+        if ok:
+            stats = self._site(site, t1)
+            stats.count += 1
+            stats.wait.record((t1 - t0) * 1e6)
+            if queue > stats.max_queue:
+                stats.max_queue = queue
+            self._holder = (site, t1)
+        return ok
+
+    def _record_release(self):
+        site, acquired_at = self._holder
+        self._holder = None
+        now = time.perf_counter()
+        self._site(site, now).hold.record((now - acquired_at) * 1e6)
+
+    def _site(self, site, now):
+        if now - self._window_start >= self.window_seconds:
+            self._previous = self._current
+            self._current = {}
+            self._window_start = now
+        stats = self._current.get(site)
+        if stats is None:
+            stats = self._current[site] = SiteStats()
+        return stats
+
+    def set_enabled(self, enabled):
+        """运行时开关；开启时清空旧数据"""
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        self._current = {}
+        self._previous = {}
+        self._window_start = time.perf_counter()
+
+    def report(self, top=10, key='hold'):
+        """最近两个窗口内按总持有（或等待）时间排序的 Top-N 调用点"""
+        merged = {}
+        for window in (self._previous, self._current):
+            for site, s in window.items():
+                merged.setdefault(site, []).append(s)
+        rows = []
+        for site, parts in merged.items():
+            wait = Histogram()
+            hold = Histogram()
+            for s in parts:
+                _merge(wait, s.wait)
+                _merge(hold, s.hold)
+            rows.append({
+                "site": site,
+                "count": sum(s.count for s in parts),
+                "max_queue": max(s.max_queue for s in parts),
+                "wait_total_us": wait.total,
+                "wait_p99_us": wait.percentile(0.99),
+                "hold_total_us": hold.total,
+                "hold_p99_us": hold.percentile(0.99),
+                "hold_max_us": hold.max,
+            })
+        rows.sort(key=lambda r: r[f"{key}_total_us"], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window_seconds,
+            "queue_depth": self._waiting,
+            "sites": rows[:top],
+        }
+
+    def prometheus_lines(self, top=10, room=None):
+        """供 /api/metrics 追加输出（room 不为空时附加 room 标签，不含 HELP/TYPE 头）"""
+        lines = [] if room is not None else PROMETHEUS_HEADER[:]
+        label = f'room="{room}",' if room is not None else ''
+        for r in self.report(top)['sites']:
+            lines.append(f'maze_lock_seconds_total{{{label}site="{r["site"]}",kind="wait"}} {r["wait_total_us"] / 1e6:.6f}')
+            lines.append(f'maze_lock_seconds_total{{{label}site="{r["site"]}",kind="hold"}} {r["hold_total_us"] / 1e6:.6f}')
+        return lines
+
+
+PROMETHEUS_HEADER = ['# HELP maze_lock_seconds_total GameEngine.lock wait/hold time per call site',
+                     '# TYPE maze_lock_seconds_total counter']
+
+
+def _merge(dst, src):
+    if len(dst.counts) < len(src.counts):
+        dst.counts.extend([0] * (len(src.counts) - len(dst.counts)))
+    for i, c in enumerate(src.counts):
+        dst.counts[i] += c
+    dst.count += src.count
+    dst.total += src.total
+    dst.max = max(dst.max, src.max)
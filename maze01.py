@@ -1,14 +1,17 @@
 import tkinter as tk
 from tkinter import Canvas, simpledialog, messagebox, ttk
-from PIL import Image, ImageTk
+from PIL import Image, ImageTk, ImageDraw
 from models import *
 
 
 # 优化迷宫生成逻辑（带环、多分支、增加可玩性）
-def generate_maze(size):
+def generate_maze(size, loop_probability=0.5, dead_end_prob=0.2, box_count=None):
     """
     生成带多路径（起点→终点）、起点死胡同、环路、盲盒的迷宫
     :param size: 迷宫尺寸（最终会转为奇数）
+    :param loop_probability: 每个路径节点额外打通墙形成环路的概率
+    :param dead_end_prob: 每个路径节点额外生成死胡同的概率
+    :param box_count: 盲盒数量（默认随尺寸调整）
     :return: 迷宫二维数组（0=墙,1=路径,2=终点,3=盲盒）、盲盒位置列表
     """
     # 确保尺寸为奇数，保证墙壁/路径布局合理
@@ -112,7 +115,7 @@ def generate_maze(size):
             maze[dead_y2][dead_x2] = 1  # 死胡同末端（无后续）
 
     # -------------------------- 优化：强化多路径环路（让分支互通） --------------------------
-    loop_probability = 0.5  # 提升到50%概率生成环路，让多条路径互相连通
+    # 默认50%概率生成环路，让多条路径互相连通
     for y in range(1, size - 1, 2):
         for x in range(1, size - 1, 2):
             if maze[y][x] == 1 and random.random() < loop_probability:
@@ -126,7 +129,7 @@ def generate_maze(size):
                         maze[my][mx] = 1
 
     # -------------------------- 保留：全局死胡同（增加整体可玩性） --------------------------
-    dead_end_prob = 0.2  # 降低全局死胡同概率，避免干扰主路径
+    # 默认20%，较低的全局死胡同概率避免干扰主路径
     for y in range(1, size - 1, 2):
         for x in range(1, size - 1, 2):
             if maze[y][x] == 1 and (x, y) != (start_x, start_y) and random.random() < dead_end_prob:
@@ -175,7 +178,8 @@ def generate_maze(size):
                     break
 
     # -------------------------- 放置盲盒（路径上随机位置） --------------------------
-    box_count = min(10, size // 2)  # 盲盒数量随尺寸调整
+    if box_count is None:
+        box_count = min(10, size // 2)  # 盲盒数量随尺寸调整
     valid_box_pos = []
     for y in range(size):
         for x in range(size):
@@ -237,6 +241,65 @@ def split_spritesheet(image_path, rows, cols):
 def resize_frames(frames, size):
     return [frame.resize((size, size), Image.LANCZOS) for frame in frames]
 
+class CanvasScene:
+    """
+    保留模式画布：图元按键（key）创建一次，之后只在坐标或属性变化时 coords / itemconfigure
+    - 每帧 begin() 后 item() 用到的键为本帧可见；end() 把本帧没用到的图元隐藏（state=hidden），
+      长时间不用的才真正删除（怪物死亡、提示消失等）
+    - 叠放层次：每层一个隐藏的锚点图元，新图元放到所属层锚点的正下方，
+      因此后出现的图元不会盖住更高层（如首次出现的提示不会压住玩家）
+    """
+    LAYERS = ("cells", "overlay", "effects", "entities", "hud")
+    EXPIRE_FRAMES = 250  # 连续这么多帧未使用的图元删除（20ms 一帧，约 5 秒）
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.anchors = {layer: canvas.create_line(0, 0, 0, 0, state="hidden") for layer in self.LAYERS}
+        self.items = {}  # key -> [图元id, 坐标, 属性, 最后使用的帧, 是否显示]
+        self.frame = 0
+
+    def place(self, item, layer):
+        """把新建的图元放到 layer 层的最上面"""
+        self.canvas.tag_lower(item, self.anchors[layer])
+
+    def begin(self):
+        self.frame += 1
+
+    def item(self, key, kind, coords, layer="overlay", **opts):
+        """显示 key 对应的图元（kind 为 rectangle/oval/text/image），必要时创建或更新"""
+        coords = tuple(coords)
+        entry = self.items.get(key)
+        if entry is None:
+            iid = getattr(self.canvas, "create_" + kind)(*coords, **opts)
+            self.place(iid, layer)
+            self.items[key] = [iid, coords, opts, self.frame, True]
+            return iid
+        iid, old_coords, old_opts, _, shown = entry
+        if coords != old_coords:
+            self.canvas.coords(iid, *coords)
+            entry[1] = coords
+        if opts != old_opts:
+            self.canvas.itemconfigure(iid, **{k: v for k, v in opts.items() if old_opts.get(k) != v})
+            entry[2] = opts
+        if not shown:
+            self.canvas.itemconfigure(iid, state="normal")
+            entry[4] = True
+        entry[3] = self.frame
+        return iid
+
+    def end(self):
+        """隐藏本帧未用到的图元，删除过期的"""
+        for key, entry in list(self.items.items()):
+            if entry[3] == self.frame:
+                continue
+            if self.frame - entry[3] > self.EXPIRE_FRAMES:
+                self.canvas.delete(entry[0])
+                del self.items[key]
+            elif entry[4]:
+                self.canvas.itemconfigure(entry[0], state="hidden")
+                entry[4] = False
+
+
 class MazeGame:
     def __init__(self, root):
         self.root = root
@@ -263,6 +326,8 @@ class MazeGame:
         self.fog_warning_duration = 3  # 警告持续时间（秒）
         self.fog_warning_text = ""  # 警告文本
         self.fog_warning_show_time = 0  # 警告显示结束时间
+        self.fog_version = 0  # 迷雾每次变化加一（渲染据此判断是否要重算格子可见性）
+        self._fog_any = False  # 当前是否有迷雾（避免每次判断可见性都扫描整张迷雾图）
 
         # ========== 新增：火把相关属性 ==========
         self.torch_position = None  # 火把位置 (x, y)
@@ -308,6 +373,14 @@ class MazeGame:
         self.monsters = []
         self.monster_frames_cache = {}
 
+        # 保留模式渲染状态（见 draw）
+        self._scene = None  # CanvasScene，随画布重建
+        self._scene_maze = None  # 已建立格子图元的迷宫（换迷宫时重建）
+        self._cell_layout = None  # (画布宽, 高)，变化时重新摆放格子
+        self._cell_vis_key = None  # 上次重算格子外观时的可见性条件
+        self._cell_highlight = False  # 上次重算时盲盒是否处于刷新高亮
+        self._dirty_cells = set()  # set_cell 修改过、尚未重绘的格子
+
         self.invincible = False
         self.invincible_end = 0
         self.invincible_duration = 2.0
@@ -398,6 +471,8 @@ class MazeGame:
 
         # ========== 新增：初始化迷雾数组 ==========
         self.fog = [[0 for _ in range(self.size)] for _ in range(self.size)]
+        self._fog_any = False
+        self.fog_version += 1
         # 重置游戏开始时间和迷雾计时器
         self.game_start_time = time.time()
         self.next_fog_time = time.time() + self.fog_interval
@@ -951,6 +1026,9 @@ class MazeGame:
                     visited.add((nx, ny))
                     queue.append((nx, ny))
 
+        self._fog_any = bool(fog_cells)
+        self.fog_version += 1
+
         # 显示迷雾生成提示
         self.fog_warning_text = f"迷雾已覆盖{int(self.fog_percentage * 100)}%区域！"
         self.fog_warning_show_time = time.time() + 2
@@ -963,7 +1041,7 @@ class MazeGame:
             return True
 
         # 如果没有迷雾，则所有格子都可见
-        if all(cell == 0 for row in self.fog for cell in row):
+        if not self._fog_any:
             return True
 
         # 如果该格子没有迷雾，则可见
@@ -1075,7 +1153,7 @@ class MazeGame:
         if 0 <= grid_x < len(self.maze[0]) and 0 <= grid_y < len(self.maze):
             if self.maze[grid_y][grid_x] == 3:
                 # 移除盲盒标记
-                self.maze[grid_y][grid_x] = 1
+                self.set_cell(grid_x, grid_y, 1)
                 if (grid_x, grid_y) in self.box_positions:
                     self.box_positions.remove((grid_x, grid_y))
 
@@ -1289,14 +1367,18 @@ class MazeGame:
             self.refresh_boxes()
             self.last_box_refresh = current_time
 
+    def set_cell(self, x, y, value):
+        """修改迷宫格子（记录下来，渲染时只重绘改过的格子）"""
+        if self.maze[y][x] != value:
+            self.maze[y][x] = value
+            self._dirty_cells.add((x, y))
+
     def refresh_boxes(self):
         if not self.box_positions:
             return
 
         for (x, y) in self.box_positions:
-            self.maze[y][x] = 1
-        for (x, y) in self.box_positions:
-            self.maze[y][x] = 3
+            self.set_cell(x, y, 3)
 
         self.box_refresh_highlight = time.time() + 5
 
@@ -1365,38 +1447,29 @@ class MazeGame:
         if monster.state != "exploded" and monster.state != "exploding":
             return
 
+        scene = self._scene
+        key = ("explode", id(monster))
         monster_center_x = offset_x + (monster.x + monster.size / 2) * scale
         monster_center_y = offset_y + (monster.y + monster.size / 2) * scale
         explode_radius = monster.explode_radius * scale
 
+        def ring(r):
+            return (monster_center_x - r, monster_center_y - r, monster_center_x + r, monster_center_y + r)
+
         if monster.state == "exploding":
             progress = monster.explode_animation_progress / 100
             radius = explode_radius * progress
-            self.canvas.create_oval(
-                monster_center_x - radius, monster_center_y - radius,
-                monster_center_x + radius, monster_center_y + radius,
-                outline="#ff4444", width=3, dash=(5, 5)
-            )
+            scene.item(key + ("warn",), "oval", ring(radius), "effects",
+                       outline="#ff4444", width=3, dash=(5, 5))
         else:
             progress = min(monster.explode_animation_progress / 100, 1)
             outer_radius = explode_radius * progress
-            self.canvas.create_oval(
-                monster_center_x - outer_radius, monster_center_y - outer_radius,
-                monster_center_x + outer_radius, monster_center_y + outer_radius,
-                outline="#ff0000", width=5
-            )
-            middle_radius = outer_radius * 0.7
-            self.canvas.create_oval(
-                monster_center_x - middle_radius, monster_center_y - middle_radius,
-                monster_center_x + middle_radius, monster_center_y + middle_radius,
-                fill="#ff8800", outline="#ff8800"
-            )
-            inner_radius = outer_radius * 0.4
-            self.canvas.create_oval(
-                monster_center_x - inner_radius, monster_center_y - inner_radius,
-                monster_center_x + inner_radius, monster_center_y + inner_radius,
-                fill="#ffff00", outline="#ffff00"
-            )
+            scene.item(key + ("outer",), "oval", ring(outer_radius), "effects",
+                       outline="#ff0000", width=5)
+            scene.item(key + ("middle",), "oval", ring(outer_radius * 0.7), "effects",
+                       fill="#ff8800", outline="#ff8800")
+            scene.item(key + ("inner",), "oval", ring(outer_radius * 0.4), "effects",
+                       fill="#ffff00", outline="#ffff00")
 
     # ========== 新增：绘制陷阱 ==========
     def draw_traps(self, scale, offset_x, offset_y):
@@ -1404,6 +1477,7 @@ class MazeGame:
         if not self.trap_positions:
             return
 
+        scene = self._scene
         for trap_x, trap_y, trap_type in self.trap_positions:
             # 检查陷阱是否激活（未触发）
             if (trap_x, trap_y, trap_type) not in self.active_traps:
@@ -1417,36 +1491,210 @@ class MazeGame:
             y1 = offset_y + trap_y * scale * self.cell_size
             x2 = x1 + scale * self.cell_size
             y2 = y1 + scale * self.cell_size
+            key = ("trap", trap_x, trap_y)
 
             # 如果陷阱可见，绘制陷阱
             if self.trap_visible:
                 if trap_type == 1:
                     # 传送陷阱：紫色
-                    self.canvas.create_rectangle(x1 + 5, y1 + 5, x2 - 5, y2 - 5,
-                                                 fill="#9b30ff", outline="#6a0dad", width=2)
-                    self.canvas.create_text(x1 + (x2 - x1) / 2, y1 + (y2 - y1) / 2,
-                                            text="🌀", font=("Arial", 16))
+                    scene.item(key + ("box",), "rectangle", (x1 + 5, y1 + 5, x2 - 5, y2 - 5),
+                               fill="#9b30ff", outline="#6a0dad", width=2)
+                    scene.item(key + ("icon",), "text", (x1 + (x2 - x1) / 2, y1 + (y2 - y1) / 2),
+                               text="🌀", font=("Arial", 16))
                 elif trap_type == 2:
                     # 反向陷阱：橙色
-                    self.canvas.create_rectangle(x1 + 5, y1 + 5, x2 - 5, y2 - 5,
-                                                 fill="#ff8c00", outline="#ff4500", width=2)
-                    self.canvas.create_text(x1 + (x2 - x1) / 2, y1 + (y2 - y1) / 2,
-                                            text="🔄", font=("Arial", 16))
+                    scene.item(key + ("box",), "rectangle", (x1 + 5, y1 + 5, x2 - 5, y2 - 5),
+                               fill="#ff8c00", outline="#ff4500", width=2)
+                    scene.item(key + ("icon",), "text", (x1 + (x2 - x1) / 2, y1 + (y2 - y1) / 2),
+                               text="🔄", font=("Arial", 16))
 
             # 如果陷阱不可见但仍然激活，绘制一个微小的提示（可选）
             elif not self.trap_visible and self.player.has_torch:
                 # 玩家持有火把时，可以稍微看到陷阱的轮廓
                 if trap_type == 1:
                     # 传送陷阱：浅紫色轮廓
-                    self.canvas.create_rectangle(x1 + 10, y1 + 10, x2 - 10, y2 - 10,
-                                                 outline="#e6d5ff", width=1, dash=(2, 2))
+                    scene.item(key + ("hint",), "rectangle", (x1 + 10, y1 + 10, x2 - 10, y2 - 10),
+                               outline="#e6d5ff", width=1, dash=(2, 2))
                 elif trap_type == 2:
                     # 反向陷阱：浅橙色轮廓
-                    self.canvas.create_rectangle(x1 + 10, y1 + 10, x2 - 10, y2 - 10,
-                                                 outline="#ffd8a6", width=1, dash=(2, 2))
+                    scene.item(key + ("hint",), "rectangle", (x1 + 10, y1 + 10, x2 - 10, y2 - 10),
+                               outline="#ffd8a6", width=1, dash=(2, 2))
+
+    # ========== 保留模式渲染：静态层一张图，格子上只叠加盲盒与迷雾 ==========
+    STATIC_COLORS = {0: "#000000", 1: "#cce5ff", 3: "#e3e3e3"}  # 3=盲盒格，底色同画布背景
+    STATIC_CACHE_SIZE = 4  # 最多缓存几个缩放比例的静态层
+
+    def _build_cells(self):
+        """新迷宫：建静态层图元与终点文字；盲盒/迷雾的格子图元按需创建"""
+        rows, cols = len(self.maze), len(self.maze[0])
+        self._static_item = self.canvas.create_image(0, 0, anchor="nw")
+        self._scene.place(self._static_item, "cells")
+        self._static_cache = {}  # 缩放后的格子边长 -> (PIL 图像, PhotoImage, 格子边界)
+        self._static_key = None
+        self._exit_texts = {}
+        for y in range(rows):
+            for x in range(cols):
+                if self.maze[y][x] == 2:
+                    item = self.canvas.create_text(0, 0, text="终点", font=("微软雅黑", 16, "bold"), fill="white")
+                    self._scene.place(item, "cells")
+                    self._exit_texts[(x, y)] = item
+        self._cell_items = {}  # (x, y) -> 叠加矩形（盲盒 / 迷雾）
+        self._cell_texts = {}  # (x, y) -> 盲盒文字
+        self._cell_looks = [[None] * cols for _ in range(rows)]
+        self._scene_maze = self.maze
+        self._cell_layout = None
+        self._cell_vis_key = object()  # 强制首帧全量计算
+        self._dirty_cells = set()
+
+    # ---------- 静态层（墙、路、终点）：按缩放比例用 PIL 栅格化一次 ----------
+    def _raster_cell(self, draw, x, y, edges_x, edges_y):
+        box = (edges_x[x], edges_y[y], edges_x[x + 1] - 1, edges_y[y + 1] - 1)
+        cell = self.maze[y][x]
+        if cell == 2:
+            # 红色边框（宽度4）+ 蓝色背景
+            draw.rectangle(box, fill="#0066CC", outline="red", width=4)
+        else:
+            draw.rectangle(box, fill=self.STATIC_COLORS.get(cell, "#e3e3e3"))
+
+    def _static_layer(self, scaled_cell):
+        """取（或栅格化）该缩放比例下的静态层"""
+        key = round(scaled_cell, 3)
+        entry = self._static_cache.get(key)
+        if entry is None:
+            rows, cols = len(self.maze), len(self.maze[0])
+            edges_x = [round(i * scaled_cell) for i in range(cols + 1)]
+            edges_y = [round(i * scaled_cell) for i in range(rows + 1)]
+            image = Image.new("RGB", (max(1, edges_x[-1]), max(1, edges_y[-1])), "#e3e3e3")
+            draw = ImageDraw.Draw(image)
+            for y in range(rows):
+                for x in range(cols):
+                    self._raster_cell(draw, x, y, edges_x, edges_y)
+            entry = (image, ImageTk.PhotoImage(image), edges_x, edges_y)
+            if len(self._static_cache) >= self.STATIC_CACHE_SIZE:
+                self._static_cache.pop(next(iter(self._static_cache)))
+            self._static_cache[key] = entry
+        return key, entry
+
+    def _show_static(self, offset_x, offset_y, scaled_cell):
+        key, (_, photo, _, _) = self._static_layer(scaled_cell)
+        self.canvas.coords(self._static_item, offset_x, offset_y)
+        if key != self._static_key:
+            self._static_key = key
+            self.canvas.itemconfigure(self._static_item, image=photo)
+
+    def _patch_static(self, cells):
+        """格子值变化：只重画当前比例静态层上的这些格子，其他比例的缓存作废"""
+        entry = self._static_cache.get(self._static_key)
+        self._static_cache = {self._static_key: entry} if entry else {}
+        if entry is None:
+            return
+        image, photo, edges_x, edges_y = entry
+        draw = ImageDraw.Draw(image)
+        for x, y in cells:
+            self._raster_cell(draw, x, y, edges_x, edges_y)
+        photo.paste(image)
+
+    # ---------- 叠加层（盲盒、迷雾）：只给需要的格子建图元 ----------
+    def _cell_look(self, x, y, highlight):
+        """叠加外观：(填充, 边框, 边框宽, 内缩, 文字)；None 表示直接露出静态层"""
+        if not self.is_cell_visible(x, y):
+            return "white", "", 0, 0, None  # 迷雾
+        if self.maze[y][x] == 3:
+            return ("#FFA500" if highlight else self.box_color), "orange", 2, 2, "🎁"
+        return None
+
+    def _cell_item(self, x, y):
+        """取（或创建）格子的叠加矩形"""
+        item = self._cell_items.get((x, y))
+        if item is None:
+            item = self.canvas.create_rectangle(0, 0, 0, 0, outline="")
+            self._scene.place(item, "cells")
+            self._cell_items[(x, y)] = item
+        return item
+
+    def _cell_text(self, x, y, text):
+        """取（或创建）格子上的文字图元"""
+        item = self._cell_texts.get((x, y))
+        if item is None:
+            item = self.canvas.create_text(0, 0, text=text, font=("Arial", 12))
+            self._scene.place(item, "cells")
+            self._cell_texts[(x, y)] = item
+        return item
+
+    def _place_cell(self, x, y, look, offset_x, offset_y, scaled_cell):
+        x1 = offset_x + x * scaled_cell
+        y1 = offset_y + y * scaled_cell
+        cx, cy = x1 + scaled_cell // 2, y1 + scaled_cell // 2
+        item = self._cell_items.get((x, y))
+        if item is not None:
+            inset = look[3] if look else 0
+            self.canvas.coords(item, x1 + inset, y1 + inset, x1 + scaled_cell - inset, y1 + scaled_cell - inset)
+        for texts in (self._cell_texts, self._exit_texts):
+            item = texts.get((x, y))
+            if item is not None:
+                self.canvas.coords(item, cx, cy)
+
+    def _update_cells(self, offset_x, offset_y, scaled_cell):
+        """
+        只对外观变化的格子调用 itemconfigure：
+        可见性条件（迷雾、吹风机、火把照亮的位置）变化时重算全部格子，否则只重算 set_cell 改过的格子；
+        盲盒高亮开关时重算盲盒格子
+        """
+        now = time.time()
+        if now < self.player.no_fog_until or not self._fog_any:
+            vis_key = None
+        elif self.player.has_torch:
+            vis_key = (self.fog_version, int(self.player.x // self.cell_size),
+                       int(self.player.y // self.cell_size), self.player.torch_light_radius)
+        else:
+            vis_key = (self.fog_version,)
+        highlight = now < self.box_refresh_highlight
+
+        if self._dirty_cells:
+            self._patch_static(self._dirty_cells)
+        if vis_key != self._cell_vis_key:
+            cells = [(x, y) for y in range(len(self.maze)) for x in range(len(self.maze[0]))]
+        else:
+            cells = self._dirty_cells
+            if highlight != self._cell_highlight:
+                cells = cells | set(self.box_positions)
+        self._cell_vis_key = vis_key
+        self._cell_highlight = highlight
+        self._dirty_cells = set()
+
+        for x, y in cells:
+            look = self._cell_look(x, y, highlight)
+            old = self._cell_looks[y][x]
+            if look == old:
+                continue
+            self._cell_looks[y][x] = look
+            if look is None:
+                self.canvas.itemconfigure(self._cell_items[(x, y)], state="hidden")
+                if (x, y) in self._cell_texts:
+                    self.canvas.itemconfigure(self._cell_texts[(x, y)], state="hidden")
+                continue
+            fill, outline, width, inset, text = look
+            moved = old is None or old[3] != inset
+            self.canvas.itemconfigure(self._cell_item(x, y), fill=fill, outline=outline, width=width,
+                                      state="normal")
+            if text is not None:
+                moved = moved or (x, y) not in self._cell_texts
+                self.canvas.itemconfigure(self._cell_text(x, y, text), text=text, state="normal")
+            elif (x, y) in self._cell_texts:
+                self.canvas.itemconfigure(self._cell_texts[(x, y)], state="hidden")
+            if moved:
+                self._place_cell(x, y, look, offset_x, offset_y, scaled_cell)
 
     def draw(self):
-        self.canvas.delete("all")
+        # 画布或迷宫更换时重建场景；之后每帧只更新变化的图元（不再 delete("all") 重画）
+        if self._scene is None or self._scene.canvas is not self.canvas:
+            self._scene = CanvasScene(self.canvas)
+            self._scene_maze = None
+        if self._scene_maze is not self.maze:
+            self._build_cells()
+        scene = self._scene
+        scene.begin()
+
         width = self.canvas.winfo_width()
         height = self.canvas.winfo_height()
 
@@ -1457,58 +1705,28 @@ class MazeGame:
         offset_x = (width - int(maze_width * scale)) // 2
         offset_y = (height - int(maze_height * scale)) // 2
 
-        # ========== 修改：先绘制迷宫（但只绘制可见部分） ==========
-        for y in range(self.size):
-            for x in range(self.size):
-                # 检查格子是否可见
-                if not self.is_cell_visible(x, y):
-                    continue  # 如果不可见，跳过绘制
+        # ========== 迷宫：静态层图像 + 盲盒/迷雾叠加；窗口尺寸变化时换比例并重新摆放 ==========
+        if self._cell_layout != (width, height):
+            self._cell_layout = (width, height)
+            self._show_static(offset_x, offset_y, scaled_cell)
+            for x, y in set(self._cell_items) | set(self._exit_texts):
+                self._place_cell(x, y, self._cell_looks[y][x], offset_x, offset_y, scaled_cell)
+        self._update_cells(offset_x, offset_y, scaled_cell)
 
-                cell = self.maze[y][x]
+        # 透视状态下显示盲盒内容（画在格子下方）
+        if self.player.clairvoyance:
+            for (x, y), content in self.player.box_contents.items():
+                if self.maze[y][x] != 3 or not self.is_cell_visible(x, y):
+                    continue
                 x1 = offset_x + x * scaled_cell
                 y1 = offset_y + y * scaled_cell
                 x2 = x1 + scaled_cell
-                y2 = y1 + scaled_cell
-
-                if cell == 0:
-                    self.canvas.create_rectangle(x1, y1, x2, y2, fill="#000000", outline="")
-                elif cell == 1:
-                    self.canvas.create_rectangle(x1, y1, x2, y2, fill="#cce5ff", outline="")
-                elif cell == 2:
-                    # 恢复需求：红色边框（宽度4）+ 蓝色背景 + 白色"终点"文字
-                    self.canvas.create_rectangle(
-                        x1, y1, x2, y2,
-                        fill="#0066CC",  # 深蓝色背景（高对比度）
-                        outline="red",  # 红色边框
-                        width=4  # 加粗边框，确保醒目
-                    )
-                    # 绘制"终点"文字，居中显示
-                    self.canvas.create_text(
-                        x1 + scaled_cell // 2, y1 + scaled_cell // 2,
-                        text="终点",
-                        font=("微软雅黑", 16, "bold"),  # 加粗字体，提升辨识度
-                        fill="white"  # 白色文字在蓝色背景上对比度拉满
-                    )
-                elif cell == 3:
-                    box_fill = self.box_color
-                    if time.time() < self.box_refresh_highlight:
-                        box_fill = "#FFA500"
-
-                    self.canvas.create_rectangle(x1 + 2, y1 + 2, x2 - 2, y2 - 2,
-                                                 fill=box_fill, outline="orange", width=2)
-                    self.canvas.create_text(x1 + scaled_cell // 2, y1 + scaled_cell // 2,
-                                            text="🎁", font=("Arial", 12))
-
-                    # 新增：透视状态下显示盲盒内容
-                    if self.player.clairvoyance and (x, y) in self.player.box_contents:
-                        # 绘制透视背景
-                        self.canvas.create_rectangle(x1 + 5, y1 + scaled_cell + 5,
-                                                     x2 - 5, y1 + scaled_cell + 30,
-                                                     fill="white", outline="black", width=1)
-                        # 显示盲盒内容
-                        content = self.player.box_contents[(x, y)]
-                        self.canvas.create_text(x1 + scaled_cell // 2, y1 + scaled_cell + 20,
-                                                text=content, font=("微软雅黑", 8), fill="red")
+                scene.item(("clairvoyance", x, y, "bg"), "rectangle",
+                           (x1 + 5, y1 + scaled_cell + 5, x2 - 5, y1 + scaled_cell + 30),
+                           fill="white", outline="black", width=1)
+                scene.item(("clairvoyance", x, y, "text"), "text",
+                           (x1 + scaled_cell // 2, y1 + scaled_cell + 20),
+                           text=content, font=("微软雅黑", 8), fill="red")
 
         # ========== 新增：绘制火把（如果未被拾取且可见） ==========
         if self.torch_position and not self.torch_collected:
@@ -1521,36 +1739,19 @@ class MazeGame:
                 y2 = y1 + scaled_cell
 
                 # 绘制火把底座
-                self.canvas.create_rectangle(x1 + scaled_cell // 4, y1 + scaled_cell // 2,
-                                             x2 - scaled_cell // 4, y2 - 5,
-                                             fill="#8B4513", outline="")
+                scene.item(("torch", "base"), "rectangle",
+                           (x1 + scaled_cell // 4, y1 + scaled_cell // 2, x2 - scaled_cell // 4, y2 - 5),
+                           fill="#8B4513", outline="")
                 # 绘制火把火焰
-                self.canvas.create_oval(x1 + scaled_cell // 3, y1 + 5,
-                                        x2 - scaled_cell // 3, y1 + scaled_cell // 2,
-                                        fill="#FF4500", outline="#FF6347")
-                self.canvas.create_text(x1 + scaled_cell // 2, y1 + scaled_cell + 15,
-                                        text="🔥 火把", font=("微软雅黑", 10), fill="#FF6347")
+                scene.item(("torch", "flame"), "oval",
+                           (x1 + scaled_cell // 3, y1 + 5, x2 - scaled_cell // 3, y1 + scaled_cell // 2),
+                           fill="#FF4500", outline="#FF6347")
+                scene.item(("torch", "label"), "text", (x1 + scaled_cell // 2, y1 + scaled_cell + 15),
+                           text="🔥 火把", font=("微软雅黑", 10), fill="#FF6347")
 
         # ========== 新增：绘制陷阱 ==========
         self.draw_traps(scale, offset_x, offset_y)
 
-        # ========== 修改：绘制迷雾（不透明白色，覆盖不可见的区域） ==========
-        # 吹风机效果激活期间不绘制迷雾
-        if time.time() >= self.player.no_fog_until:
-            for y in range(self.size):
-                for x in range(self.size):
-                    # 如果格子有迷雾且不可见，则绘制白色迷雾
-                    if self.fog[y][x] == 1 and not self.is_cell_visible(x, y):
-                        x1 = offset_x + x * scaled_cell
-                        y1 = offset_y + y * scaled_cell
-                        x2 = x1 + scaled_cell
-                        y2 = y1 + scaled_cell
-                        # 绘制不透明的白色矩形作为迷雾
-                        self.canvas.create_rectangle(x1, y1, x2, y2,
-                                                     fill="white",
-                                                     outline="",
-                                                     width=0)
-
         attr_texts = [
             f"角色: {self.player.type}",
             f"生命值: {max(0, self.player.hp)}/{self.player.max_hp}",  # 新增：显示最大生命值
@@ -1560,56 +1761,43 @@ class MazeGame:
             f"装备数量: {len(self.player.equipment)}"  # 新增：显示装备数量
         ]
         for idx, text in enumerate(attr_texts):
-            self.canvas.create_text(50, 20 + idx * 20, text=text, font=("微软雅黑", 12), fill="#2c3e50")
+            scene.item(("hud", "attr", idx), "text", (50, 20 + idx * 20), "hud",
+                       text=text, font=("微软雅黑", 12), fill="#2c3e50")
 
         # ========== 新增：右上角显示游戏时长 ==========
         # 将游戏时长转换为分钟和秒
         minutes = self.game_duration // 60
         seconds = self.game_duration % 60
         time_text = f"游戏时长: {minutes:02d}:{seconds:02d}"
-        self.canvas.create_text(width - 100, 20,
-                                text=time_text,
-                                font=("微软雅黑", 12, "bold"),
-                                fill="#2c3e50")
+        scene.item(("hud", "duration"), "text", (width - 100, 20), "hud",
+                   text=time_text, font=("微软雅黑", 12, "bold"), fill="#2c3e50")
 
         # ========== 修改：右上角显示迷雾倒计时（考虑吹风机效果） ==========
         if time.time() < self.player.no_fog_until:
             # 吹风机效果激活期间，显示吹风机效果倒计时
             fog_remain = max(0, int(self.player.no_fog_until - time.time()))
-            fog_text = f"吹风机: {fog_remain}s"
-            self.canvas.create_text(width - 100, 40,
-                                    text=fog_text,
-                                    font=("微软雅黑", 12, "bold"),
-                                    fill="#1abc9c")
+            scene.item(("hud", "fog"), "text", (width - 100, 40), "hud",
+                       text=f"吹风机: {fog_remain}s", font=("微软雅黑", 12, "bold"), fill="#1abc9c")
         else:
             # 正常显示迷雾倒计时
             fog_remain = max(0, int(self.next_fog_time - time.time()))
-            fog_text = f"迷雾刷新: {fog_remain}s"
-            self.canvas.create_text(width - 100, 40,
-                                    text=fog_text,
-                                    font=("微软雅黑", 12),
-                                    fill="#3498db" if fog_remain > 3 else "#e74c3c")
+            scene.item(("hud", "fog"), "text", (width - 100, 40), "hud",
+                       text=f"迷雾刷新: {fog_remain}s", font=("微软雅黑", 12),
+                       fill="#3498db" if fog_remain > 3 else "#e74c3c")
 
         # ========== 新增：显示火把状态 ==========
         if self.player.has_torch:
-            self.canvas.create_text(width - 100, 60,
-                                    text="🔥 持有火把",
-                                    font=("微软雅黑", 12, "bold"),
-                                    fill="#FF6347")
+            scene.item(("hud", "torch"), "text", (width - 100, 60), "hud",
+                       text="🔥 持有火把", font=("微软雅黑", 12, "bold"), fill="#FF6347")
             # 绘制火把照亮范围提示
-            self.canvas.create_text(width - 100, 80,
-                                    text=f"照亮半径: {self.player.torch_light_radius}格",
-                                    font=("微软雅黑", 10),
-                                    fill="#FFA500")
+            scene.item(("hud", "torch_radius"), "text", (width - 100, 80), "hud",
+                       text=f"照亮半径: {self.player.torch_light_radius}格", font=("微软雅黑", 10), fill="#FFA500")
 
         # ========== 新增：显示陷阱可见倒计时 ==========
         if self.trap_visible:
             trap_remain = max(0, int(self.trap_visible_end_time - time.time()))
-            trap_text = f"陷阱可见: {trap_remain}s"
-            self.canvas.create_text(width - 100, 100,
-                                    text=trap_text,
-                                    font=("微软雅黑", 10),
-                                    fill="#9b30ff")
+            scene.item(("hud", "trap"), "text", (width - 100, 100), "hud",
+                       text=f"陷阱可见: {trap_remain}s", font=("微软雅黑", 10), fill="#9b30ff")
 
         # ========== 新增：迷雾警告提示 ==========
         if time.time() < self.fog_warning_show_time:
@@ -1617,18 +1805,13 @@ class MazeGame:
             warning_width = len(self.fog_warning_text) * 10
             warning_x = width // 2
             warning_y = 50
-            self.canvas.create_rectangle(
-                warning_x - warning_width / 2 - 10, warning_y - 15,
-                warning_x + warning_width / 2 + 10, warning_y + 15,
-                fill="white", outline="#e74c3c", width=2
-            )
+            scene.item(("hud", "fog_warning", "bg"), "rectangle",
+                       (warning_x - warning_width / 2 - 10, warning_y - 15,
+                        warning_x + warning_width / 2 + 10, warning_y + 15), "hud",
+                       fill="white", outline="#e74c3c", width=2)
             # 绘制迷雾警告文本
-            self.canvas.create_text(
-                warning_x, warning_y,
-                text=self.fog_warning_text,
-                fill="#e74c3c",
-                font=("微软雅黑", 14, "bold")
-            )
+            scene.item(("hud", "fog_warning", "text"), "text", (warning_x, warning_y), "hud",
+                       text=self.fog_warning_text, fill="#e74c3c", font=("微软雅黑", 14, "bold"))
 
         # ========== 新增：陷阱触发提示 ==========
         if time.time() < self.trap_triggered_show_time:
@@ -1636,18 +1819,13 @@ class MazeGame:
             trap_warning_width = len(self.trap_triggered_text) * 10
             trap_warning_x = width // 2
             trap_warning_y = 80
-            self.canvas.create_rectangle(
-                trap_warning_x - trap_warning_width / 2 - 10, trap_warning_y - 15,
-                trap_warning_x + trap_warning_width / 2 + 10, trap_warning_y + 15,
-                fill="white", outline="#9b30ff", width=2
-            )
+            scene.item(("hud", "trap_warning", "bg"), "rectangle",
+                       (trap_warning_x - trap_warning_width / 2 - 10, trap_warning_y - 15,
+                        trap_warning_x + trap_warning_width / 2 + 10, trap_warning_y + 15), "hud",
+                       fill="white", outline="#9b30ff", width=2)
             # 绘制陷阱触发提示文本
-            self.canvas.create_text(
-                trap_warning_x, trap_warning_y,
-                text=self.trap_triggered_text,
-                fill="#9b30ff",
-                font=("微软雅黑", 14, "bold")
-            )
+            scene.item(("hud", "trap_warning", "text"), "text", (trap_warning_x, trap_warning_y), "hud",
+                       text=self.trap_triggered_text, fill="#9b30ff", font=("微软雅黑", 14, "bold"))
 
         # 原有状态显示代码
         status_texts = []
@@ -1666,10 +1844,9 @@ class MazeGame:
             fog_remain = max(0, int(self.player.no_fog_until - time.time()))
             status_texts.append(f"🌪️ 吹风机剩余: {fog_remain}s")
 
-        if status_texts:
-            for idx, text in enumerate(status_texts):
-                self.canvas.create_text(width // 2, 30 + idx * 25,
-                                        text=text, fill="purple", font=("微软雅黑", 14, "bold"))
+        for idx, text in enumerate(status_texts):
+            scene.item(("hud", "status", idx), "text", (width // 2, 30 + idx * 25), "hud",
+                       text=text, fill="purple", font=("微软雅黑", 14, "bold"))
 
         # ========== 修复核心：盲盒奖励提示文本（移除不支持的bg参数，用矩形做背景） ==========
         if time.time() < self.box_reward_show_time:
@@ -1678,25 +1855,20 @@ class MazeGame:
             text_x = width // 2
             text_y = height - 50
             # 绘制背景矩形（比文本大一点，居中）
-            self.canvas.create_rectangle(
-                text_x - text_width / 2 - 10, text_y - 15,
-                text_x + text_width / 2 + 10, text_y + 15,
-                fill="white", outline="gray", width=1
-            )
+            scene.item(("hud", "reward", "bg"), "rectangle",
+                       (text_x - text_width / 2 - 10, text_y - 15,
+                        text_x + text_width / 2 + 10, text_y + 15), "hud",
+                       fill="white", outline="gray", width=1)
             # 2. 绘制文本（移除bg参数，保留其他样式）
-            self.canvas.create_text(
-                text_x,
-                text_y,
-                text=self.box_reward_text,
-                fill="#e74c3c" if "⚠️" in self.box_reward_text else "#27ae60",
-                font=("微软雅黑", 16, "bold")
-            )
+            scene.item(("hud", "reward", "text"), "text", (text_x, text_y), "hud",
+                       text=self.box_reward_text,
+                       fill="#e74c3c" if "⚠️" in self.box_reward_text else "#27ae60",
+                       font=("微软雅黑", 16, "bold"))
 
         refresh_remain = max(0, int(self.box_refresh_interval - (time.time() - self.last_box_refresh)))
         # 将盲盒刷新倒计时移到左上角，避免与右上角信息重叠
-        self.canvas.create_text(100, 20,
-                                text=f"盲盒刷新: {refresh_remain}s",
-                                font=("微软雅黑", 12), fill="#e74c3c")
+        scene.item(("hud", "box_refresh"), "text", (100, 20), "hud",
+                   text=f"盲盒刷新: {refresh_remain}s", font=("微软雅黑", 12), fill="#e74c3c")
 
         for monster in self.monsters:
             if monster.type == "爆炸怪":
@@ -1707,99 +1879,66 @@ class MazeGame:
             player_y = offset_y + self.player.y * scale
             scaled_player = int(self.player.size * scale)
 
-            if self.invincible:
-                alpha = int((time.time() * 10) % 2)
-                if alpha:
-                    if self.current_frame:
-                        self.canvas.create_image(
-                            player_x + scaled_player // 2,
-                            player_y + scaled_player // 2,
-                            image=self.current_frame
-                        )
-                    else:
-                        self.canvas.create_rectangle(
-                            player_x, player_y,
-                            player_x + scaled_player,
-                            player_y + scaled_player,
-                            fill="#8B4513", outline=""
-                        )
-                invincible_remain = max(0, int(self.invincible_end - time.time()))
-                self.canvas.create_text(width // 2, 30 - len(status_texts) * 25,
-                                        text=f"无敌剩余: {invincible_remain}s",
-                                        fill="red", font=("微软雅黑", 14, "bold"))
-            else:
+            # 无敌期间闪烁：奇数帧不显示玩家
+            if not self.invincible or int((time.time() * 10) % 2):
                 if self.current_frame:
-                    self.canvas.create_image(
-                        player_x + scaled_player // 2,
-                        player_y + scaled_player // 2,
-                        image=self.current_frame
-                    )
+                    scene.item(("player", "image"), "image",
+                               (player_x + scaled_player // 2, player_y + scaled_player // 2), "entities",
+                               image=self.current_frame)
                 else:
-                    self.canvas.create_rectangle(
-                        player_x, player_y,
-                        player_x + scaled_player,
-                        player_y + scaled_player,
-                        fill="#8B4513", outline=""
-                    )
+                    scene.item(("player", "rect"), "rectangle",
+                               (player_x, player_y, player_x + scaled_player, player_y + scaled_player),
+                               "entities", fill="#8B4513", outline="")
+            if self.invincible:
+                invincible_remain = max(0, int(self.invincible_end - time.time()))
+                scene.item(("hud", "invincible"), "text", (width // 2, 30 - len(status_texts) * 25), "hud",
+                           text=f"无敌剩余: {invincible_remain}s", fill="red", font=("微软雅黑", 14, "bold"))
 
         for monster in self.monsters:
             if monster.is_alive:
                 monster_x = offset_x + monster.x * scale
                 monster_y = offset_y + monster.y * scale
                 scaled_monster = int(monster.size * scale)
+                key = ("monster", id(monster))
 
                 # 新增：中毒怪物显示
                 if id(monster) in self.player.poisoned_monsters and time.time() < self.player.poisoned_monsters[
                     id(monster)]:
                     # 绘制中毒特效
-                    self.canvas.create_oval(
-                        monster_x - 5, monster_y - 5,
-                        monster_x + scaled_monster + 5, monster_y + scaled_monster + 5,
-                        outline="#2ecc71", width=3, dash=(2, 2)
-                    )
-                    self.canvas.create_text(
-                        monster_x + scaled_monster // 2,
-                        monster_y - 10,
-                        text="🟢 中毒",
-                        fill="green", font=("微软雅黑", 10, "bold")
-                    )
+                    scene.item(key + ("poison",), "oval",
+                               (monster_x - 5, monster_y - 5,
+                                monster_x + scaled_monster + 5, monster_y + scaled_monster + 5), "effects",
+                               outline="#2ecc71", width=3, dash=(2, 2))
+                    scene.item(key + ("poison_text",), "text",
+                               (monster_x + scaled_monster // 2, monster_y - 10), "entities",
+                               text="🟢 中毒", fill="green", font=("微软雅黑", 10, "bold"))
 
                 if monster.type == "爆炸怪" and monster.state == "exploding":
                     explode_remain = max(0, int(monster.explode_time - time.time()))
-                    self.canvas.create_text(
-                        monster_x + scaled_monster // 2,
-                        monster_y - 10,
-                        text=f"{explode_remain}s",
-                        fill="red", font=("微软雅黑", 12, "bold")
-                    )
+                    scene.item(key + ("countdown",), "text",
+                               (monster_x + scaled_monster // 2, monster_y - 10), "entities",
+                               text=f"{explode_remain}s", fill="red", font=("微软雅黑", 12, "bold"))
 
                 monster_frame = monster.get_current_frame()
                 if monster_frame:
-                    self.canvas.create_image(
-                        monster_x + scaled_monster // 2,
-                        monster_y + scaled_monster // 2,
-                        image=monster_frame
-                    )
+                    scene.item(key + ("image",), "image",
+                               (monster_x + scaled_monster // 2, monster_y + scaled_monster // 2), "entities",
+                               image=monster_frame)
                 else:
-                    self.canvas.create_oval(
-                        monster_x, monster_y,
-                        monster_x + scaled_monster,
-                        monster_y + scaled_monster,
-                        fill=monster.color, outline=""
-                    )
-                self.canvas.create_text(
-                    monster_x + scaled_monster // 2,
-                    monster_y + scaled_monster + 15,
-                    text=monster.type,
-                    fill="black", font=("微软雅黑", 10)
-                )
+                    scene.item(key + ("body",), "oval",
+                               (monster_x, monster_y, monster_x + scaled_monster, monster_y + scaled_monster),
+                               "entities", fill=monster.color, outline="")
+                scene.item(key + ("label",), "text",
+                           (monster_x + scaled_monster // 2, monster_y + scaled_monster + 15), "entities",
+                           text=monster.type, fill="black", font=("微软雅黑", 10))
 
         if self.game_over:
             result_text = "游戏胜利！" if self.game_win else "游戏结束！"
             color = "green" if self.game_win else "red"
-            self.canvas.create_text(width // 2, height // 2, text=result_text,
-                                    font=("微软雅黑", 30, "bold"),
-                                    fill=color)
+            scene.item(("hud", "result"), "text", (width // 2, height // 2), "hud",
+                       text=result_text, font=("微软雅黑", 30, "bold"), fill=color)
+
+        scene.end()
 
     # 新增：创建游戏结束界面
     def create_end_screen(self):
@@ -1949,6 +2088,8 @@ class MazeGame:
         self.box_reward_show_time = 0
         # 重置迷雾相关状态
         self.fog = [[0 for _ in range(self.size)] for _ in range(self.size)]
+        self._fog_any = False
+        self.fog_version += 1
         self.fog_warning = False
         self.fog_warning_text = ""
         self.fog_warning_show_time = 0
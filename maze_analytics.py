@@ -0,0 +1,238 @@
+# maze_analytics.py
+# -*- coding: utf-8 -*-
+"""
+离线迷宫质量分析：多进程批量生成迷宫，整块向量化计算指标，流式写出 CSV
+- 生成器：server（game_engine.build_world）或 client（maze01.generate_maze）
+- 参数扫描：各参数可给多个值，按笛卡尔积组合；每个迷宫的种子写入结果，可单独复现
+- 子进程每次生成一块同尺寸迷宫，堆成 (N, H, W) 数组后一次算完整块：
+  邻格平移相加得到度数 → 死胡同 / 岔路数与平均分支数；
+  BFS 为整块一起推进的波前（每步几次平移或运算）→ 解路径长度、可达面积、盲盒 / 陷阱距起点的分布
+- 主进程按完成顺序（imap_unordered）逐块写出，内存只与块大小有关，不随总数增长
+- 需要 NumPy（仅本工具，服务器运行不依赖）
+
+用法示例：
+  python maze_analytics.py --count 100000 --out mazes.csv
+  python maze_analytics.py --generator client --loop-prob 0.3 0.5 0.7 --dead-end-prob 0.1 0.2 --count 20000
+  python maze_analytics.py --trap-divisor 10 15 20 --box-divisor 8 10 --sizes 21 31
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+TRAP_TYPES = ["teleport", "damage", "slow"]
+
+COLUMNS = [
+    "generator", "size", "seed",
+    "loop_prob", "dead_end_prob", "box_count", "trap_divisor", "box_divisor",
+    "open_cells", "reachable", "solution_len", "dead_ends", "junctions", "branching",
+    "boxes", "traps", "trap_teleport", "trap_damage", "trap_slow",
+    "box_dist_mean", "box_dist_max", "trap_dist_mean",
+]
+
+# 汇总时求平均的列
+SUMMARY = ["solution_len", "reachable", "dead_ends", "junctions", "branching", "box_dist_mean"]
+
+
+# ---------------- 生成 ----------------
+def _server_maze(size, seed, params):
+    from game_engine import build_world
+    w = build_world(size, size, rng=random.Random(seed),
+                    trap_divisor=params["trap_divisor"], box_divisor=params["box_divisor"])
+    return (w["grid"], w["start"], w["exit"],
+            [tuple(b["pos"]) for b in w["boxes"]],
+            [(t["pos"][0], t["pos"][1], TRAP_TYPES.index(t["type"])) for t in w["traps"]])
+
+
+def _client_maze(size, seed, params):
+    import models                      # 单机版 models 与 maze01 互相导入，须先导入 models
+    from maze01 import generate_maze   # 会导入 tkinter / PIL，但不创建窗口
+    random.seed(seed)                  # generate_maze 使用全局 random
+    grid, boxes = generate_maze(size, loop_probability=params["loop_prob"],
+                                dead_end_prob=params["dead_end_prob"], box_count=params["box_count"])
+    n = len(grid)
+    return grid, (1, 1), (n - 2, n - 2), boxes, []
+
+
+GENERATORS = {"server": _server_maze, "client": _client_maze}
+
+
+# ---------------- 指标（整块向量化） ----------------
+def _neighbors(mask):
+    """(N,H,W) 布尔数组：四邻格中任一为真"""
+    out = np.zeros_like(mask)
+    out[:, 1:, :] |= mask[:, :-1, :]
+    out[:, :-1, :] |= mask[:, 1:, :]
+    out[:, :, 1:] |= mask[:, :, :-1]
+    out[:, :, :-1] |= mask[:, :, 1:]
+    return out
+
+
+def _per_maze(idx, values, n, reduce='mean'):
+    """按迷宫编号分组的均值 / 最大值（没有元素的迷宫为 nan）"""
+    out = np.full(n, np.nan)
+    if len(idx):
+        if reduce == 'max':
+            m = np.full(n, -1.0)
+            np.maximum.at(m, idx, values)
+            out[m >= 0] = m[m >= 0]
+        else:
+            cnt = np.bincount(idx, minlength=n)
+            tot = np.bincount(idx, weights=values, minlength=n)
+            out[cnt > 0] = tot[cnt > 0] / cnt[cnt > 0]
+    return out
+
+
+def analyze(grids, starts, exits, boxes, traps):
+    """
+    一块同尺寸迷宫的指标
+    :param grids: N 个二维网格（非 0 即可通行）
+    :param starts/exits: N 个 (x, y)
+    :param boxes: N 个 [(x, y), ...]；traps: N 个 [(x, y, 类型下标), ...]
+    :return: {列名: 长度为 N 的数组}
+    """
+    walk = np.asarray(grids) != 0
+    n = walk.shape[0]
+    rows = np.arange(n)
+    # 度数：四个方向平移相加
+    deg = np.zeros(walk.shape, dtype=np.int8)
+    deg[:, 1:, :] += walk[:, :-1, :]
+    deg[:, :-1, :] += walk[:, 1:, :]
+    deg[:, :, 1:] += walk[:, :, :-1]
+    deg[:, :, :-1] += walk[:, :, 1:]
+    deg[~walk] = 0
+    open_cells = walk.sum(axis=(1, 2))
+
+    # 整块 BFS：每一步把波前向四邻格膨胀一次
+    sx, sy = np.asarray(starts).T
+    dist = np.full(walk.shape, -1, dtype=np.int32)
+    frontier = np.zeros_like(walk)
+    frontier[rows, sy, sx] = True
+    reached = frontier.copy()
+    dist[frontier] = 0
+    d = 0
+    while frontier.any():
+        d += 1
+        frontier = _neighbors(frontier) & walk & ~reached
+        dist[frontier] = d
+        reached |= frontier
+    ex, ey = np.asarray(exits).T
+
+    # 盲盒 / 陷阱：摊平成 (迷宫编号, x, y) 后一次查距离
+    bi = np.fromiter((i for i, bs in enumerate(boxes) for _ in bs), dtype=np.int64)
+    bxy = np.array([p for bs in boxes for p in bs], dtype=np.int64).reshape(-1, 2)
+    bd = dist[bi, bxy[:, 1], bxy[:, 0]].astype(float)
+    ti = np.fromiter((i for i, ts in enumerate(traps) for _ in ts), dtype=np.int64)
+    txy = np.array([t for ts in traps for t in ts], dtype=np.int64).reshape(-1, 3)
+    td = dist[ti, txy[:, 1], txy[:, 0]].astype(float)
+    kinds = np.zeros((n, len(TRAP_TYPES)), dtype=np.int64)
+    np.add.at(kinds, (ti, txy[:, 2]), 1)
+
+    return {
+        "open_cells": open_cells,
+        "reachable": reached.sum(axis=(1, 2)),
+        "solution_len": dist[rows, ey, ex],
+        "dead_ends": (deg == 1).sum(axis=(1, 2)),
+        "junctions": (deg >= 3).sum(axis=(1, 2)),
+        "branching": np.round(deg.sum(axis=(1, 2)) / np.maximum(open_cells, 1), 4),
+        "boxes": np.bincount(bi, minlength=n),
+        "traps": np.bincount(ti, minlength=n),
+        "trap_teleport": kinds[:, 0],
+        "trap_damage": kinds[:, 1],
+        "trap_slow": kinds[:, 2],
+        "box_dist_mean": np.round(_per_maze(bi, bd, n), 2),
+        "box_dist_max": _per_maze(bi, bd, n, 'max'),
+        "trap_dist_mean": np.round(_per_maze(ti, td, n), 2),
+    }
+
+
+def run_chunk(task):
+    """子进程：生成一块迷宫并返回 CSV 行"""
+    generator, size, params, seed0, count = task
+    make = GENERATORS[generator]
+    mazes = [make(size, seed0 + i, params) for i in range(count)]
+    cols = analyze(*zip(*mazes))
+    fixed = [generator, size]
+    fixed_params = [params.get(k, '') for k in ("loop_prob", "dead_end_prob", "box_count",
+                                                 "trap_divisor", "box_divisor")]
+    metric_cols = [cols[c].tolist() for c in COLUMNS[8:]]
+    rows = []
+    for i, metrics in enumerate(zip(*metric_cols)):
+        rows.append(fixed + [seed0 + i] + fixed_params +
+                    ['' if isinstance(v, float) and v != v else v for v in metrics])
+    return rows
+
+
+# ---------------- 任务与汇总 ----------------
+def build_tasks(opts):
+    """参数组合 x 尺寸 x 块；同一组合内种子连续，不同组合的种子区间互不重叠"""
+    if opts.generator == "server":
+        grid = [dict(trap_divisor=t, box_divisor=b)
+                for t, b in itertools.product(opts.trap_divisor, opts.box_divisor)]
+    else:
+        grid = [dict(loop_prob=lp, dead_end_prob=de, box_count=bc)
+                for lp, de, bc in itertools.product(opts.loop_prob, opts.dead_end_prob, opts.box_count or [None])]
+    tasks = []
+    seed = opts.seed
+    for params, size in itertools.product(grid, opts.sizes):
+        for start in range(0, opts.count, opts.chunk):
+            n = min(opts.chunk, opts.count - start)
+            tasks.append((opts.generator, size, params, seed + start, n))
+        seed += opts.count
+    return tasks
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="MazeGame 离线迷宫质量分析")
+    ap.add_argument("--generator", choices=sorted(GENERATORS), default="server")
+    ap.add_argument("--count", type=int, default=100000, help="每个参数组合 x 尺寸生成的迷宫数")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[21])
+    ap.add_argument("--loop-prob", type=float, nargs="+", default=[0.5], help="client：环路概率")
+    ap.add_argument("--dead-end-prob", type=float, nargs="+", default=[0.2], help="client：死胡同概率")
+    ap.add_argument("--box-count", type=int, nargs="+", default=None, help="client：盲盒数（默认随尺寸）")
+    ap.add_argument("--trap-divisor", type=int, nargs="+", default=[15], help="server：每多少通路格一个陷阱")
+    ap.add_argument("--box-divisor", type=int, nargs="+", default=[10], help="server：每多少通路格一个盲盒")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk", type=int, default=500, help="每个任务块的迷宫数")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="maze_stats.csv")
+    return ap
+
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    tasks = build_tasks(opts)
+    total = sum(t[4] for t in tasks)
+    sums = {}     # (尺寸, 参数...) -> [个数, 各汇总列之和]
+    idx = [COLUMNS.index(c) for c in SUMMARY]
+    t0 = time.perf_counter()
+    done = 0
+    with open(opts.out, "w", newline="", encoding="utf-8") as f, Pool(opts.workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in pool.imap_unordered(run_chunk, tasks):
+            writer.writerows(rows)
+            for r in rows:
+                acc = sums.setdefault(tuple(r[1:2] + r[3:8]), [0] + [0.0] * len(idx))
+                acc[0] += 1
+                for k, i in enumerate(idx):
+                    acc[k + 1] += r[i] if r[i] != '' else 0
+            done += len(rows)
+            rate = done / (time.perf_counter() - t0)
+            print(f"\r{done}/{total} 迷宫  {rate:.0f}/s", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    print(f"已写入 {opts.out}（{done} 行，{time.perf_counter() - t0:.1f}s）")
+    print("size loop_prob dead_end_prob box_count trap_divisor box_divisor | " + " ".join(SUMMARY))
+    for key, acc in sorted(sums.items(), key=lambda kv: str(kv[0])):
+        means = " ".join(f"{v / acc[0]:.2f}" for v in acc[1:])
+        print(" ".join(str(k) if k not in ('', None) else '-' for k in key) + " | " + means)
+
+
+if __name__ == "__main__":
+    main()
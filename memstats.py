@@ -0,0 +1,80 @@
+# memstats.py
+# -*- coding: utf-8 -*-
+"""
+内存占用估算与堆快照对比
+- deep_sizeof：递归累加容器及其元素的 sys.getsizeof（共享对象只计一次），
+  用于估算每个房间的网格、实体、玩家、缓存各占多少字节
+- HeapTracker：按需开启 tracemalloc，与基准快照对比找出增长最多的分配点（排查泄漏）
+"""
+import sys
+import tracemalloc
+
+
+def deep_sizeof(obj, seen=None):
+    """对象及其引用的容器/元素的总字节数（估算值；小整数等驻留对象也会计入一次）"""
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, '__slots__'):
+            for name in o.__slots__:
+                if hasattr(o, name):
+                    stack.append(getattr(o, name))
+    return total
+
+
+class HeapTracker:
+    """tracemalloc 快照对比：第一次调用建立基准，之后返回相对基准的增长"""
+
+    def __init__(self, frames=8):
+        self.frames = frames
+        self.baseline = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def diff(self, top=20, key='lineno'):
+        """相对基准快照增长最多的 top 个分配点；未开启时先开启并返回空结果"""
+        if self.baseline is None:
+            self.start()
+            return {"started": True, "top": []}
+        current = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = current.filter_traces(filters).compare_to(self.baseline.filter_traces(filters), key)
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "started": False,
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "top": [{
+                "where": [f"{f.filename}:{f.lineno}" for f in s.traceback[-3:]],
+                "size_diff": s.size_diff,
+                "size": s.size,
+                "count_diff": s.count_diff,
+            } for s in stats[:top]],
+        }
+
+
+HEAP = HeapTracker()
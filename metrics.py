@@ -0,0 +1,211 @@
+# metrics.py
+# -*- coding: utf-8 -*-
+"""
+轻量级运行指标
+- HDR 风格（对数-线性分桶）的延迟直方图：每个二进制量级 16 个桶，相对误差约 6%
+- 事件计数、负载大小（按采样估算 JSON / 二进制字节数）
+- 导出为 Prometheus 文本格式（/api/metrics）
+"""
+import functools
+import inspect
+import json
+import time
+
+_SUB_BITS = 4
+_SUB = 1 << _SUB_BITS           # 每个量级的桶数
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+PAYLOAD_SAMPLE_EVERY = 16       # 每 N 帧计算一次负载大小，避免重复序列化拖慢热路径
+
+
+def _bucket_index(v):
+    if v < 2 * _SUB:
+        return v
+    shift = v.bit_length() - _SUB_BITS - 1
+    return (shift + 1) * _SUB + (v >> shift) - _SUB
+
+
+def _bucket_low(idx):
+    if idx < 2 * _SUB:
+        return idx
+    shift = idx // _SUB - 1
+    return (idx % _SUB + _SUB) << shift
+
+
+def payload_size(payload):
+    """负载字节数估算：JSON 部分按紧凑编码计，顶层的 bytes 字段按二进制附件长度计"""
+    binary = 0
+    if isinstance(payload, dict) and any(isinstance(v, (bytes, bytearray)) for v in payload.values()):
+        binary = sum(len(v) for v in payload.values() if isinstance(v, (bytes, bytearray)))
+        payload = {k: v for k, v in payload.items() if not isinstance(v, (bytes, bytearray))}
+    return binary + len(json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+
+class Histogram:
+    """记录非负整数样本（延迟用微秒，大小用字节）"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        v = int(value)
+        if v < 0:
+            v = 0
+        idx = _bucket_index(v)
+        counts = self.counts
+        if idx >= len(counts):
+            counts.extend([0] * (idx + 1 - len(counts)))
+        counts[idx] += 1
+        self.count += 1
+        self.total += v
+        if v > self.max:
+            self.max = v
+
+    def percentile(self, q):
+        """返回分位数（桶下界，最大值处截断）"""
+        if self.count == 0:
+            return 0
+        target = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_bucket_low(idx), self.max)
+        return self.max
+
+
+class Registry:
+    """按名字管理直方图与计数器"""
+
+    def __init__(self):
+        self.latency = {}     # op -> Histogram（微秒）
+        self.payload = {}     # event -> Histogram（字节）
+        self.counters = {}    # event -> int
+        self.collectors = []  # 额外的指标来源：无参函数，返回 Prometheus 文本行列表
+        self.phases = {}      # 启动阶段 -> 耗时（秒）
+        self._payload_tick = {}
+
+    def observe_latency(self, op, micros):
+        h = self.latency.get(op)
+        if h is None:
+            h = self.latency[op] = Histogram()
+        h.record(micros)
+
+    def count(self, event, n=1):
+        self.counters[event] = self.counters.get(event, 0) + n
+
+    def observe_payload(self, event, payload):
+        """按采样估算负载的 JSON 字节数"""
+        tick = self._payload_tick.get(event, 0)
+        self._payload_tick[event] = tick + 1
+        if tick % PAYLOAD_SAMPLE_EVERY:
+            return
+        size = payload_size(payload)
+        h = self.payload.get(event)
+        if h is None:
+            h = self.payload[event] = Histogram()
+        h.record(size)
+
+    def render_prometheus(self):
+        lines = []
+        lines.append('# HELP maze_latency_microseconds Handler / engine call latency')
+        lines.append('# TYPE maze_latency_microseconds summary')
+        for op, h in sorted(self.latency.items()):
+            _render_summary(lines, 'maze_latency_microseconds', 'op', op, h)
+        lines.append('# HELP maze_payload_bytes Sampled JSON payload size per emitted event')
+        lines.append('# TYPE maze_payload_bytes summary')
+        for event, h in sorted(self.payload.items()):
+            _render_summary(lines, 'maze_payload_bytes', 'event', event, h)
+        lines.append('# HELP maze_events_total Socket events handled / emitted')
+        lines.append('# TYPE maze_events_total counter')
+        for event, n in sorted(self.counters.items()):
+            lines.append(f'maze_events_total{{event="{event}"}} {n}')
+        lines.append('# HELP maze_startup_seconds Import / startup phase durations')
+        lines.append('# TYPE maze_startup_seconds gauge')
+        for phase, secs in self.phases.items():
+            lines.append(f'maze_startup_seconds{{phase="{phase}"}} {secs:.6f}')
+        for collect in self.collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+
+def _render_summary(lines, metric, label, value, h):
+    for q in QUANTILES:
+        lines.append(f'{metric}{{{label}="{value}",quantile="{q}"}} {h.percentile(q)}')
+    lines.append(f'{metric}_sum{{{label}="{value}"}} {h.total}')
+    lines.append(f'{metric}_count{{{label}="{value}"}} {h.count}')
+
+
+REGISTRY = Registry()
+
+
+class timer:
+    """上下文管理器：with timer('emit.state'): ..."""
+    __slots__ = ('op', 't0')
+
+    def __init__(self, op):
+        self.op = op
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe_latency(self.op, (time.perf_counter() - self.t0) * 1e6)
+        return False
+
+
+def timed(op):
+    """装饰器：记录函数调用耗时与次数"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe_latency(op, (time.perf_counter() - t0) * 1e6)
+        return wrapper
+    return deco
+
+
+def instrument_handler(event, fn):
+    """
+    包装 SocketIO 事件处理函数：计数 + 耗时。
+    只转发原函数能接收的位置参数（connect 事件会额外传 auth，
+    Flask-SocketIO 靠捕获 TypeError 回退，这里不能让包装层吞掉这个区别）
+    """
+    params = inspect.signature(fn).parameters.values()
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        nargs = None
+    else:
+        nargs = sum(1 for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+    op = f'socket.{event}'
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        REGISTRY.count(event)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args[:nargs]) if nargs is not None else fn(*args)
+        finally:
+            REGISTRY.observe_latency(op, (time.perf_counter() - t0) * 1e6)
+    return wrapper
+
+
+def record_phase(phase, seconds):
+    """记录启动阶段耗时（同名阶段只保留第一次）"""
+    if phase not in REGISTRY.phases:
+        REGISTRY.phases[phase] = seconds
+        print(f"[startup] {phase}: {seconds * 1000:.1f} ms")
+
+
+def register_collector(fn):
+    REGISTRY.collectors.append(fn)
+
+
+def render_prometheus():
+    return REGISTRY.render_prometheus()
@@ -0,0 +1,292 @@
+# monsters.py
+# -*- coding: utf-8 -*-
+"""
+服务器权威的怪物（开盲盒放出，追击玩家）
+- 所有房间的怪物放在同一张列式表（struct-of-arrays）里：房间槽位、x、y、种类、id、过期时间
+- 每个 tick 为有怪物的房间取一次多源 BFS（以房间内所有玩家为源）得到的“到最近玩家的距离场”
+  （迷宫版本与玩家所在格都没变时复用上次的结果），
+  各房间距离场拼接成一个一维数组；随后所有怪物一次性向量化地查 4 个邻格的距离、取最小值移动，
+  命中、过期、各房间视图也都按列批量计算，Python 只遍历命中的怪物
+- 有 NumPy 时列为 ndarray、整张表一次向量化计算；没有时退回逐个怪物的纯 Python 实现（结果相同）
+- 怪物走到玩家所在格即造成伤害并消失（护盾抵挡一次）；存活超时自动消失
+- 距离场在各房间 engine.lock 内计算，移动在表锁内进行；其间迷宫变化、房间关闭或新放出的怪物本 tick 原地不动
+- 每个房间的怪物列表 [[id, x, y, kind], ...]（kind 为 KINDS 下标）随 state 帧下发
+"""
+import time
+from collections import deque
+from threading import Lock
+
+try:
+    import numpy as np
+except ImportError:          # 可选依赖：没有 NumPy 时使用纯 Python 路径
+    np = None
+
+# 与 models.Monster.MONSTER_TYPES 对应（服务器只需要名字，用下标表示种类）
+KINDS = ["知识怪", "暴力怪", "爱财怪", "暴虐怪", "弱智怪", "爆炸怪"]
+_FAR = 1 << 30               # 墙或到不了任何玩家的格子
+
+
+class MonsterSystem:
+    STEP_INTERVAL = 0.5      # 怪物每 0.5 秒走一格
+    LIFESPAN = 20.0          # 存活秒数
+    DAMAGE = 10              # 接触伤害
+    MAX_PER_ROOM = 50
+
+    def __init__(self, scheduler, vectorized=None, clock=time.monotonic):
+        self.clock = clock
+        self.vectorized = (np is not None) if vectorized is None else (vectorized and np is not None)
+        self.engines = []            # 房间槽位 -> GameEngine（关闭的房间置 None，槽位放入 _free 供新房间复用）
+        self._free = []              # 空闲槽位
+        self._slot = {}              # engine.room -> 槽位
+        self.on_update = []          # 回调 fn(engine)：该房间怪物有变化（需推送状态）
+        self.views = {}              # 槽位 -> [[id, x, y, kind], ...]（随 state 帧下发，只整体替换不原地修改）
+        self._fields = {}            # 槽位 -> (engine, (世界版本, 宽, 高, 玩家格集合), 距离场)
+        self._next_id = 1
+        self._lock = Lock()          # 保护列式表与槽位（加锁顺序：engine.lock → 本锁，tick 取距离场时不持有本锁）
+        # 列式表（NumPy 模式为 ndarray，否则为 list）
+        for name, dtype in zip(self._COLUMNS, ('int64', 'int64', 'int64', 'int64', 'int64', 'float64')):
+            setattr(self, name, np.zeros(0, dtype=dtype) if self.vectorized else [])
+        self.timer = scheduler.call_every(self.STEP_INTERVAL, self.tick)
+
+    # ---------------- 房间 ----------------
+    def add_room(self, engine):
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+                self.engines[slot] = engine
+            else:
+                slot = len(self.engines)
+                self.engines.append(engine)
+            self._slot[engine.room] = slot
+        engine.monsters = self
+
+    def remove_room(self, engine):
+        with self._lock:
+            slot = self._slot.pop(engine.room, None)
+            if slot is not None:
+                self.engines[slot] = None
+                self._drop_slot(slot)
+                self._free.append(slot)
+
+    def clear_room(self, engine):
+        """迷宫重新生成时清空该房间的怪物"""
+        with self._lock:
+            slot = self._slot.get(engine.room)
+            if slot is not None:
+                self._drop_slot(slot)
+
+    def view(self, engine):
+        return self.views.get(self._slot.get(engine.room), [])
+
+    # ---------------- 怪物表 ----------------
+    _COLUMNS = ('room', 'x', 'y', 'kind', 'ids', 'expires')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def spawn(self, engine, x, y, kind=None):
+        """在 (x,y) 放出一只怪物（调用方持有 engine.lock）"""
+        with self._lock:
+            slot = self._slot.get(engine.room)
+            if slot is None or len(self.views.get(slot, ())) >= self.MAX_PER_ROOM:
+                return None
+            mid = self._next_id
+            self._next_id += 1
+            if kind is None:
+                kind = mid % len(KINDS)
+            row = (slot, x, y, kind, mid, self.clock() + self.LIFESPAN)
+            for name, value in zip(self._COLUMNS, row):
+                col = getattr(self, name)
+                if self.vectorized:
+                    setattr(self, name, np.append(col, value))
+                else:
+                    col.append(value)
+            # 换成新列表而不是原地追加：state 帧可能正持有旧列表
+            self.views[slot] = self.views.get(slot, []) + [[mid, x, y, kind]]
+            return mid
+
+    def _compact(self, keep):
+        """只保留 keep（布尔序列）为真的行"""
+        for name in self._COLUMNS:
+            col = getattr(self, name)
+            if self.vectorized:
+                setattr(self, name, col[np.asarray(keep, dtype=bool)])
+            else:
+                setattr(self, name, [v for v, k in zip(col, keep) if k])
+
+    def _drop_slot(self, slot):
+        self._compact([r != slot for r in self.room])
+        self.views.pop(slot, None)
+        self._fields.pop(slot, None)
+
+    # ---------------- 模拟 ----------------
+    def _room_field(self, slot, engine):
+        """
+        房间的追击距离场；迷宫版本与玩家所在格都没变时直接复用上次的结果
+        （玩家多数 tick 不动，缓存命中时不必重做 BFS；调用方持有 engine.lock）
+        """
+        w = engine.width
+        sources = frozenset(p.y * w + p.x for p in engine.players.values() if not p.finished and p.hp > 0)
+        key = (engine.world_version, w, engine.height, sources)
+        cached = self._fields.get(slot)
+        if cached is not None and cached[0] is engine and cached[1] == key:
+            return cached[2]
+        field = self._chase_field(engine, sources)
+        self._fields[slot] = (engine, key, field)
+        return field
+
+    @staticmethod
+    def _chase_field(engine, sources):
+        """
+        从 sources（玩家所在格）出发的多源 BFS 距离（一维，i = y*width + x），墙和不可达为 _FAR
+        （调用方持有 engine.lock）
+        """
+        w, h, grid = engine.width, engine.height, engine.grid
+        field = [_FAR] * (w * h)
+        q = deque(sources)
+        for i in sources:
+            field[i] = 0
+        while q:
+            i = q.popleft()
+            d = field[i] + 1
+            x, y = i % w, i // w
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < w and 0 <= ny < h and grid[ny][nx] == 1:
+                    j = ny * w + nx
+                    if field[j] > d:
+                        field[j] = d
+                        q.append(j)
+        return field
+
+    def tick(self):
+        """调度器定时调用：所有房间的怪物一起走一步"""
+        with self._lock:
+            if not len(self.ids):
+                return
+            slots = sorted(set(self.room.tolist() if self.vectorized else self.room))
+            engines = [(slot, self.engines[slot]) for slot in slots]
+        # 1. 各房间的距离场拼接为一个数组（逐个房间取 engine.lock，不持有表锁，避免与 spawn 反向加锁）
+        field, fields = [], {}
+        for slot, engine in engines:
+            if engine is None:
+                continue
+            with engine.lock:
+                f = self._room_field(slot, engine)
+                fields[slot] = (engine, engine.world_version, len(field), engine.width, engine.height)
+            field.extend(f)
+        # 2. 在表锁内移动全部怪物：只移动距离场仍有效的房间（房间未关闭、槽位未换人、迷宫未变），
+        #    取距离场期间新放出 / 已清空的行原地不动，下一个 tick 再走
+        with self._lock:
+            live = {slot: snap[2:] for slot, snap in fields.items()
+                    if self.engines[slot] is snap[0] and snap[0].world_version == snap[1]}
+            step = self._step_numpy if self.vectorized else self._step_python
+            hits, changed = step(field, live, self.clock())
+        # 3. 结算伤害（只遍历命中的怪物；玩家在 engine.lock 内按格子重新查找）
+        for slot, local in hits:
+            engine, version = fields[slot][:2]
+            self._hit(engine, version, local)
+        # 4. 通知 socket 层推送有变化的房间
+        for slot in changed:
+            engine = self.engines[slot]
+            if engine is not None:
+                for fn in self.on_update:
+                    fn(engine)
+
+    def _step_numpy(self, field, live, now):
+        f = np.asarray(field + [_FAR], dtype=np.int64)   # 末尾哨兵：无效行统一查这一格
+        size = len(self.engines)
+        ok = np.zeros(size, dtype=bool)
+        off = np.zeros(size, dtype=np.int64)
+        wid = np.ones(size, dtype=np.int64)
+        hgt = np.ones(size, dtype=np.int64)
+        for slot, (o, w, h) in live.items():
+            ok[slot], off[slot], wid[slot], hgt[slot] = True, o, w, h
+        room, x, y = self.room, self.x, self.y
+        valid = ok[room]
+        w, h = wid[room], hgt[room]
+        base = off[room]
+        idx = base + y * w + x
+        # 候选：原地、右、左、下、上；越出本房间网格的邻格不参与（炸弹可能炸开外圈墙）
+        cand = np.stack([idx, idx + 1, idx - 1, idx + w, idx - w])
+        inside = np.stack([valid, valid & (x + 1 < w), valid & (x > 0), valid & (y + 1 < h), valid & (y > 0)])
+        cand = np.where(inside, cand, f.size - 1)
+        choice = np.argmin(f[cand], axis=0)
+        new_idx = np.where(choice == 0, idx, cand[choice, np.arange(idx.size)])
+        moved = choice != 0
+        local = new_idx - base
+        self.x = np.where(moved, local % w, x)
+        self.y = np.where(moved, local // w, y)
+        hit = valid & (f[np.where(valid, new_idx, f.size - 1)] == 0)
+        gone = hit | (self.expires <= now)
+        changed = set(np.unique(room[moved | gone]).tolist())
+        hits = list(zip(room[hit].tolist(), local[hit].tolist()))
+        if gone.any():
+            self._compact(~gone)
+        self._rebuild_views()
+        return hits, changed
+
+    def _step_python(self, field, live, now):
+        hits, changed, keep = [], set(), []
+        for n, (slot, x, y) in enumerate(zip(self.room, self.x, self.y)):
+            expired = self.expires[n] <= now
+            if slot not in live:
+                if expired:
+                    changed.add(slot)
+                keep.append(not expired)
+                continue
+            o, w, h = live[slot]
+            i = o + y * w + x
+            cand = [i]
+            if x + 1 < w:
+                cand.append(i + 1)
+            if x > 0:
+                cand.append(i - 1)
+            if y + 1 < h:
+                cand.append(i + w)
+            if y > 0:
+                cand.append(i - w)
+            best = min(cand, key=field.__getitem__)
+            local = best - o
+            self.x[n], self.y[n] = local % w, local // w
+            hit = field[best] == 0
+            gone = hit or expired
+            if hit:
+                hits.append((slot, local))
+            if best != i or gone:
+                changed.add(slot)
+            keep.append(not gone)
+        if not all(keep):
+            self._compact(keep)
+        self._rebuild_views()
+        return hits, changed
+
+    def _rebuild_views(self):
+        """各房间的 [[id, x, y, kind], ...]"""
+        if self.vectorized:
+            rows = np.column_stack([self.ids, self.x, self.y, self.kind]).tolist()
+            rooms = self.room.tolist()
+        else:
+            rows = [list(r) for r in zip(self.ids, self.x, self.y, self.kind)]
+            rooms = self.room
+        views = {}
+        for slot, row in zip(rooms, rows):
+            views.setdefault(slot, []).append(row)
+        self.views = views
+
+    def _hit(self, engine, version, cell):
+        """怪物撞上 cell 格：在 engine.lock 内重新查找该格上仍在房间里的玩家"""
+        with engine.lock:
+            if engine.world_version != version:
+                return
+            x, y = cell % engine.width, cell // engine.width
+            for p in list(engine.players.values()):
+                if p.x != x or p.y != y or p.finished or p.hp <= 0 or p.sid is None:
+                    continue
+                p.touch()
+                if p.shield:
+                    p.shield = False
+                    msg = "怪物撞上了你的护盾，护盾破碎"
+                else:
+                    p.hp = max(0, p.hp - self.DAMAGE)
+                    msg = f"被怪物追上，生命 -{self.DAMAGE}"
+                engine.sock.emit('message', {'msg': msg}, to=p.sid)
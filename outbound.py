@@ -0,0 +1,234 @@
+# outbound.py
+# -*- coding: utf-8 -*-
+"""
+状态帧的逐连接发送控制（背压 + 丢弃过期帧）
+- 每种格式只保留最新一帧：客户端来不及接收时，新帧直接覆盖未发送的旧帧（latest-wins），
+  因此每个连接的待发数据是 O(1)，慢连接不会让服务器内存增长
+- 每个连接最多一帧在途：客户端处理完后回 state_ack(seq)，收到确认前不再发送
+- 确认往返慢或超时的连接自动降级为较低的发送频率，恢复后逐步升回
+- 同一时刻可发送的连接合并为一次 emit(to=[...])，帧只编码一次
+观战者不经过上述队列，由 SpectatorFeed 定时推送压缩后的低频快照
+"""
+import json
+import time
+import zlib
+
+import metrics
+
+
+class ClientQueue:
+    """单个连接的发送状态"""
+    __slots__ = ('sid', 'fmt', 'inflight', 'sent_at', 'pending', 'interval',
+                 'sent', 'dropped', 'timeouts')
+
+    def __init__(self, sid, fmt):
+        self.sid = sid
+        self.fmt = fmt
+        self.inflight = 0       # 在途帧序号，0 表示没有
+        self.sent_at = 0.0      # 最近一次发送时间
+        self.pending = False    # 是否有尚未发出的新帧
+        self.interval = 0.0     # 两帧之间的最小间隔（秒），0 表示不限速
+        self.sent = 0
+        self.dropped = 0        # 被更新的帧覆盖而未发送的帧数
+        self.timeouts = 0
+
+
+class OutboundQueues:
+    SLOW_RTT = 0.25         # 确认往返超过该值视为慢连接
+    ACK_TIMEOUT = 2.0       # 超时未确认视为丢失，可继续发送（并降级）
+    MIN_INTERVAL = 0.1      # 降级后的起始间隔
+    MAX_INTERVAL = 1.0      # 最低发送频率：每秒一帧
+
+    def __init__(self, socketio, events, clock=time.monotonic):
+        """events：格式 -> 事件名，例如 {'json': 'state', 'packed': 'state_packed'}"""
+        self.sock = socketio
+        self.events = events
+        self.clock = clock
+        self.clients = {}                       # sid -> ClientQueue
+        self.latest = {fmt: None for fmt in events}   # 格式 -> 最新一帧（已带 seq）
+        self._seq = 0
+        self.dropped_total = 0
+        self.timeouts_total = 0
+
+    @property
+    def seq(self):
+        """已发布的帧序号（状态每变化一次加一）"""
+        return self._seq
+
+    def add(self, sid, fmt):
+        q = self.clients.get(sid)
+        if q is None:
+            self.clients[sid] = ClientQueue(sid, fmt)
+        else:
+            q.fmt = fmt
+
+    def remove(self, sid):
+        self.clients.pop(sid, None)
+
+    def count(self, fmt):
+        return sum(1 for q in self.clients.values() if q.fmt == fmt)
+
+    def _ready(self, q, now):
+        """（有新帧时）该连接此刻能否发送"""
+        if q.inflight:
+            if now - q.sent_at < self.ACK_TIMEOUT:
+                return False
+            # 确认丢失（或客户端不回确认）：按超时降级后继续
+            q.inflight = 0
+            q.timeouts += 1
+            self.timeouts_total += 1
+            self._slow_down(q)
+        return now - q.sent_at >= q.interval
+
+    def _slow_down(self, q):
+        q.interval = min(self.MAX_INTERVAL, max(self.MIN_INTERVAL, q.interval * 2))
+
+    def publish(self, frames):
+        """
+        发布新一帧：frames 为 格式 -> 负载构建函数（只调用有客户端的格式）
+        可立即发送的连接合并为一次 emit，其余的只标记 pending，等确认或定时 flush 时补发
+        """
+        now = self.clock()
+        self._seq += 1
+        for fmt, build in frames.items():
+            members = [q for q in self.clients.values() if q.fmt == fmt]
+            if not members:
+                self.latest[fmt] = None
+                continue
+            payload = build()
+            payload['seq'] = self._seq
+            self.latest[fmt] = payload
+            metrics.REGISTRY.observe_payload(self.events[fmt], payload)
+            ready = []
+            for q in members:
+                if q.pending:
+                    q.dropped += 1
+                    self.dropped_total += 1
+                q.pending = True
+                if self._ready(q, now):
+                    ready.append(q)
+            self._send(fmt, ready, now)
+
+    def _send(self, fmt, queues, now):
+        if not queues:
+            return
+        payload = self.latest[fmt]
+        for q in queues:
+            q.inflight = payload['seq']
+            q.sent_at = now
+            q.pending = False
+            q.sent += 1
+        event = self.events[fmt]
+        with metrics.timer(f'emit.{event}'):
+            self.sock.emit(event, payload, to=[q.sid for q in queues])
+
+    def ack(self, sid, seq):
+        """客户端确认收到 seq 帧：按往返时间调整发送频率，有新帧且间隔已到时立即补发"""
+        q = self.clients.get(sid)
+        if q is None or q.inflight != seq:
+            return
+        now = self.clock()
+        rtt = now - q.sent_at
+        q.inflight = 0
+        if rtt > self.SLOW_RTT:
+            self._slow_down(q)
+        elif q.interval:
+            q.interval = q.interval / 2 if q.interval / 2 >= self.MIN_INTERVAL else 0.0
+        if q.pending and now - q.sent_at >= q.interval:
+            self._send(q.fmt, [q], now)
+
+    def flush(self):
+        """定时调用：给限速到期、仍有待发新帧的连接补发最新帧"""
+        now = self.clock()
+        due = {}
+        for q in self.clients.values():
+            if q.pending and self.latest.get(q.fmt) is not None and self._ready(q, now):
+                due.setdefault(q.fmt, []).append(q)
+        for fmt, queues in due.items():
+            self._send(fmt, queues, now)
+
+    def stats(self):
+        clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "pending": sum(1 for q in clients if q.pending),
+            "inflight": sum(1 for q in clients if q.inflight),
+            "downgraded": sum(1 for q in clients if q.interval),
+            "dropped_total": self.dropped_total,
+            "timeouts_total": self.timeouts_total,
+            "slowest": sorted(
+                ({"sid": q.sid, "interval": q.interval, "sent": q.sent, "dropped": q.dropped,
+                  "timeouts": q.timeouts} for q in clients if q.interval),
+                key=lambda r: -r['interval'])[:10],
+        }
+
+
+def prometheus_lines(queues):
+    """供 /api/metrics 追加输出；queues 为 房间名 -> OutboundQueues"""
+    stats = [(room, q.stats()) for room, q in queues.items()]
+    lines = ['# HELP maze_outbound_clients State-frame receivers by queue condition',
+             '# TYPE maze_outbound_clients gauge']
+    for room, s in stats:
+        lines.append(f'maze_outbound_clients{{room="{room}",state="connected"}} {s["clients"]}')
+        lines.append(f'maze_outbound_clients{{room="{room}",state="pending"}} {s["pending"]}')
+        lines.append(f'maze_outbound_clients{{room="{room}",state="inflight"}} {s["inflight"]}')
+        lines.append(f'maze_outbound_clients{{room="{room}",state="downgraded"}} {s["downgraded"]}')
+    lines += ['# HELP maze_outbound_frames_total State frames not delivered to a client',
+              '# TYPE maze_outbound_frames_total counter']
+    for room, s in stats:
+        lines.append(f'maze_outbound_frames_total{{room="{room}",result="dropped"}} {s["dropped_total"]}')
+        lines.append(f'maze_outbound_frames_total{{room="{room}",result="ack_timeout"}} {s["timeouts_total"]}')
+    return lines
+
+
+class SpectatorFeed:
+    """
+    观战推送：按固定频率（默认 4Hz）把最新状态 zlib 压缩后广播到观战房间
+    - 状态没有变化的周期不发送
+    - 每帧只序列化、压缩一次，由所有观战者共享；观战者不占用玩家的发送队列
+    """
+    HZ = 4
+
+    def __init__(self, socketio, room, build, version):
+        """build：构建状态负载；version：返回当前状态序号（变化才重新推送）"""
+        self.sock = socketio
+        self.room = room
+        self.build = build
+        self.version = version
+        self.viewers = set()
+        self._sent_version = None
+        self._frame_cache = None
+
+    def add(self, sid):
+        self.viewers.add(sid)
+
+    def remove(self, sid):
+        self.viewers.discard(sid)
+
+    def __contains__(self, sid):
+        return sid in self.viewers
+
+    def __len__(self):
+        return len(self.viewers)
+
+    def _frame(self):
+        """当前状态的压缩帧（同一状态序号只构建一次）"""
+        version = self.version()
+        if self._frame_cache is None or self._frame_cache['seq'] != version:
+            raw = json.dumps(self.build(), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            self._frame_cache = {"seq": version, "z": zlib.compress(raw, 6)}
+            metrics.REGISTRY.observe_payload('spectate_state', self._frame_cache)
+        return self._frame_cache
+
+    def tick(self):
+        """定时调用：状态有变化时向全部观战者推送一帧"""
+        if not self.viewers or self.version() == self._sent_version:
+            return
+        frame = self._frame()
+        self._sent_version = frame['seq']
+        with metrics.timer('emit.spectate_state'):
+            self.sock.emit('spectate_state', frame, to=self.room)
+
+    def welcome(self, sid):
+        """新观战者立即收到当前帧（不必等下一个周期，也不打扰其他观战者）"""
+        self.sock.emit('spectate_state', self._frame(), to=sid)
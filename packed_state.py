@@ -0,0 +1,54 @@
+# packed_state.py
+# -*- coding: utf-8 -*-
+"""
+玩家状态的列式二进制编码（state_packed 帧）
+布局（小端）：
+  头部   u8 版本, u8 保留, u16 保留, u32 玩家数 n
+  index  u32[n]   玩家编号（join 时分配，名字等通过 roster 事件只发一次）
+  x      u16[n]
+  y      u16[n]
+  hp     u16[n]
+  coins  u32[n]
+  flags  u8[n]    bit0=护盾 bit1=已到达出口
+前端解码见 static/js/game_client.js 的 decodePackedPlayers
+"""
+import struct
+
+VERSION = 1
+_HEADER = struct.Struct('<BBHI')
+
+FLAG_SHIELD = 1
+FLAG_FINISHED = 2
+
+
+def encode_players(players):
+    """players: PlayerRecord 可迭代对象 -> bytes"""
+    players = list(players)
+    n = len(players)
+    flags = bytes((FLAG_SHIELD if p.shield else 0) | (FLAG_FINISHED if p.finished else 0) for p in players)
+    return b''.join((
+        _HEADER.pack(VERSION, 0, 0, n),
+        struct.pack(f'<{n}I', *[p.index for p in players]),
+        struct.pack(f'<{n}H', *[p.x for p in players]),
+        struct.pack(f'<{n}H', *[p.y for p in players]),
+        struct.pack(f'<{n}H', *[p.hp for p in players]),
+        struct.pack(f'<{n}I', *[p.coins for p in players]),
+        flags,
+    ))
+
+
+def decode_players(data):
+    """解码为 dict 列表（服务器端测试/压测客户端使用）"""
+    version, _, _, n = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"未知的 state_packed 版本 {version}")
+    off = _HEADER.size
+    cols = []
+    for fmt, size in (('I', 4), ('H', 2), ('H', 2), ('H', 2), ('I', 4), ('B', 1)):
+        cols.append(struct.unpack_from(f'<{n}{fmt}', data, off))
+        off += size * n
+    return [
+        {"index": i, "x": x, "y": y, "hp": hp, "coins": coins,
+         "shield": bool(f & FLAG_SHIELD), "finished": bool(f & FLAG_FINISHED)}
+        for i, x, y, hp, coins, f in zip(*cols)
+    ]
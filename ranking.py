@@ -0,0 +1,106 @@
+# ranking.py
+# -*- coding: utf-8 -*-
+"""
+房间内实时进度排名：按“到出口的剩余步数”升序
+- 树状数组（Fenwick）维护每个距离上的人数：更新 O(log D)、查名次 O(log D)
+- 同距离的玩家放在同一个桶里（并列名次）
+- 取前 k 名只访问非空桶：O(k log D)
+D 为距离上限（迷宫单元数），与玩家数无关
+"""
+
+
+class DistanceRanking:
+    def __init__(self, max_distance=0):
+        self.reset(max_distance)
+
+    def reset(self, max_distance):
+        """清空并按新的距离上限重建（迷宫变化时调用）"""
+        # 最后一个桶留给不可达（距离 -1）的玩家
+        self.size = max_distance + 2
+        self._tree = [0] * (self.size + 1)
+        self._buckets = {}     # dist -> {sid: name}（dict 保持插入顺序）
+        self._members = {}     # sid -> dist
+
+    def __len__(self):
+        return len(self._members)
+
+    def _slot(self, dist):
+        return self.size - 1 if dist < 0 or dist >= self.size - 1 else dist
+
+    def _add(self, slot, delta):
+        i = slot + 1
+        tree = self._tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot):
+        """距离槽位 < slot 的人数"""
+        i = slot
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _kth(self, k):
+        """第 k 个（从 1 开始）玩家所在的槽位"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        tree = self._tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def update(self, sid, name, dist):
+        """插入或移动玩家"""
+        slot = self._slot(dist)
+        old = self._members.get(sid)
+        if old == slot:
+            return
+        if old is not None:
+            self._discard(sid, old)
+        self._members[sid] = slot
+        self._buckets.setdefault(slot, {})[sid] = name
+        self._add(slot, 1)
+
+    def remove(self, sid):
+        old = self._members.pop(sid, None)
+        if old is not None:
+            self._discard(sid, old)
+
+    def _discard(self, sid, slot):
+        bucket = self._buckets[slot]
+        del bucket[sid]
+        if not bucket:
+            del self._buckets[slot]
+        self._add(slot, -1)
+
+    def rank(self, sid):
+        """名次（从 1 开始，同距离并列），不存在时返回 None"""
+        slot = self._members.get(sid)
+        if slot is None:
+            return None
+        return self._prefix(slot) + 1
+
+    def top(self, k=10):
+        """前 k 名：[(rank, name, dist), ...]，不可达的 dist 为 -1"""
+        out = []
+        n = len(self._members)
+        seen = 0
+        while len(out) < k and seen < n:
+            slot = self._kth(seen + 1)
+            bucket = self._buckets[slot]
+            dist = -1 if slot == self.size - 1 else slot
+            rank = seen + 1
+            for name in bucket.values():
+                if len(out) >= k:
+                    break
+                out.append((rank, name, dist))
+            seen += len(bucket)
+        return out
@@ -0,0 +1,195 @@
+# rooms.py
+# -*- coding: utf-8 -*-
+"""
+房间管理：按负载放置玩家、自动开房 / 关房
+- 每个房间是一个独立的 GameEngine（共享同一个 socketio 与调度器），房间名即 engine.room
+- 负载 = 房间内事件处理耗时占一秒的比例（socket 层在每个事件后 charge），按周期做指数平滑
+- 新玩家进入负载最低、且未超过人数/负载上限的房间；都超限时新开一个房间
+- 默认房间常驻；其他房间空闲（无在线玩家、无断线保留、无观战者）超过 IDLE_CLOSE 秒后关闭
+"""
+import itertools
+import time
+
+from lock_profiler import PROMETHEUS_HEADER
+from monsters import MonsterSystem
+
+
+class Room:
+    __slots__ = ('name', 'engine', 'members', 'cost', 'load', 'idle_since', 'channel')
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.members = set()    # 在本房间的连接（玩家 + 观战者）
+        self.cost = 0.0         # 当前统计周期内累计的处理耗时（秒）
+        self.load = 0.0         # 平滑后的负载（0~1，约等于占用一个核的比例）
+        self.idle_since = time.monotonic()
+        self.channel = None     # socket 层附加的发送状态（发送队列、观战推送等）
+
+    @property
+    def players(self):
+        return len(self.engine.players)
+
+    def is_idle(self):
+        return not self.members and not self.engine.players and not self.engine.detached
+
+    def info(self):
+        return {
+            "room": self.name,
+            "players": self.players,
+            "connections": len(self.members),
+            "detached": len(self.engine.detached),
+            "load": round(self.load, 4),
+        }
+
+
+class RoomManager:
+    MAX_PLAYERS = 40        # 单房间玩家上限
+    LOAD_THRESHOLD = 0.25   # 单房间负载上限（超过后不再分配新玩家）
+    IDLE_CLOSE = 120        # 空房间保留秒数
+    CHECK_INTERVAL = 5.0    # 负载统计 / 关房检查周期
+    SMOOTHING = 0.5         # 负载指数平滑系数
+
+    def __init__(self, make_engine, scheduler, default='main'):
+        """make_engine(room_name) -> GameEngine"""
+        self.make_engine = make_engine
+        self.scheduler = scheduler
+        self.default = default
+        self.rooms = {}                 # name -> Room
+        self.by_sid = {}                # sid -> Room
+        self.on_open = []               # 回调 fn(room)：新房间创建后
+        self.on_close = []              # 回调 fn(room)：房间关闭前
+        self.lock_profiling = False     # 锁竞争分析开关（见 profile_locks）
+        self._names = itertools.count(2)
+        self._last_check = time.monotonic()
+        self.monsters = MonsterSystem(scheduler)   # 所有房间共用一张怪物表，批量更新
+        self.open(default)
+        scheduler.call_every(self.CHECK_INTERVAL, self._maintain)
+
+    # ---------------- 房间生命周期 ----------------
+    def open(self, name=None):
+        if name is None:
+            name = f"room-{next(self._names)}"
+            while name in self.rooms:
+                name = f"room-{next(self._names)}"
+        room = Room(name, self.make_engine(name))
+        room.engine.lock.set_enabled(self.lock_profiling)
+        self.rooms[name] = room
+        self.monsters.add_room(room.engine)
+        for fn in self.on_open:
+            fn(room)
+        return room
+
+    def close(self, room):
+        for fn in self.on_close:
+            fn(room)
+        self.monsters.remove_room(room.engine)
+        room.engine.close()
+        del self.rooms[room.name]
+
+    @property
+    def main(self):
+        return self.rooms[self.default]
+
+    # ---------------- 放置 ----------------
+    def get(self, name):
+        return self.rooms.get(name)
+
+    def room_of(self, sid):
+        return self.by_sid.get(sid)
+
+    def find_session(self, token):
+        """断线玩家的令牌在哪个房间（房间数很少，逐个查找）"""
+        if token:
+            for room in self.rooms.values():
+                if token in room.engine.detached:
+                    return room
+        return None
+
+    def _accepts(self, room):
+        return room.players < self.MAX_PLAYERS and room.load < self.LOAD_THRESHOLD
+
+    def place(self, sid, requested=None, token=None):
+        """
+        为连接选择房间并登记：断线令牌所在房间 > 指定的房间 > 负载最低的可用房间 > 新开房间
+        """
+        room = self.find_session(token) or self.rooms.get(requested)
+        if room is None:
+            candidates = [r for r in self.rooms.values() if self._accepts(r)]
+            if candidates:
+                room = min(candidates, key=lambda r: (r.load, r.players))
+            else:
+                room = self.open()
+        self.attach(sid, room)
+        return room
+
+    def attach(self, sid, room):
+        old = self.by_sid.get(sid)
+        if old is not None and old is not room:
+            old.members.discard(sid)
+        self.by_sid[sid] = room
+        room.members.add(sid)
+
+    def release(self, sid):
+        room = self.by_sid.pop(sid, None)
+        if room is not None:
+            room.members.discard(sid)
+            if room.is_idle():
+                room.idle_since = time.monotonic()
+        return room
+
+    # ---------------- 负载统计 ----------------
+    def charge(self, room, seconds):
+        """socket 层在处理完一个属于该房间的事件后调用"""
+        room.cost += seconds
+
+    def _maintain(self):
+        now = time.monotonic()
+        elapsed = max(1e-6, now - self._last_check)
+        self._last_check = now
+        a = self.SMOOTHING
+        for room in list(self.rooms.values()):
+            room.load = a * (room.cost / elapsed) + (1 - a) * room.load
+            room.cost = 0.0
+            if room.name == self.default:
+                continue
+            if not room.is_idle():
+                room.idle_since = now
+            elif now - room.idle_since >= self.IDLE_CLOSE:
+                self.close(room)
+
+    def stats(self):
+        return [room.info() for room in self.rooms.values()]
+
+    # ---------------- 快照 / 锁分析 ----------------
+    def reopen(self, names):
+        """启动时重新打开上次留下快照的房间（断线玩家凭令牌回到原房间）"""
+        for name in names:
+            if name not in self.rooms:
+                self.open(name)
+
+    def save_snapshots(self):
+        """进程退出时：所有房间各写一次快照"""
+        for room in list(self.rooms.values()):
+            room.engine._save_snapshot_quietly()
+
+    def profile_locks(self, enabled):
+        """所有房间的锁竞争分析开关；之后新开的房间沿用同一设置"""
+        self.lock_profiling = bool(enabled)
+        for room in self.rooms.values():
+            room.engine.lock.set_enabled(enabled)
+
+    def lock_prometheus_lines(self):
+        lines = PROMETHEUS_HEADER[:]
+        for room in list(self.rooms.values()):
+            lines += room.engine.lock.prometheus_lines(room=room.name)
+        return lines
+
+    def prometheus_lines(self):
+        lines = ['# HELP maze_room_players Players per room',
+                 '# TYPE maze_room_players gauge']
+        lines += [f'maze_room_players{{room="{r.name}"}} {r.players}' for r in self.rooms.values()]
+        lines += ['# HELP maze_room_load Smoothed share of one core spent handling room events',
+                  '# TYPE maze_room_load gauge']
+        lines += [f'maze_room_load{{room="{r.name}"}} {r.load:.4f}' for r in self.rooms.values()]
+        return lines
@@ -1,6 +1,9 @@
 # routes.py
-from flask import Blueprint, render_template, jsonify
-from db import get_top_scores  # 导入数据库查询函数
+from flask import Blueprint, render_template, jsonify, Response, request, current_app, stream_with_context
+from db import get_top_scores, export_chunks  # 导入数据库查询函数
+import metrics
+from tracing import TRACER
+from memstats import HEAP
 
 # 创建蓝图（命名为`main`，模块为当前文件）
 main_routes = Blueprint('main', __name__)
@@ -25,4 +28,109 @@ def api_leaderboard():
             "coins": r[2],
             "date": r[3].isoformat()
         } for r in top_scores
-    ])
\ No newline at end of file
+    ])
+
+@main_routes.route('/api/scores/export')
+def api_scores_export():
+    """全部成绩流式导出；?format=csv（默认）/ndjson，边查边发，内存占用与表大小无关"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format 只能是 csv/ndjson"}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    headers = {'Content-Disposition': f'attachment; filename=scores.{fmt}'}
+    return Response(stream_with_context(export_chunks(fmt)), mimetype=mimetype, headers=headers)
+
+def _room_engine(name):
+    """按房间名取引擎；未指定时为主房间"""
+    if not name:
+        return current_app.extensions['maze_engine']
+    room = current_app.extensions['maze_rooms'].get(name)
+    return room.engine if room is not None else None
+
+
+@main_routes.route('/api/rooms')
+def api_rooms():
+    """各房间的玩家数、连接数与负载"""
+    return jsonify(current_app.extensions['maze_rooms'].stats())
+
+
+@main_routes.route('/api/path')
+def api_path():
+    """从 (x,y) 到出口的最短路；?limit=N 只返回接下来的 N 步，?room= 指定房间（默认主房间）"""
+    x = request.args.get('x', type=int)
+    y = request.args.get('y', type=int)
+    limit = request.args.get('limit', type=int)
+    if x is None or y is None:
+        return jsonify({"error": "需要参数 x 和 y"}), 400
+    engine = _room_engine(request.args.get('room'))
+    if engine is None:
+        return jsonify({"error": "房间不存在"}), 404
+    engine.ensure_world()
+    path = engine.get_path(x, y, limit if limit is None else max(1, limit))
+    if path is None:
+        return jsonify({"error": "坐标越界或无法到达出口"}), 404
+    return jsonify(path)
+
+@main_routes.route('/api/metrics')
+def api_metrics():
+    """以 Prometheus 文本格式导出延迟直方图、事件计数与负载大小"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@main_routes.route('/debug/lock')
+def debug_lock():
+    """锁竞争 Top-N 报告；?room=房间名（默认主房间），?enable=1/0 在运行时开关所有房间的分析，?top=N，?sort=hold/wait"""
+    engine = _room_engine(request.args.get('room'))
+    if engine is None:
+        return jsonify({"error": "房间不存在"}), 404
+    if 'enable' in request.args:
+        current_app.extensions['maze_rooms'].profile_locks(request.args.get('enable') == '1')
+    top = request.args.get('top', 10, type=int)
+    key = 'wait' if request.args.get('sort') == 'wait' else 'hold'
+    return jsonify(dict(engine.lock.report(top=top, key=key), room=engine.room))
+
+
+@main_routes.route('/debug/trace')
+def debug_trace():
+    """最近的事件追踪记录；?limit=N，?event=join，?sid=..."""
+    limit = max(1, min(request.args.get('limit', 200, type=int), TRACER.ring.size))
+    return jsonify({
+        "sample": TRACER.sample,
+        "lost": TRACER.lost,
+        "spans": TRACER.recent(limit, event=request.args.get('event'), sid=request.args.get('sid')),
+    })
+
+
+@main_routes.route('/debug/memory')
+def debug_memory():
+    """
+    每个房间的内存估算；orphans 为已断开却仍留在 players 中的 sid（断线事件丢失导致的泄漏）
+    """
+    sock = current_app.extensions.get('socketio')
+    reports = []
+    for room in list(current_app.extensions['maze_rooms'].rooms.values()):
+        engine = room.engine
+        report = engine.memory_report()
+        if sock is not None:
+            manager = sock.server.manager
+            report['orphans'] = [sid for sid in list(engine.players) if not manager.is_connected(sid, '/')]
+        reports.append(report)
+    return jsonify({"rooms": reports})
+
+
+@main_routes.route('/debug/heap')
+def debug_heap():
+    """
+    tracemalloc 快照对比：第一次请求开启追踪并建立基准，之后返回相对基准增长最多的分配点
+    ?reset=1 重建基准，?stop=1 关闭追踪，?top=N，?key=lineno/filename/traceback
+    """
+    if request.args.get('stop') == '1':
+        HEAP.stop()
+        return jsonify({"tracing": False})
+    if request.args.get('reset') == '1':
+        HEAP.start()
+        return jsonify({"tracing": True, "started": True, "top": []})
+    key = request.args.get('key', 'lineno')
+    if key not in ('lineno', 'filename', 'traceback'):
+        return jsonify({"error": "key 只能是 lineno/filename/traceback"}), 400
+    top = max(1, request.args.get('top', 20, type=int))
+    return jsonify(dict(HEAP.diff(top=top, key=key), tracing=True))
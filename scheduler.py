@@ -0,0 +1,82 @@
+# scheduler.py
+# -*- coding: utf-8 -*-
+"""
+定时事件调度器（最小堆）
+- 房间/引擎在同一个调度器上注册一次性与周期性事件，不再各自起一个 sleep 循环
+- 由单个后台任务驱动：每个 tick 取出所有到期事件批量执行
+- 回调自行决定是否加锁；回调抛出的异常只记录，不影响其他事件
+"""
+import heapq
+import itertools
+import time
+
+
+class Timer:
+    """调度句柄，可用于取消"""
+    __slots__ = ('when', 'interval', 'fn', 'args', 'cancelled')
+
+    def __init__(self, when, interval, fn, args):
+        self.when = when
+        self.interval = interval
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self, tick_interval=0.1, clock=time.monotonic):
+        self.tick_interval = tick_interval
+        self.clock = clock
+        self._heap = []                 # (when, seq, Timer)
+        self._seq = itertools.count()   # 同一时刻按注册顺序执行
+        self._running = False
+
+    def call_later(self, delay, fn, *args):
+        """delay 秒后执行一次"""
+        return self._push(Timer(self.clock() + delay, None, fn, args))
+
+    def call_every(self, interval, fn, *args, first_delay=None):
+        """每 interval 秒执行一次（首次默认也在 interval 秒后）"""
+        delay = interval if first_delay is None else first_delay
+        return self._push(Timer(self.clock() + delay, interval, fn, args))
+
+    def _push(self, timer):
+        heapq.heappush(self._heap, (timer.when, next(self._seq), timer))
+        return timer
+
+    def __len__(self):
+        return sum(1 for _, _, t in self._heap if not t.cancelled)
+
+    def run_due(self, now=None):
+        """执行所有到期事件，返回执行的个数"""
+        if now is None:
+            now = self.clock()
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+            if not timer.cancelled:
+                due.append(timer)
+        for timer in due:
+            if timer.interval is not None:
+                # 以计划时间为基准推进，避免周期漂移；落后太多时直接对齐到 now
+                timer.when = max(timer.when + timer.interval, now)
+                self._push(timer)
+            try:
+                timer.fn(*timer.args)
+            except Exception as e:
+                print(f"[scheduler] {getattr(timer.fn, '__name__', timer.fn)} 执行失败: {e!r}")
+        return len(due)
+
+    def run_forever(self, sleep):
+        """后台任务入口：sleep 为 socketio.sleep（eventlet 下让出协程）"""
+        self._running = True
+        while self._running:
+            sleep(self.tick_interval)
+            self.run_due()
+
+    def stop(self):
+        self._running = False
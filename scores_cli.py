@@ -0,0 +1,74 @@
+# scores_cli.py
+# -*- coding: utf-8 -*-
+"""
+成绩表命令行工具（迁移 / 离线分析用）
+- import：从 CSV 或 NDJSON 文件批量导入（边读边插，整个文件一个事务，executemany 分批写入）
+- export：流式导出到文件或标准输出（与 /api/scores/export 相同的格式）
+文件格式与导出一致：列 id,name,time,coins,created_at；导入时忽略 id（重新分配），created_at 可为空
+
+用法示例：
+  python scores_cli.py import scores.csv
+  python scores_cli.py import scores.ndjson --batch 10000
+  python scores_cli.py export --format ndjson -o scores.ndjson
+"""
+import argparse
+import csv
+import datetime
+import json
+import sys
+import time
+
+import db
+
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def read_records(path, fmt=None):
+    """逐行读取文件，生成 (name, time, coins, created_at)"""
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row['name'], row['time'], row['coins'], _parse_time(row.get('created_at'))
+        else:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row['name'], row['time'], row['coins'], _parse_time(row.get('created_at'))
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="MazeGame 成绩导入 / 导出")
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    imp = sub.add_parser('import', help='批量导入')
+    imp.add_argument('path')
+    imp.add_argument('--format', choices=['csv', 'ndjson'], help='默认按扩展名判断')
+    imp.add_argument('--batch', type=int, default=5000, help='每次 executemany 的行数')
+    exp = sub.add_parser('export', help='流式导出')
+    exp.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    exp.add_argument('-o', '--output', help='默认输出到标准输出')
+    exp.add_argument('--batch', type=int, default=1000, help='每次查询的行数')
+    return ap
+
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    t0 = time.perf_counter()
+    if opts.cmd == 'import':
+        n = db.import_scores(read_records(opts.path, opts.format), batch_size=opts.batch)
+        print(f"导入 {n} 条成绩（{time.perf_counter() - t0:.1f}s）", file=sys.stderr)
+        return
+    out = open(opts.output, 'w', newline='', encoding='utf-8') if opts.output else sys.stdout
+    try:
+        for chunk in db.export_chunks(opts.format, batch_size=opts.batch):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"导出完成（{time.perf_counter() - t0:.1f}s）", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
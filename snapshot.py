@@ -0,0 +1,112 @@
+# snapshot.py
+# -*- coding: utf-8 -*-
+"""
+世界快照的编码与读写（用于崩溃恢复/热重启）
+文件格式：
+  头部  <4sBHHI>  魔数 b'MZSN'、格式版本、宽、高、实体表长度
+  网格  width*height 字节，每个单元 1 字节（0=墙，1=路）
+  实体  zlib 压缩的 JSON（起点/出口/陷阱/盲盒/商店/玩家等）
+每个房间一个快照文件：默认房间为 base 本身，其他房间为 world_snapshot.<房间名>.bin
+"""
+import glob
+import json
+import os
+import struct
+import zlib
+
+MAGIC = b'MZSN'
+VERSION = 1
+_HEADER = struct.Struct('<4sBHHI')
+# 恢复世界必需的实体字段
+_ENTITY_KEYS = ('start', 'exit', 'traps', 'boxes', 'shop', 'players')
+_PLAYER_KEYS = ('name', 'x', 'y', 'coins', 'hp', 'shield', 'finished', 'finish_time', 'elapsed')
+
+
+class SnapshotError(Exception):
+    """快照文件损坏或版本不兼容"""
+
+
+def encode_world(grid, width, height, entities):
+    """把网格与实体表编码为紧凑的二进制快照"""
+    grid_bytes = bytes(v for row in grid for v in row)
+    body = zlib.compress(json.dumps(entities, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+    return _HEADER.pack(MAGIC, VERSION, width, height, len(body)) + grid_bytes + body
+
+
+def decode_world(data):
+    """解析快照，返回 (grid, width, height, entities)；任何损坏都抛出 SnapshotError"""
+    if len(data) < _HEADER.size:
+        raise SnapshotError("快照长度不足")
+    try:
+        magic, version, width, height, body_len = _HEADER.unpack_from(data)
+    except struct.error as e:
+        raise SnapshotError(f"快照头部损坏: {e}") from e
+    if magic != MAGIC or version != VERSION:
+        raise SnapshotError(f"未知的快照格式 {magic!r} v{version}")
+    offset = _HEADER.size
+    grid_end = offset + width * height
+    if len(data) != grid_end + body_len:
+        raise SnapshotError("快照长度与头部不符")
+    grid = [list(data[offset + y * width: offset + (y + 1) * width]) for y in range(height)]
+    try:
+        entities = json.loads(zlib.decompress(data[grid_end:]).decode('utf-8'))
+    except (zlib.error, ValueError) as e:       # ValueError 含 JSON 与 UTF-8 解码错误
+        raise SnapshotError(f"快照实体表损坏: {e}") from e
+    _check_entities(entities)
+    return grid, width, height, entities
+
+
+def _check_entities(entities):
+    """校验实体表包含恢复所需的字段"""
+    if not isinstance(entities, dict):
+        raise SnapshotError("快照实体表不是对象")
+    try:
+        missing = [k for k in _ENTITY_KEYS if k not in entities]
+        if not missing:
+            missing = [k for rec in entities['players'] for k in _PLAYER_KEYS if k not in rec]
+    except (KeyError, TypeError) as e:
+        raise SnapshotError(f"快照实体表结构错误: {e!r}") from e
+    if missing:
+        raise SnapshotError(f"快照实体表缺少字段: {', '.join(sorted(set(missing)))}")
+
+
+def room_path(base, room, default='main'):
+    """房间的快照文件路径（默认房间沿用 base，兼容旧的单房间快照）"""
+    if room == default:
+        return base
+    root, ext = os.path.splitext(base)
+    return f"{root}.{room}{ext}"
+
+
+def saved_rooms(base):
+    """base 旁边已有快照文件的非默认房间名"""
+    root, ext = os.path.splitext(base)
+    prefix = root + '.'
+    return sorted(path[len(prefix):-len(ext)] for path in glob.glob(glob.escape(prefix) + '*' + ext))
+
+
+def write_snapshot(path, data):
+    """原子写入：先写临时文件再替换，避免进程中途退出留下半个快照"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def remove_snapshot(path):
+    """删除快照文件（房间关闭后不再恢复），不存在时忽略"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_snapshot(path):
+    """读取快照文件，不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
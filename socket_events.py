@@ -1,66 +1,311 @@
 # socket_events.py
+import time
+
 from flask import request
 from flask_socketio import emit, join_room, leave_room
 
-from db import save_score
+from db import save_score, get_rank
+import metrics
+from tracing import TRACER
+import outbound
+from outbound import OutboundQueues, SpectatorFeed
+
+HINT_MAX_STEPS = 50     # hint 请求的 limit 上限
+
+
+class FlaskTransport:
+    """默认传输层：Flask-SocketIO 的请求上下文函数（asyncio 模式见 asgi_app.AsyncTransport）"""
+    request = request
+    emit = staticmethod(emit)
+    join_room = staticmethod(join_room)
+    leave_room = staticmethod(leave_room)
+
+
+class RoomChannel:
+    """socket 层在每个房间上附加的发送状态"""
+
+    def __init__(self, socketio, room):
+        engine = room.engine
+        self.engine = engine
+        # 状态帧格式协商：每种格式对应一个 SocketIO 子房间（roster 等按格式广播）
+        self.format_counts = {'json': 0, 'packed': 0}
+        # state 帧逐连接做背压：慢连接只拿最新帧，并自动降低发送频率
+        self.outbound = OutboundQueues(socketio, {'json': 'state', 'packed': 'state_packed'})
+        # 观战者：只订阅房间广播和低频压缩快照，不创建玩家、不进入 state 发送队列
+        self.spectators = SpectatorFeed(socketio, f"{engine.room}:spectators",
+                                        engine.get_state_payload, lambda: self.outbound.seq)
+        self.timers = [
+            engine.scheduler.call_every(engine.scheduler.tick_interval, self.outbound.flush),
+            engine.scheduler.call_every(1.0 / SpectatorFeed.HZ, self.spectators.tick),
+        ]
+
+    def format_room(self, fmt):
+        return f"{self.engine.room}:{fmt}"
+
+    def close(self):
+        for timer in self.timers:
+            timer.cancel()
+
 
 #其中socketio.emit为玩家主动通信，在game_engine中为服务器主动通信
-def register_socket_events(socketio, engine):
-    """注册所有SocketIO事件，依赖socketio和engine实例"""
+def register_socket_events(socketio, rooms):
+    """注册所有SocketIO事件，依赖socketio和房间管理器（rooms.RoomManager）"""
+    # 当前连接的 sid / 回复 / 加入离开房间：socketio 对象可通过 transport 属性替换实现
+    transport = getattr(socketio, 'transport', FlaskTransport)
+    request, emit = transport.request, transport.emit
+    join_room, leave_room = transport.join_room, transport.leave_room
+
+    def on(event):
+        """
+        等价于 socketio.on(event)，额外记录事件计数与处理耗时，写一条追踪 span，
+        并把耗时计入连接所在房间的负载
+        """
+        def deco(fn):
+            handler = metrics.instrument_handler(event, fn)
+
+            def traced(*args):
+                sid = request.sid
+                TRACER.begin(sid)
+                data = args[0] if args else None
+                size = metrics.payload_size(data) if isinstance(data, dict) else 0
+                t0 = time.perf_counter()
+                error = None
+                try:
+                    return handler(*args)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    room = rooms.room_of(sid)
+                    if room is not None:
+                        rooms.charge(room, time.perf_counter() - t0)
+                    TRACER.end(event, sid, room.name if room else None, t0, size, error=error)
+            traced.__wrapped__ = fn
+            return socketio.on(event)(traced)
+        return deco
+
+    def broadcast(event, payload, **kwargs):
+        """socketio.emit 的计时版本（同时按采样记录负载大小）"""
+        metrics.REGISTRY.observe_payload(event, payload)
+        with metrics.timer(f'emit.{event}'):
+            socketio.emit(event, payload, **kwargs)
+
+    def reply(event, payload):
+        """emit（回复当前客户端）的计时版本"""
+        metrics.REGISTRY.observe_payload(event, payload)
+        with metrics.timer(f'emit.{event}'):
+            emit(event, payload)
+
+    # 每个房间一个 RoomChannel；房间随负载开关时同步创建/清理
+    def open_channel(room):
+        room.channel = RoomChannel(socketio, room)
+
+    def close_channel(room):
+        room.channel.close()
+
+    rooms.on_open.append(open_channel)
+    rooms.on_close.append(close_channel)
+    for room in rooms.rooms.values():
+        open_channel(room)
+    metrics.register_collector(
+        lambda: outbound.prometheus_lines({r.name: r.channel.outbound for r in rooms.rooms.values()}))
+    metrics.register_collector(rooms.prometheus_lines)
+    TRACER.spawn = socketio.start_background_task     # 写文件 / 标准输出不占用调度器 tick
+    rooms.scheduler.call_every(TRACER.FLUSH_INTERVAL, TRACER.flush)
 
-    @socketio.on('connect')
+    client_formats = {}                      # sid -> 'json' / 'packed'
+
+    def set_format(ch, sid, fmt):
+        ch.outbound.add(sid, fmt)
+        old = client_formats.get(sid)
+        if old == fmt:
+            return
+        if old:
+            ch.format_counts[old] -= 1
+            leave_room(ch.format_room(old))
+        client_formats[sid] = fmt
+        ch.format_counts[fmt] += 1
+        join_room(ch.format_room(fmt))
+
+    def drop_format(ch, sid):
+        ch.outbound.remove(sid)
+        old = client_formats.pop(sid, None)
+        if old:
+            ch.format_counts[old] -= 1
+            leave_room(ch.format_room(old))
+
+    def broadcast_state(ch):
+        """向房间内所有客户端发布最新状态（按各自协商的格式，经发送队列限流）"""
+        engine = ch.engine
+        ch.outbound.publish({'json': engine.get_state_payload, 'packed': engine.get_state_payload_packed})
+
+    def monsters_moved(engine):
+        room = rooms.get(engine.room)
+        if room is not None and room.channel is not None:
+            broadcast_state(room.channel)
+
+    rooms.monsters.on_update.append(monsters_moved)
+
+    def leave_current(sid):
+        """离开当前房间（断线或换房间时）"""
+        room = rooms.release(sid)
+        if room is None:
+            return
+        ch = room.channel
+        leave_room(room.name)
+        if sid in ch.spectators:
+            ch.spectators.remove(sid)
+            leave_room(ch.spectators.room)
+            return
+        # 玩家记录保留一段宽限期，等待客户端凭令牌重连
+        player = room.engine.detach_player(sid)
+        drop_format(ch, sid)
+        if player is not None and ch.format_counts['packed']:
+            broadcast('roster', {'remove': [player.index]}, room=ch.format_room('packed'))
+        broadcast_state(ch)
+
+    def current(sid):
+        """连接所在房间的 (engine, channel)；尚未加入任何房间时为 (None, None)"""
+        room = rooms.room_of(sid)
+        return (room.engine, room.channel) if room is not None else (None, None)
+
+    def playing(sid):
+        """以玩家身份所在房间的 (engine, channel)；未加入或正在观战时为 (None, None)"""
+        engine, ch = current(sid)
+        if ch is not None and sid in ch.spectators:
+            return None, None
+        return engine, ch
+
+    @on('connect')
     def on_connect():
-        sid = request.sid
-        print(f"[connect] sid={sid}")
-        emit('message', {'msg': '连接已建立，请发送 join 事件并携带玩家名以进入游戏。'})
+        reply('message', {'msg': '连接已建立，请发送 join 事件并携带玩家名以进入游戏。'})
 
-    @socketio.on('join')
+    @on('join')
     def on_join(data):
         sid = request.sid
         name = data.get('name', '匿名')
-        print(f"[join] sid={sid} name={name}")
-        player = engine.add_player(sid, name)
-        join_room('main')
-        emit('init', engine.get_init_payload_for(sid))
-        socketio.emit('state', engine.get_state_payload(), room='main')
+        fmt = 'packed' if 'packed' in (data.get('formats') or ()) else 'json'
+        TRACER.note(sid, name=name, format=fmt)
+        if rooms.room_of(sid) is not None:
+            leave_current(sid)
+        # 断线重连：携带 join 时下发的令牌，宽限期内回到原房间、找回原玩家记录
+        # room：可指定房间名，否则按负载分配
+        room = rooms.place(sid, data.get('room'), data.get('resume'))
+        engine, ch = room.engine, room.channel
+        player = engine.resume_player(data.get('resume'), sid)
+        resumed = player is not None
+        TRACER.note(sid, resumed=resumed)
+        if not resumed:
+            player = engine.add_player(sid, name)
+        join_room(engine.room)
+        set_format(ch, sid, fmt)
+        if resumed and data.get('world_version') == engine.world_version:
+            # 客户端手里的迷宫仍然有效：不再重发网格，只补发自身与当前状态
+            reply('resumed', {
+                "room": engine.room,
+                "your_sid": sid,
+                "token": player.token,
+                "world_version": engine.world_version,
+                "player": player.serialize(),
+            })
+        else:
+            # have：客户端本地缓存的网格哈希（最多取前 16 个），命中则不重发网格
+            known = set((data.get('have') or [])[:16])
+            reply('init', engine.get_init_payload_for(sid, known))
+        if fmt == 'packed':
+            reply('roster', {'players': engine.get_roster(), 'reset': True})
+        if ch.format_counts['packed']:
+            broadcast('roster', {'add': [[player.index, sid, player.name]]}, room=ch.format_room('packed'))
+        broadcast_state(ch)
+
+    @on('spectate')
+    def on_spectate(data=None):
+        sid = request.sid
+        if rooms.room_of(sid) is not None:
+            leave_current(sid)
+        # 默认观看人数最多的房间
+        room = rooms.get((data or {}).get('room')) or max(rooms.rooms.values(), key=lambda r: r.players)
+        rooms.attach(sid, room)
+        engine, ch = room.engine, room.channel
+        engine.ensure_world()
+        join_room(engine.room)          # 新迷宫、排行榜等房间广播照常接收
+        join_room(ch.spectators.room)
+        ch.spectators.add(sid)
+        reply('init', dict(engine.get_global_init_payload(), spectator=True))
+        ch.spectators.welcome(sid)
+
+    @on('request_grid')
+    def on_request_grid(data=None):
+        """客户端缓存中找不到 init 指定的网格时兜底请求"""
+        engine, _ = current(request.sid)
+        if engine is not None:
+            reply('grid', engine.get_grid_payload())
 
-    @socketio.on('request_new_maze')
+    @on('request_new_maze')
     def on_request_new_maze(data):
         sid = request.sid
+        engine, ch = playing(sid)
+        if engine is None:
+            reply('message', {'msg': '观战中或未加入游戏，不能生成新迷宫。'})
+            return
         w = int(data.get('w', 21))
         h = int(data.get('h', 21))
-        print(f"[request_new_maze] from {sid} size={w}x{h}")
+        TRACER.note(sid, size=f"{w}x{h}")
         engine.generate_new_maze(w, h)
-        socketio.emit('init', engine.get_global_init_payload(), room='main')
-        socketio.emit('state', engine.get_state_payload(), room='main')
-        socketio.emit('message', {'msg': f'新的迷宫已生成：{w}x{h}'}, room='main')
+        broadcast('init', engine.get_global_init_payload(), room=engine.room)
+        broadcast_state(ch)
+        broadcast('message', {'msg': f'新的迷宫已生成：{w}x{h}'}, room=engine.room)
 
-    @socketio.on('move')
+    @on('move')
     def on_move(data):
         sid = request.sid
+        engine, ch = playing(sid)
+        if engine is None:
+            reply('action_result', {"ok": False, "msg": "玩家不存在或未加入游戏。"})
+            return
         dx = int(data.get('dx', 0))
         dy = int(data.get('dy', 0))
         changed, info = engine.process_move(sid, dx, dy)
-        emit('action_result', info)
-        socketio.emit('state', engine.get_state_payload(), room='main')
+        reply('action_result', info)
+        broadcast_state(ch)
         if changed.get('finished'):
             p = changed['player_snapshot']
-            save_score(p['name'], p['finish_time'], p['coins'])
-            socketio.emit('leaderboard_update', {'top': [dict(n) for n in engine.get_leaderboard_snapshot()]}, room='main')
+            with metrics.timer('db.save_score'):
+                save_score(p['name'], p['finish_time'], p['coins'])
+                rank = get_rank(p['finish_time'])
+            reply('message', {'msg': f"用时 {int(p['finish_time'])} 秒，历史排名第 {rank} 名"})
+            broadcast('leaderboard_update', {'top': [dict(n) for n in engine.get_leaderboard_snapshot()]}, room=engine.room)
 
-    @socketio.on('buy')
+    @on('buy')
     def on_buy(data):
         sid = request.sid
+        engine, ch = playing(sid)
+        if engine is None:
+            reply('buy_result', {"success": False, "msg": "玩家不存在或未加入游戏。"})
+            return
         item_id = data.get('item_id')
         success, msg = engine.buy_item(sid, item_id)
-        emit('buy_result', {"success": success, "msg": msg})
+        reply('buy_result', {"success": success, "msg": msg})
         if success:
-            socketio.emit('state', engine.get_state_payload(), room='main')
+            broadcast_state(ch)
 
-    @socketio.on('disconnect')
-    def on_disconnect():
+    @on('hint')
+    def on_hint(data):
         sid = request.sid
-        print(f"[disconnect] sid={sid}")
-        engine.remove_player(sid)
-        leave_room('main')
-        socketio.emit('state', engine.get_state_payload(), room='main')
\ No newline at end of file
+        engine, _ = playing(sid)
+        try:
+            limit = min(max(1, int(data.get('limit'))), HINT_MAX_STEPS)
+        except (AttributeError, TypeError, ValueError):
+            limit = None        # 缺省或无法解析：返回完整路径
+        hint = engine.get_hint(sid, limit) if engine is not None else None
+        reply('hint', hint if hint is not None else {"steps": [], "msg": "当前位置无法到达出口"})
+
+    @on('state_ack')
+    def on_state_ack(data):
+        _, ch = current(request.sid)
+        if ch is not None:
+            ch.outbound.ack(request.sid, (data or {}).get('seq'))
+
+    @on('disconnect')
+    def on_disconnect():
+        leave_current(request.sid)
@@ -21,9 +21,15 @@ const gameState = {
   playerSid: null,
   players: {},
   boxes: [],
+  monsters: [],        // 服务器下发的怪物 [[id, x, y, kind], ...]
   exit: [0, 0],
   shop: [],
   isJoined: false,
+  isSpectating: false, // 观战模式：只接收低频压缩快照，不能操作
+  roster: {},          // 玩家编号 -> {sid, name}（state_packed 帧只携带编号）
+  hint: null,          // 出口提示 {steps, until}
+  playerName: null,
+  worldVersion: null,  // 当前持有的迷宫版本（重连时未变化则无需重发网格）
   lastRenderTime: 0,
   animationFrameId: null
 };
@@ -38,8 +44,10 @@ const elements = {
   hp: document.getElementById('hp'),
   log: document.getElementById('log'),
   leaderboard: document.getElementById('leaderboard'),
+  progressRank: document.getElementById('progressRank'),
   shopList: document.getElementById('shopList'),
   joinBtn: document.getElementById('joinBtn'),
+  spectateBtn: document.getElementById('spectateBtn'),
   playerName: document.getElementById('playerName'),
   newMazeBtn: document.getElementById('newMazeBtn'),
   moveButtons: document.querySelectorAll('.move-btn')
@@ -72,13 +80,24 @@ function initEventListeners() {
   // 加入游戏
   elements.joinBtn.addEventListener('click', () => {
     const name = elements.playerName.value.trim() || `玩家${Math.floor(Math.random() * 1000)}`;
-    socket.emit('join', { name });
+    sessionStorage.removeItem('mazeSession');
+    joinGame(name);
     elements.status.textContent = `正在加入: ${name}`;
     elements.playerName.disabled = true;
     elements.joinBtn.disabled = true;
     elements.joinBtn.classList.add('opacity-50', 'cursor-not-allowed');
   });
 
+  // 观战
+  elements.spectateBtn.addEventListener('click', () => {
+    sessionStorage.removeItem('mazeSession');
+    gameState.isSpectating = true;
+    socket.emit('spectate');
+    elements.status.textContent = '正在进入观战...';
+    elements.spectateBtn.disabled = true;
+    elements.spectateBtn.classList.add('opacity-50', 'cursor-not-allowed');
+  });
+
   // 生成新迷宫
   elements.newMazeBtn.addEventListener('click', () => {
     const size = parseInt(prompt("输入迷宫尺寸（奇数，建议15-31）", "21")) || 21;
@@ -91,6 +110,12 @@ function initEventListeners() {
   window.addEventListener('keydown', (e) => {
     if (!gameState.isJoined) return;
 
+    // H 键：请求接下来 10 步的出口提示
+    if (e.key === 'h' || e.key === 'H') {
+      socket.emit('hint', { limit: 10 });
+      return;
+    }
+
     let dx = 0, dy = 0;
     switch(e.key) {
       case 'ArrowUp': dy = -1; break;
@@ -134,6 +159,10 @@ function renderShop() {
         <i class="fa fa-coins mr-1"></i>${item.price}
       </span>
     `;
+    if (gameState.isSpectating) {
+      btn.disabled = true;
+      btn.classList.add('opacity-50', 'cursor-not-allowed');
+    }
     btn.addEventListener('click', () => {
       socket.emit('buy', { item_id: item.id });
     });
@@ -141,6 +170,14 @@ function renderShop() {
   });
 }
 
+// 观战时禁用会改变游戏的操作（新迷宫、移动；商店按钮在 renderShop 中处理）
+function disableActionControls() {
+  [elements.newMazeBtn, ...elements.moveButtons].forEach(btn => {
+    btn.disabled = true;
+    btn.classList.add('opacity-50', 'cursor-not-allowed');
+  });
+}
+
 // 渲染排行榜
 function renderLeaderboard(data) {
   elements.leaderboard.innerHTML = '';
@@ -165,6 +202,29 @@ function renderLeaderboard(data) {
   });
 }
 
+// 渲染实时进度排名
+function renderProgressRank(data) {
+  elements.progressRank.innerHTML = '';
+  (data.top || []).forEach(entry => {
+    const li = document.createElement('li');
+    li.className = 'flex justify-between bg-gray-800/50 px-2 py-1 rounded';
+    // 玩家名来自其他客户端，只能以文本写入
+    const name = document.createElement('span');
+    name.textContent = `#${entry.rank} ${entry.name}`;
+    const remaining = document.createElement('span');
+    remaining.className = 'text-gray-400';
+    remaining.textContent = entry.remaining < 0 ? '-' : `${entry.remaining} 步`;
+    li.append(name, remaining);
+    elements.progressRank.appendChild(li);
+  });
+  if (data.total > (data.top || []).length) {
+    const li = document.createElement('li');
+    li.className = 'text-gray-500 italic';
+    li.textContent = `共 ${data.total} 名玩家`;
+    elements.progressRank.appendChild(li);
+  }
+}
+
 // 调整画布大小
 function resizeCanvas() {
   const containerWidth = elements.canvas.parentElement.clientWidth;
@@ -177,13 +237,15 @@ function resizeCanvas() {
 }
 
 // 绘制游戏世界
+const MONSTER_COLORS = ['#EF4444', '#DC2626', '#F87171', '#B91C1C', '#FCA5A5', '#991B1B'];
+
 function draw(currentTime) {
   // 计算时间差，控制渲染帧率
   const deltaTime = (currentTime - gameState.lastRenderTime) / 16.67; // 基于60fps的时间因子
   gameState.lastRenderTime = currentTime;
 
   const ctx = elements.ctx;
-  const { width, height, grid, players, boxes, exit, playerSid } = gameState;
+  const { width, height, grid, players, boxes, monsters, exit, playerSid } = gameState;
 
   // 清空画布
   ctx.clearRect(0, 0, elements.canvas.width, elements.canvas.height);
@@ -250,6 +312,25 @@ function draw(currentTime) {
     ctx.restore();
   });
 
+  // 绘制怪物（红色圆点，按种类区分深浅）
+  monsters.forEach(([id, mx, my, kind]) => {
+    ctx.beginPath();
+    ctx.arc((mx + 0.5) * cellSize, (my + 0.5) * cellSize, cellSize * 0.3, 0, Math.PI * 2);
+    ctx.fillStyle = MONSTER_COLORS[kind % MONSTER_COLORS.length];
+    ctx.fill();
+  });
+
+  // 绘制出口提示路径（显示 3 秒）
+  const hint = gameState.hint;
+  if (hint && currentTime < hint.until) {
+    ctx.fillStyle = 'rgba(16, 185, 129, 0.5)';
+    hint.steps.forEach(([hx, hy]) => {
+      ctx.beginPath();
+      ctx.arc((hx + 0.5) * cellSize, (hy + 0.5) * cellSize, cellSize * 0.15, 0, Math.PI * 2);
+      ctx.fill();
+    });
+  }
+
   // 绘制玩家
   Object.values(players).forEach(player => {
     const isLocalPlayer = player.sid === playerSid;
@@ -301,65 +382,230 @@ function draw(currentTime) {
   gameState.animationFrameId = requestAnimationFrame(draw);
 }
 
+// 解码列式二进制玩家状态（布局见服务器 packed_state.py）
+function decodePackedPlayers(buf) {
+  const bytes = buf instanceof ArrayBuffer ? new Uint8Array(buf) : buf;
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const n = view.getUint32(4, true);
+  let off = 8;
+  const players = {};
+  const idx = new Array(n);
+  for (let i = 0; i < n; i++, off += 4) idx[i] = view.getUint32(off, true);
+  const entries = idx.map(index => {
+    const info = gameState.roster[index] || { sid: `#${index}`, name: '' };
+    return { sid: info.sid, name: info.name };
+  });
+  for (let i = 0; i < n; i++, off += 2) entries[i].x = view.getUint16(off, true);
+  for (let i = 0; i < n; i++, off += 2) entries[i].y = view.getUint16(off, true);
+  for (let i = 0; i < n; i++, off += 2) entries[i].hp = view.getUint16(off, true);
+  for (let i = 0; i < n; i++, off += 4) entries[i].coins = view.getUint32(off, true);
+  for (let i = 0; i < n; i++, off += 1) {
+    const flags = view.getUint8(off);
+    entries[i].shield = (flags & 1) !== 0;
+    entries[i].finished = (flags & 2) !== 0;
+  }
+  entries.forEach(p => { players[p.sid] = p; });
+  return players;
+}
+
+// 应用一帧状态（JSON 与二进制帧共用）
+function applyState(players, data) {
+  gameState.players = players;
+  gameState.boxes = data.boxes || [];
+  gameState.monsters = data.monsters || [];
+  gameState.exit = data.exit || gameState.exit;
+
+  // 更新本地玩家状态
+  const localPlayer = gameState.players[gameState.playerSid];
+  if (localPlayer) {
+    elements.coins.textContent = `金币: ${localPlayer.coins}`;
+    elements.hp.textContent = `生命: ${localPlayer.hp}`;
+
+    // 生命低于30时显示警告
+    elements.hp.className = localPlayer.hp < 30 ? 'text-danger font-bold' : '';
+  }
+}
+
 // 处理Socket.IO事件
+// 本地网格缓存：world_hash -> 网格（每行编码为 '0'/'1' 字符串），按最近使用保留若干个
+const GRID_CACHE_KEY = 'mazeGrids';
+const GRID_CACHE_SIZE = 8;
+
+function loadGridCache() {
+  try {
+    return JSON.parse(localStorage.getItem(GRID_CACHE_KEY) || '[]');
+  } catch (e) {
+    return [];
+  }
+}
+
+function cacheGrid(hash, grid) {
+  if (!hash || !grid) return;
+  const entries = loadGridCache().filter(e => e.hash !== hash);
+  entries.unshift({ hash, rows: grid.map(row => row.join('')) });
+  try {
+    localStorage.setItem(GRID_CACHE_KEY, JSON.stringify(entries.slice(0, GRID_CACHE_SIZE)));
+  } catch (e) {
+    // 存储配额不足时放弃缓存，不影响游戏
+  }
+}
+
+function cachedGrid(hash) {
+  const entry = loadGridCache().find(e => e.hash === hash);
+  return entry ? entry.rows.map(row => Array.from(row, Number)) : null;
+}
+
+// 发送 join；存在会话令牌时附带 resume，服务器在宽限期内会恢复原玩家
+function joinGame(name) {
+  gameState.playerName = name;
+  const session = JSON.parse(sessionStorage.getItem('mazeSession') || 'null');
+  // formats: 声明支持列式二进制状态帧（state_packed）；have: 本地已缓存的网格哈希
+  const payload = { name, formats: ['packed'], have: loadGridCache().map(e => e.hash) };
+  if (session && session.name === name) {
+    payload.resume = session.token;
+    payload.world_version = gameState.grid.length ? gameState.worldVersion : null;
+  }
+  socket.emit('join', payload);
+}
+
+function saveSession(token) {
+  if (token) {
+    sessionStorage.setItem('mazeSession', JSON.stringify({ name: gameState.playerName, token }));
+  }
+}
+
 function initSocketEvents() {
   // 连接状态
   socket.on('connect', () => {
     elements.status.textContent = '已连接服务器';
     logMessage('成功连接到游戏服务器', 'success');
+    // 断线重连（或刷新页面）后自动凭令牌恢复
+    const session = JSON.parse(sessionStorage.getItem('mazeSession') || 'null');
+    if (gameState.isSpectating) {
+      socket.emit('spectate');
+    } else if (session) {
+      elements.playerName.value = session.name;
+      elements.playerName.disabled = true;
+      elements.joinBtn.disabled = true;
+      elements.joinBtn.classList.add('opacity-50', 'cursor-not-allowed');
+      joinGame(session.name);
+    }
   });
 
   socket.on('disconnect', (reason) => {
     elements.status.textContent = `已断开连接: ${reason}`;
     logMessage(`与服务器断开连接: ${reason}`, 'error');
     gameState.isJoined = false;
-    elements.playerName.disabled = false;
-    elements.joinBtn.disabled = false;
-    elements.joinBtn.classList.remove('opacity-50', 'cursor-not-allowed');
+    // 有会话令牌时等待自动重连，不重置加入按钮
+    if (!sessionStorage.getItem('mazeSession')) {
+      elements.playerName.disabled = false;
+      elements.joinBtn.disabled = false;
+      elements.joinBtn.classList.remove('opacity-50', 'cursor-not-allowed');
+    }
   });
 
   // 初始化游戏数据
   socket.on('init', (data) => {
-    gameState.grid = data.grid;
+    if (data.grid) {
+      gameState.grid = data.grid;
+      cacheGrid(data.world_hash, data.grid);
+    } else {
+      // 服务器确认本地缓存中已有该迷宫，未重发网格
+      const grid = cachedGrid(data.world_hash);
+      if (grid) {
+        gameState.grid = grid;
+      } else {
+        gameState.grid = [];
+        socket.emit('request_grid');
+      }
+    }
     gameState.width = data.width;
     gameState.height = data.height;
     gameState.exit = data.exit;
     gameState.shop = data.shop || [];
-    gameState.playerSid = data.your_sid;
+    gameState.playerSid = data.your_sid || gameState.playerSid;  // 新迷宫广播不带 your_sid
+    gameState.worldVersion = data.world_version;
+    saveSession(data.token);
     gameState.players = {};
     (data.players || []).forEach(p => { gameState.players[p.sid] = p; });
     gameState.boxes = data.boxes || [];
-    gameState.isJoined = true;
 
     // 更新UI
-    elements.status.textContent = `已加入 (ID: ${gameState.playerSid.substring(0, 6)})`;
+    if (data.spectator || gameState.isSpectating) {
+      gameState.isSpectating = true;
+      elements.status.textContent = '观战中';
+      disableActionControls();
+    } else {
+      gameState.isJoined = true;
+      elements.status.textContent = `已加入 ${data.room || ''} (ID: ${gameState.playerSid.substring(0, 6)})`;
+    }
     renderShop();
     resizeCanvas();
     logMessage('游戏初始化完成，开始探索吧！', 'success');
   });
 
+  // 观战快照：zlib 压缩的 JSON 状态（与 state 事件结构相同）
+  socket.on('spectate_state', async (frame) => {
+    const stream = new Blob([frame.z]).stream().pipeThrough(new DecompressionStream('deflate'));
+    const data = JSON.parse(await new Response(stream).text());
+    const players = {};
+    (data.players || []).forEach(p => { players[p.sid] = p; });
+    applyState(players, data);
+  });
+
+  // 缓存缺失时补发的网格
+  socket.on('grid', (data) => {
+    gameState.grid = data.grid;
+    gameState.width = data.width;
+    gameState.height = data.height;
+    cacheGrid(data.world_hash, data.grid);
+    resizeCanvas();
+  });
+
+  // 会话恢复：迷宫未变化，服务器只补发自身记录（随后的 state 帧带来其他玩家）
+  socket.on('resumed', (data) => {
+    gameState.playerSid = data.your_sid;
+    gameState.worldVersion = data.world_version;
+    saveSession(data.token);
+    gameState.players = { [data.player.sid]: data.player };
+    gameState.isJoined = true;
+    elements.status.textContent = `已恢复 (ID: ${gameState.playerSid.substring(0, 6)})`;
+    logMessage('已重新连接，进度已恢复', 'success');
+  });
+
   // 状态更新
   socket.on('state', (data) => {
-    // 更新玩家列表
-    gameState.players = {};
-    (data.players || []).forEach(p => { gameState.players[p.sid] = p; });
-    gameState.boxes = data.boxes || [];
-    gameState.exit = data.exit || gameState.exit;
+    const players = {};
+    (data.players || []).forEach(p => { players[p.sid] = p; });
+    applyState(players, data);
+    socket.emit('state_ack', { seq: data.seq });  // 确认后服务器才发送下一帧
+  });
 
-    // 更新本地玩家状态
-    const localPlayer = gameState.players[gameState.playerSid];
-    if (localPlayer) {
-      elements.coins.textContent = `金币: ${localPlayer.coins}`;
-      elements.hp.textContent = `生命: ${localPlayer.hp}`;
+  // 状态更新（列式二进制）
+  socket.on('state_packed', (data) => {
+    applyState(decodePackedPlayers(data.players), data);
+    socket.emit('state_ack', { seq: data.seq });
+  });
 
-      // 生命低于30时显示警告
-      elements.hp.className = localPlayer.hp < 30 ? 'text-danger font-bold' : '';
-    }
+  // 玩家名册（编号 -> sid/name），join 时全量，之后增量
+  socket.on('roster', (data) => {
+    if (data.reset) gameState.roster = {};
+    (data.players || data.add || []).forEach(([index, sid, name]) => {
+      gameState.roster[index] = { sid, name };
+    });
+    (data.remove || []).forEach(index => { delete gameState.roster[index]; });
   });
 
   // 盲盒刷新
   socket.on('boxes_refreshed', (data) => {
-    gameState.boxes = data.boxes || gameState.boxes;
+    if (data.partial) {
+      // 服务器只发送有变化的盒子：按坐标合并
+      const changed = {};
+      (data.boxes || []).forEach(b => { changed[`${b.pos[0]},${b.pos[1]}`] = b; });
+      gameState.boxes = gameState.boxes.map(b => changed[`${b.pos[0]},${b.pos[1]}`] || b);
+    } else {
+      gameState.boxes = data.boxes || gameState.boxes;
+    }
     logMessage('盲盒已刷新！快去寻找惊喜吧', 'warn');
   });
 
@@ -372,6 +618,19 @@ function initSocketEvents() {
     logMessage(data.msg, data.ok ? 'info' : 'error');
   });
 
+  // 出口提示
+  socket.on('hint', (data) => {
+    if (!data.steps || data.steps.length === 0) {
+      logMessage(data.msg || '暂无提示', 'warn');
+      return;
+    }
+    gameState.hint = { steps: data.steps, until: performance.now() + 3000 };
+    logMessage(`距出口还有 ${data.distance} 步`, 'info');
+  });
+
+  // 实时进度排名（服务器节流广播）
+  socket.on('progress_rank', renderProgressRank);
+
   // 排行榜更新
   socket.on('leaderboard_update', (data) => {
     renderLeaderboard(data.top || []);
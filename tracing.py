@@ -0,0 +1,159 @@
+# tracing.py
+# -*- coding: utf-8 -*-
+"""
+结构化事件追踪（取代热路径上的 print）
+- 每个 SocketIO 事件记录一条 span：事件名、sid、房间、耗时、负载字节数、附加字段
+- span 写入固定大小的环形缓冲区：只做一次计数器自增和一次列表赋值，不加锁、不做 IO
+  （itertools.count 的自增在 GIL 下是原子的，并发写入只会覆盖最旧的槽位）
+- 定时 flush 只把新增记录从环形缓冲区取出放入待写列表；采样、序列化和写文件 / 标准输出
+  在后台任务中进行（spawn 为 socketio.start_background_task），不占用调度器的 tick；
+  出错或耗时超过阈值的 span 总是输出（MAZE_TRACE_FILE 指定文件，默认标准输出）
+- /debug/trace 直接读取环形缓冲区中的最近记录
+"""
+import itertools
+import json
+import os
+import sys
+import time
+from threading import Lock
+
+
+class Ring:
+    """定长环形缓冲区，记录为 (seq, record)"""
+
+    def __init__(self, size=4096):
+        self.size = size
+        self._buf = [None] * size
+        self._seq = itertools.count()
+
+    def append(self, record):
+        seq = next(self._seq)
+        self._buf[seq % self.size] = (seq, record)
+
+    def since(self, seq):
+        """序号 >= seq 的记录（按序号排序）；被覆盖的旧记录不再返回"""
+        return sorted((e for e in self._buf if e is not None and e[0] >= seq), key=lambda e: e[0])
+
+
+class Tracer:
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, size=4096, sample=None, slow_ms=None, sink=None):
+        self.ring = Ring(size)
+        # 采样率：0~1，默认 0.01；MAZE_TRACE_SAMPLE=0 关闭输出（环形缓冲区照常记录）
+        self.sample = float(os.environ.get('MAZE_TRACE_SAMPLE', 0.01)) if sample is None else sample
+        self.slow_us = (float(os.environ.get('MAZE_TRACE_SLOW_MS', 50)) if slow_ms is None else slow_ms) * 1000
+        self.sink = sink
+        self.spawn = None        # 后台执行写出的函数 fn(target)；为 None 时在 flush 中同步写出
+        self._pending = []       # 已从环形缓冲区取出、尚未写出的记录
+        self._writing = False    # 是否已有写出任务在跑（与 _pending 一起由 _pending_lock 保护）
+        self._pending_lock = Lock()
+        self._open = {}          # sid -> 正在执行的 span 的附加字段
+        self._flushed = 0        # 下一条待 flush 的序号
+        self._sampled = 0
+        self.lost = 0            # flush 前被覆盖的记录数
+
+    # ---------------- 记录 ----------------
+    def begin(self, sid):
+        """事件处理开始：之后 note(sid, ...) 的字段附加到这条 span"""
+        fields = {}
+        self._open[sid] = fields
+        return fields
+
+    def end(self, event, sid, room, started, size=0, error=None):
+        fields = self._open.pop(sid, None) or {}
+        if error is not None:
+            fields['error'] = repr(error)
+        self.ring.append((time.time(), event, sid, room,
+                          int((time.perf_counter() - started) * 1e6), size, fields))
+
+    def note(self, sid, **fields):
+        """给 sid 当前的 span 附加字段（例如玩家名、协商的格式）"""
+        span = self._open.get(sid)
+        if span is not None:
+            span.update(fields)
+
+    def event(self, event, sid=None, room=None, **fields):
+        """不属于任何事件处理的瞬时记录"""
+        self.ring.append((time.time(), event, sid, room, 0, 0, fields))
+
+    # ---------------- 读取与输出 ----------------
+    @staticmethod
+    def _as_dict(seq, rec):
+        ts, event, sid, room, dur, size, fields = rec
+        d = {"seq": seq, "ts": round(ts, 6), "event": event, "sid": sid, "room": room,
+             "duration_us": dur, "payload_bytes": size}
+        if fields:
+            d.update(fields)
+        return d
+
+    def recent(self, limit=200, event=None, sid=None):
+        rows = self.ring.since(0)
+        if event:
+            rows = [r for r in rows if r[1][1] == event]
+        if sid:
+            rows = [r for r in rows if r[1][2] == sid]
+        return [self._as_dict(seq, rec) for seq, rec in rows[-limit:]]
+
+    def _keep(self, rec):
+        if rec[4] >= self.slow_us or 'error' in rec[6]:
+            return True
+        if self.sample <= 0:
+            return False
+        self._sampled += self.sample
+        if self._sampled >= 1:
+            self._sampled -= 1
+            return True
+        return False
+
+    def flush(self):
+        """定时调用：取出上次 flush 以来的新记录，交给后台任务写出（已有写出任务在跑时只追加）"""
+        rows = self.ring.since(self._flushed)
+        if rows:
+            if rows[0][0] > self._flushed:
+                self.lost += rows[0][0] - self._flushed
+            self._flushed = rows[-1][0] + 1
+        with self._pending_lock:
+            self._pending.extend(rows)
+            if not self._pending:
+                return 0
+            start = self.spawn is not None and not self._writing
+            if start:
+                self._writing = True
+        if self.spawn is None:
+            return self._write()
+        if start:
+            self.spawn(self._write)
+        return len(rows)
+
+    def _write(self):
+        """按采样率把待写记录写成 JSON 行，直到待写列表为空；返回写出的行数"""
+        written = 0
+        try:
+            while True:
+                # 取走待写列表与清除写出标志在同一把锁内，flush 不会漏掉或重复启动写出任务
+                with self._pending_lock:
+                    rows, self._pending = self._pending, []
+                    if not rows:
+                        self._writing = False
+                        return written
+                lines = [json.dumps(self._as_dict(seq, rec), ensure_ascii=False)
+                         for seq, rec in rows if self._keep(rec)]
+                if not lines:
+                    continue
+                path = os.environ.get('MAZE_TRACE_FILE') if self.sink is None else None
+                if path:
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write('\n'.join(lines) + '\n')
+                else:
+                    out = self.sink or sys.stdout
+                    out.write('\n'.join(lines) + '\n')
+                    out.flush()
+                written += len(lines)
+        except BaseException:
+            with self._pending_lock:
+                self._writing = False
+            raise
+
+
+TRACER = Tracer()